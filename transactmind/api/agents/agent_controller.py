@@ -1,12 +1,15 @@
-from langchain.agents import Tool, initialize_agent, AgentExecutor
-from langchain.agents import AgentType
-from langchain.llms import LlamaCpp
 from api.agents.tools import run_benchmark_tool, trigger_retrain_tool, diagnose_quality_tool
 
 class AgentController:
     def __init__(self, model_path: str = None):
+        # langchain is imported here rather than at module import so API startup only pays for it when used
+        from langchain.agents import Tool, initialize_agent
+        from langchain.agents import AgentType
+        from langchain.llms import LlamaCpp
         try:
-            self.llm = LlamaCpp(model_path=model_path or 'models/tinyllama.bin', n_ctx=1024, n_threads=2)
+            # use_mmap keeps the weights in the page cache, shared by every worker that loads the same file
+            self.llm = LlamaCpp(model_path=model_path or 'models/tinyllama.bin', n_ctx=1024, n_threads=2,
+                                use_mmap=True)
         except Exception:
             self.llm = None
         tools = [
@@ -19,6 +22,10 @@ class AgentController:
         else:
             self.agent = None
 
+    @property
+    def has_llm(self) -> bool:
+        return self.agent is not None
+
     def summarize(self, text: str, category: str, confidence: float, rag_exp: str) -> str:
         if not self.agent:
             return f"Predicted '{category}' with confidence {confidence:.2f}. Rationale: {rag_exp}"
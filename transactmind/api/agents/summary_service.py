@@ -0,0 +1,127 @@
+"""Background LLM summaries: /predict answers with a template right away, the agent refines it later.
+
+Finished summaries are cached by (category, confidence bucket, RAG rationale) so repeated merchants
+never reach the LLM again. Each job has a deadline; jobs still queued when it passes are dropped
+and keep their template summary.
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from api.utils.tracing import timed
+
+
+def template_summary(category: str, confidence: float, rag_exp: Optional[str]) -> str:
+    summary = f"Predicted '{category}' with confidence {confidence:.2f}."
+    return f"{summary} Rationale: {rag_exp}" if rag_exp else summary
+
+
+class SummaryService:
+    def __init__(self, agent, workers: int = 1, deadline_s: float = 10.0, cache_size: int = 10000,
+                 confidence_bucket: float = 0.1, max_jobs: int = 10000):
+        self.agent = agent
+        self.deadline_s = deadline_s
+        self.cache_size = cache_size
+        self.confidence_bucket = confidence_bucket
+        self.max_jobs = max_jobs
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='summary')
+        self._cache = OrderedDict()
+        self._jobs: Dict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        # agents without an LLM (stub / missing model) can only ever produce the template
+        self.has_llm = bool(getattr(agent, 'has_llm', False))
+
+    def _key(self, category: str, confidence: float, rag_exp: str):
+        return category, int(confidence / self.confidence_bucket), rag_exp
+
+    def _cache_get(self, key):
+        with self._lock:
+            summary = self._cache.get(key)
+            if summary is not None:
+                self._cache.move_to_end(key)
+            return summary
+
+    def _cache_put(self, key, summary: str):
+        with self._lock:
+            self._cache[key] = summary
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _new_job(self, status: str, summary: str, deadline: float) -> dict:
+        job = {'id': uuid.uuid4().hex, 'status': status, 'summary': summary, 'deadline': deadline,
+               'event': None, 'loop': None}
+        try:
+            job['loop'] = asyncio.get_running_loop()
+            job['event'] = asyncio.Event()
+            if status != 'pending':
+                job['event'].set()
+        except RuntimeError:
+            pass
+        with self._lock:
+            self._jobs[job['id']] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job
+
+    def submit(self, text: str, category: str, confidence: float, rag_exp: str) -> dict:
+        """Return the job record immediately; `summary` is the cached LLM answer or the template."""
+        key = self._key(category, confidence, rag_exp)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return self._new_job('ready', cached, 0.0)
+        template = template_summary(category, confidence, rag_exp)
+        if not self.has_llm:
+            return self._new_job('template', template, 0.0)
+        job = self._new_job('pending', template, time.monotonic() + self.deadline_s)
+        self.pool.submit(self._generate, job, key, text, category, confidence, rag_exp)
+        return job
+
+    def _generate(self, job, key, text, category, confidence, rag_exp):
+        if time.monotonic() > job['deadline']:
+            # waited in the queue past its deadline: don't spend LLM time on a stale request
+            self._finish(job, 'expired', None)
+            return
+        try:
+            with timed('agent'):
+                summary = self.agent.summarize(text, category, confidence, rag_exp)
+        except Exception:
+            self._finish(job, 'failed', None)
+            return
+        self._cache_put(key, summary)
+        self._finish(job, 'ready' if time.monotonic() <= job['deadline'] else 'late', summary)
+
+    def _finish(self, job, status: str, summary: Optional[str]):
+        job['status'] = status
+        if summary is not None:
+            job['summary'] = summary
+        if job['event'] is not None:
+            job['loop'].call_soon_threadsafe(job['event'].set)
+
+    def get(self, summary_id: str) -> Optional[dict]:
+        job = self._jobs.get(summary_id)
+        if job is not None and job['status'] == 'pending' and time.monotonic() > job['deadline']:
+            job['status'] = 'timeout'
+        return job
+
+    async def wait(self, summary_id: str) -> Optional[dict]:
+        """Wait for a pending job until it finishes or its deadline passes."""
+        job = self.get(summary_id)
+        if job is None or job['status'] != 'pending' or job['event'] is None:
+            return job
+        try:
+            await asyncio.wait_for(job['event'].wait(), max(0.0, job['deadline'] - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        return self.get(summary_id)
+
+    @staticmethod
+    def public(job: dict) -> dict:
+        return {'summary_id': job['id'], 'status': job['status'], 'agent_summary': job['summary']}
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,29 @@
+import os
+import sys
 import time
 import json
 
+# project root: benchmarks/ is found from here, whatever directory the server was started in
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def run_benchmark_tool(query: str = None):
+    # the per-stage suite on the server's already loaded components; the agent stage is skipped so the agent
+    # doesn't time itself
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from api.inference import pipeline
+    from benchmarks.stage_bench import STAGES, compare, format_report, load_baseline, run_suite
     start = time.time()
-    time.sleep(0.05)
+    report = run_suite(backends=('real',), batch_sizes=(1, 8), repeats=5,
+                       stages=[s for s in STAGES if s != 'agent'], shared=pipeline.get_components())
+    baseline = load_baseline()
+    regressions = compare(report, baseline) if baseline else []
     duration = time.time() - start
-    return f"Benchmark completed in {duration:.2f}s"
+    return f"Benchmark completed in {duration:.2f}s\n" + format_report(report, regressions)
 
 def trigger_retrain_tool(payload: dict = None):
+    # only queue the request: training/online_update.py --if-triggered (cron / offline worker) publishes models,
+    # never the request path the agent runs on
     with open('training/retrain_trigger.json', 'w', encoding='utf-8') as f:
         json.dump({'triggered': True, 'payload': payload}, f)
     return 'Retrain triggered locally.'
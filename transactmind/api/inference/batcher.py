@@ -0,0 +1,94 @@
+"""Async micro-batching: coalesce concurrent /predict calls into one embed + classify run."""
+import asyncio
+from typing import List, Optional, Tuple
+
+from api.utils.executor import OverloadedError
+from api.utils.metrics import BATCH_SIZE, QUEUE_DEPTH
+
+
+class MicroBatcher:
+    """`infer(texts)` must return one result per text, e.g. pipeline.classify's (embedding, category, ...) tuples."""
+
+    def __init__(self, infer, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 executor=None, stage: str = 'embed', max_queue: Optional[int] = None):
+        self.infer = infer
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+        self.stage = stage
+        self.max_queue = max_queue
+        self._queue = None
+        self._worker = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        # fail anything still waiting so callers don't hang on shutdown
+        while self._queue is not None and not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError('batcher stopped'))
+
+    async def submit(self, text: str):
+        """Queue one preprocessed text and wait for (embedding, category, confidence, probs)."""
+        if self.max_queue is not None and self._queue.qsize() >= self.max_queue:
+            raise OverloadedError(self.stage, getattr(self.executor, 'retry_after', 1.0))
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut))
+        return await fut
+
+    async def _collect(self) -> List[Tuple[str, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # take whatever is already queued before waiting on the clock
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # drop callers that went away (client disconnect / cancellation)
+            batch = [(t, f) for t, f in batch if not f.done()]
+            if not batch:
+                continue
+            texts = [t for t, _ in batch]
+            BATCH_SIZE.observe(len(texts))
+            QUEUE_DEPTH.labels(stage='batcher').set(self._queue.qsize())
+            try:
+                if self.executor is not None:
+                    # admission already happened in submit(); never shed a batch that is in flight
+                    results = await self.executor.run(self.stage, self.infer, texts, shed=False)
+                else:
+                    results = await loop.run_in_executor(None, self.infer, texts)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
@@ -0,0 +1,118 @@
+"""Vectorized bulk classification for backfills (JSON arrays, NDJSON and CSV uploads)."""
+import csv
+import io
+import json
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from api.agents.summary_service import template_summary
+from api.inference.cascade import cascade_classify, stage1_rationale
+from api.inference.merchant_index import merchant_rationale
+from api.inference.preprocess import preprocess_text
+
+# column names accepted as the transaction text, in order of preference
+TEXT_FIELDS = ('transaction_text', 'transaction', 'text')
+# non-text columns echoed back so callers can join results to their source rows
+PASSTHROUGH_FIELDS = ('id', 'amount', 'date')
+
+
+def row_text(row: Dict) -> str:
+    for key in TEXT_FIELDS:
+        value = row.get(key)
+        if value is not None and str(value).strip():
+            return str(value)
+    return ''
+
+
+def iter_rows(fileobj, fmt: str = 'ndjson') -> Iterator[Dict]:
+    """Lazily yield dict rows from a binary file object holding NDJSON or CSV."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        for row in csv.DictReader(text):
+            yield row
+        return
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = {'_error': 'invalid JSON line'}
+        if not isinstance(row, dict):
+            row = {'transaction_text': row} if isinstance(row, str) else {'_error': 'expected a JSON object'}
+        yield row
+
+
+def iter_chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_rows(rows: List[Dict], embedder, classifier, rag=None,
+                  include_shap: bool = False, include_summary: bool = False, offset: int = 0,
+                  shap_top_k: int = None, merchants=None, stage1=None, cascade_threshold: float = 1.0) -> List[Dict]:
+    """Classify one chunk with a single embed call and a single classifier call.
+
+    Rows whose merchant is in the fast-path index never reach the models, and rows the first-stage
+    cascade model is confident about are never embedded. SHAP and RAG rationales are per-row and
+    expensive, so they are only computed on request; summaries are the template here, the caller
+    queues the LLM ones (api/agents/summary_service.py).
+    """
+    results = [None] * len(rows)
+    texts, positions = [], []
+    for i, row in enumerate(rows):
+        out = {'row': offset + i}
+        for key in PASSTHROUGH_FIELDS:
+            if key in row:
+                out[key] = row[key]
+        results[i] = out
+        text = preprocess_text(row_text(row))
+        if row.get('_error') or not text:
+            out['error'] = row.get('_error') or 'missing transaction text'
+            continue
+        hit = merchants.lookup(text) if merchants is not None else None
+        if hit is not None:
+            out['category'] = hit['category']
+            out['confidence'] = hit['confidence']
+            out['path'] = 'merchant_index'
+            out['model_version'] = hit['version']
+            if include_shap:
+                out['shap'] = None
+            if include_summary:
+                out['rag_explanation'] = merchant_rationale(hit)
+                out['agent_summary'] = template_summary(hit['category'], hit['confidence'], out['rag_explanation'])
+            continue
+        texts.append(text)
+        positions.append(i)
+
+    if not texts:
+        return results
+
+    preds = cascade_classify(stage1, embedder, classifier, texts, cascade_threshold)
+    rag_exps = None
+    if include_summary and rag is not None:
+        # one batched exemplar search for the escalated rows, reusing their embeddings
+        rag_exps = [stage1_rationale(p[2]) for p in preds]
+        escalated = [n for n, p in enumerate(preds) if p[0] is not None]
+        if escalated:
+            found = rag.explain_batch([texts[n] for n in escalated], [preds[n][1] for n in escalated],
+                                      [preds[n][0] for n in escalated])
+            for n, exp in zip(escalated, found):
+                rag_exps[n] = exp
+    for n, (pos, text, (emb, category, confidence, _, path, version)) in enumerate(zip(positions, texts, preds)):
+        out = results[pos]
+        out['category'] = category
+        out['confidence'] = float(confidence)
+        out['path'] = path
+        out['model_version'] = version
+        if include_shap:
+            out['shap'] = classifier.shap_explain(emb, top_k=shap_top_k) if emb is not None else None
+        if rag_exps is not None:
+            out['rag_explanation'] = rag_exps[n]
+            out['agent_summary'] = template_summary(category, confidence, rag_exps[n])
+    return results
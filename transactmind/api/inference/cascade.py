@@ -0,0 +1,84 @@
+"""Confidence-gated cascade: a hashed n-gram linear model answers easy strings, MiniLM + ONNXClassifier the rest.
+
+The first stage is trained and exported by training/export_to_onnx.py (api/models/stage1.onnx plus a
+stage1.json sidecar with labels and feature settings). Tune the threshold with training/cascade_tradeoff.py.
+"""
+import hashlib
+import json
+from typing import List
+
+try:
+    import onnxruntime as ort
+    import numpy as np
+    _HAS_ORT = True
+except Exception:
+    ort = None
+    np = None
+    _HAS_ORT = False
+
+from api.inference.sessions import create_session
+from api.utils.metrics import CASCADE_ROUTED
+from api.utils.tracing import timed
+
+STAGE1 = 'stage1'
+MODEL = 'model'
+
+
+class FirstStageClassifier:
+    def __init__(self, model_path: str = 'api/models/stage1.onnx'):
+        if not _HAS_ORT:
+            raise RuntimeError('onnxruntime is required for the first-stage classifier')
+        with open(model_path.replace('.onnx', '.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.labels = meta['labels']
+        self.n_features = meta['n_features']
+        self.ngram_range = tuple(meta['ngram_range'])
+        with open(model_path, 'rb') as f:
+            self.version = meta.get('version') or f'ngram@{hashlib.sha1(f.read()).hexdigest()[:8]}'
+        self.session = create_session(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+        # exported with zipmap disabled: outputs are (label, probabilities)
+        names = [o.name for o in self.session.get_outputs()]
+        self.output_name = 'probabilities' if 'probabilities' in names else names[-1]
+
+    def predict_batch(self, texts: List[str]):
+        from api.inference.ngram_features import hashed_ngrams
+        feats = hashed_ngrams(texts, self.n_features, self.ngram_range)
+        probs = self.session.run([self.output_name], {self.input_name: feats})[0]
+        idx = np.argmax(probs, axis=1)
+        return [(self.labels[int(i)], float(p[i]), p.tolist()) for i, p in zip(idx, probs)]
+
+
+def stage1_rationale(confidence: float) -> str:
+    return f"First-stage n-gram classifier was confident ({confidence:.2f}); transformer path skipped."
+
+
+def cascade_classify(stage1, embedder, classifier, texts: List[str], threshold: float):
+    """(embedding, category, confidence, probs, path, model_version) per text.
+
+    The embedding is None for stage-1 answers, whose model_version is the first stage's ('ngram@<digest>').
+    Only texts whose first-stage confidence is below `threshold` are embedded, in one batch. `model_version`
+    is read from the classifier object used for this call, so a hot-swap mid-request can't mislabel the answer.
+    """
+    version = getattr(classifier, 'version', None)
+    results = [None] * len(texts)
+    escalate = list(range(len(texts)))
+    if stage1 is not None and texts:
+        escalate = []
+        with timed('stage1'):
+            first = stage1.predict_batch(texts)
+        for i, (category, confidence, probs) in enumerate(first):
+            if confidence >= threshold:
+                results[i] = (None, category, confidence, probs, STAGE1, getattr(stage1, 'version', STAGE1))
+            else:
+                escalate.append(i)
+        CASCADE_ROUTED.labels(stage=STAGE1).inc(len(texts) - len(escalate))
+    if escalate:
+        CASCADE_ROUTED.labels(stage=MODEL).inc(len(escalate))
+        with timed('embed'):
+            embs = embedder.embed([texts[i] for i in escalate])
+        with timed('classify'):
+            preds = classifier.predict_batch(embs)
+        for i, emb, (category, confidence, probs) in zip(escalate, embs, preds):
+            results[i] = (emb, category, confidence, probs, MODEL, version)
+    return results
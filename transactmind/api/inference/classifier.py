@@ -1,7 +1,8 @@
 """ONNX classifier wrapper with a graceful stub fallback when model or runtime not available."""
 import os
 import json
-from typing import Tuple
+import threading
+from typing import Optional, Tuple
 
 try:
     import onnxruntime as ort
@@ -12,30 +13,49 @@ except Exception:
     import math as np
     _HAS_ORT = False
 
-try:
-    import shap
-    _HAS_SHAP = True
-except Exception:
-    shap = None
-    _HAS_SHAP = False
+from api.inference.sessions import create_session
+from api.utils.config import settings
+from api.utils.metrics import STUB_FALLBACKS
+
+_STUB_PREDICTS = STUB_FALLBACKS.labels(component='classifier')
+
+def _load_shap():
+    # shap is heavy and only needed for the on-demand /explain KernelExplainer path
+    try:
+        import shap
+        return shap
+    except Exception:
+        return None
+
+
+def _sparse_top_k(values, top_k: int):
+    """Indices/values of the top_k largest-magnitude entries of a 1-d array, largest first."""
+    top_k = min(top_k, values.shape[0])
+    idx = np.argpartition(-np.abs(values), top_k - 1)[:top_k]
+    idx = idx[np.argsort(-np.abs(values[idx]))]
+    return {'indices': idx.tolist(), 'values': values[idx].tolist()}
 
 
 class StubClassifier:
-    def __init__(self, taxonomy_path: str = 'api/models/taxonomy.json'):
+    def __init__(self, taxonomy_path: Optional[str] = None):
         try:
-            with open(taxonomy_path, 'r', encoding='utf-8') as f:
+            with open(taxonomy_path or settings.TAXONOMY_PATH, 'r', encoding='utf-8') as f:
                 tax = json.load(f)
                 self.labels = tax.get('labels', ['others'])
         except Exception:
             self.labels = ['others']
 
     def predict(self, embedding) -> Tuple[str, float, list]:
+        _STUB_PREDICTS.inc()
         # Return first label as high-confidence stub
         probs = [0.0] * len(self.labels)
         probs[0] = 0.95
         return self.labels[0], 0.95, probs
 
-    def shap_explain(self, embedding):
+    def predict_batch(self, embeddings):
+        return [self.predict(e) for e in embeddings]
+
+    def shap_explain(self, embedding, top_k: int = None):
         # return a minimal fake SHAP payload
         try:
             length = len(embedding) if hasattr(embedding, '__len__') else 1
@@ -43,18 +63,42 @@ class StubClassifier:
             length = 1
         return {'shap_values': [[0.0] * length]}
 
+    def kernel_explain(self, embedding, nsamples: int = 30):
+        return self.shap_explain(embedding)
+
 
 class ONNXClassifier:
-    def __init__(self, model_path: str = 'api/models/model.onnx'):
+    def __init__(self, model_path: str = 'api/models/model.onnx', prefer_quantized: bool = True,
+                 taxonomy_path: Optional[str] = None):
         self.model_path = model_path
+        self.taxonomy_path = taxonomy_path or settings.TAXONOMY_PATH
         self.session = None
         self.input_name = None
         self.output_name = None
+        # 'probabilities' (lean export), 'scores' (raw logits, softmaxed here) or 'zipmap' (legacy export)
+        self.output_kind = None
+        self.n_classes = None
         self.taxonomy = {'labels': ['others']}
+        # taxonomy label of each probability column
+        self.column_labels = None
+        self._local = threading.local()
+        # linear model weights for exact attributions, (n_classes, n_features) / (n_classes,)
+        self.coef = None
+        self.intercept = None
+        self.baseline = None
+        self._kernel_explainer = None
+        self.quantized = False
+        # versioned artifacts (training/online_update.py) carry a meta.json next to the model
+        self.version = 'base'
+        try:
+            with open(os.path.join(os.path.dirname(model_path), 'meta.json'), 'r', encoding='utf-8') as f:
+                self.version = json.load(f).get('version', 'base')
+        except Exception:
+            pass
 
         # load taxonomy
         try:
-            with open('api/models/taxonomy.json', 'r', encoding='utf-8') as f:
+            with open(self.taxonomy_path, 'r', encoding='utf-8') as f:
                 self.taxonomy = json.load(f)
         except Exception:
             # leave default
@@ -64,56 +108,192 @@ class ONNXClassifier:
         if _HAS_ORT and os.path.exists(model_path):
             try:
                 quant_path = model_path.replace('.onnx', '.quant.onnx')
-                use_path = quant_path if os.path.exists(quant_path) else model_path
-                self.session = ort.InferenceSession(use_path, providers=['CPUExecutionProvider'])
+                use_path = quant_path if prefer_quantized and os.path.exists(quant_path) else model_path
+                self.session = create_session(use_path)
+                self.quantized = use_path == quant_path
                 self.input_name = self.session.get_inputs()[0].name
-                self.output_name = self.session.get_outputs()[0].name
+                self._select_output()
             except Exception:
                 self.session = None
+            else:
+                self._load_linear_weights(use_path)
+                if self.n_classes is None and self.coef is not None:
+                    self.n_classes = self.coef.shape[0]
 
         # if session not created, replace with stub
         if self.session is None:
-            self._stub = StubClassifier()
+            self._stub = StubClassifier(self.taxonomy_path)
+            self.version = None
         else:
             self._stub = None
 
     def predict(self, embedding):
         if self._stub is not None:
             return self._stub.predict(embedding)
+        return self.predict_batch([embedding])[0]
+
+    def _select_output(self):
+        """Fetch only the probability tensor; older exports fall back to raw scores or the ZipMap output."""
+        outputs = self.session.get_outputs()
+        by_name = {o.name: o for o in outputs}
+        labels = self.taxonomy.get('labels', ['others'])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        classes = json.loads(meta['classes']) if 'classes' in meta else None
+        if 'probabilities' in by_name:
+            self.output_name, self.output_kind = 'probabilities', 'probabilities'
+        else:
+            tensor = next((o for o in outputs if o.type == 'tensor(float)'), None)
+            if tensor is not None:
+                self.output_name, self.output_kind = tensor.name, 'scores'
+            else:
+                self.output_name, self.output_kind = outputs[-1].name, 'zipmap'
+        shape = by_name[self.output_name].shape
+        if self.output_kind != 'zipmap' and len(shape) == 2 and isinstance(shape[1], int):
+            self.n_classes = shape[1]
+        elif classes is not None:
+            self.n_classes = len(classes)
+        # classes_ can be a subset of the taxonomy when a label had no training rows
+        self.column_labels = [labels[int(c)] if int(c) < len(labels) else str(c) for c in classes] \
+            if classes is not None else list(labels)
+
+    def _run_bound(self, inp):
+        """session.run through a per-thread IOBinding whose output buffer is reused across calls.
+
+        The buffer only grows (geometrically), so after a few calls no batch size allocates. The returned
+        array is a view of that buffer and is overwritten by this thread's next call.
+        """
+        local = self._local
+        binding = getattr(local, 'binding', None)
+        if binding is None:
+            binding = local.binding = self.session.io_binding()
+            local.out = np.empty((0, self.n_classes), dtype=np.float32)
+        n = inp.shape[0]
+        if local.out.shape[0] < n:
+            local.out = np.empty((max(n, 2 * local.out.shape[0], 8), self.n_classes), dtype=np.float32)
+        out = local.out[:n]
+        binding.bind_cpu_input(self.input_name, inp)
+        binding.bind_output(self.output_name, 'cpu', 0, np.float32, [n, self.n_classes], out.ctypes.data)
+        self.session.run_with_iobinding(binding)
+        return out
+
+    def _probabilities(self, inp):
+        if self.output_kind == 'probabilities' and settings.ORT_IO_BINDING and self.n_classes:
+            return self._run_bound(inp)
+        out = self.session.run([self.output_name], {self.input_name: inp})[0]
+        if self.output_kind == 'scores':
+            return self._softmax(out)
+        if self.output_kind == 'zipmap':
+            keys = sorted(out[0]) if len(out) else []
+            return np.array([[row[k] for k in keys] for row in out], dtype=np.float32)
+        return out
 
-        # ONNX expects batch dim and float32 numpy
-        inp = np.array(embedding, dtype=np.float32)
+    def predict_batch(self, embeddings):
+        if self._stub is not None:
+            return self._stub.predict_batch(embeddings)
+
+        # ONNX expects batch dim and float32 numpy; one session.run for the whole batch
+        inp = np.ascontiguousarray(embeddings, dtype=np.float32)
         if inp.ndim == 1:
             inp = inp.reshape(1, -1)
-        preds = self.session.run([self.output_name], {self.input_name: inp})[0]
-        probs = self._softmax(preds)[0]
-        idx = int(np.argmax(probs))
-        return self.taxonomy.get('labels', ['others'])[idx], float(probs[idx]), probs.tolist()
+        probs = self._probabilities(inp)
+        idx = probs.argmax(axis=1)
+        confidence = probs[np.arange(len(idx)), idx].tolist()
+        # one copy out of the reused buffer; rows are handed out as views of it
+        probs = probs.copy()
+        labels = self.column_labels
+        return [(labels[i], c, p) for i, c, p in zip(idx.tolist(), confidence, probs)]
 
     def _softmax(self, x):
         e_x = np.exp(x - np.max(x, axis=1, keepdims=True))
         return e_x / e_x.sum(axis=1, keepdims=True)
 
-    def shap_explain(self, embedding):
-        # Use KernelExplainer if available, otherwise return stub
+    def _load_linear_weights(self, path: str):
+        """Read coef/intercept once at startup from the LinearClassifier node (or the sklearn pickle)."""
+        coef = intercept = None
+        try:
+            import onnx
+            from onnx import helper as onnx_helper
+        except Exception:
+            onnx = None
+        if onnx is not None:
+            try:
+                for node in onnx.load(path).graph.node:
+                    if node.op_type == 'LinearClassifier':
+                        attrs = {a.name: onnx_helper.get_attribute_value(a) for a in node.attribute}
+                        intercept = np.asarray(attrs['intercepts'], dtype=np.float32)
+                        coef = np.asarray(attrs['coefficients'], dtype=np.float32).reshape(len(intercept), -1)
+                        break
+            except Exception:
+                coef = intercept = None
+        if coef is None and os.path.exists(self.model_path + '.pkl'):
+            try:
+                import joblib
+                clf = joblib.load(self.model_path + '.pkl')
+                coef = np.asarray(clf.coef_, dtype=np.float32)
+                intercept = np.asarray(clf.intercept_, dtype=np.float32)
+            except Exception:
+                coef = intercept = None
+        if coef is not None:
+            self.coef = coef
+            self.intercept = intercept
+            # same all-zeros background the KernelExplainer path uses
+            self.baseline = np.zeros(coef.shape[1], dtype=np.float32)
+
+    def linear_explain_batch(self, embeddings, top_k: int = None):
+        """Exact per-feature contributions coef * (x - baseline) of a linear model, one NumPy pass.
+
+        With top_k, only the largest-magnitude contributions to the predicted class are returned.
+        """
+        x = np.asarray(embeddings, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        delta = x - self.baseline
+        base_values = self.coef @ self.baseline + self.intercept
+        labels = self.column_labels
+        if not top_k:
+            contrib = delta[:, None, :] * self.coef[None, :, :]
+            return [{'method': 'linear', 'base_values': base_values.tolist(), 'shap_values': c.tolist()}
+                    for c in contrib]
+        pred = np.argmax(x @ self.coef.T + self.intercept, axis=1)
+        contrib = delta * self.coef[pred]
+        out = []
+        for row, cls in zip(contrib, pred):
+            payload = {'method': 'linear', 'class': labels[int(cls)] if int(cls) < len(labels) else int(cls),
+                       'base_value': float(base_values[cls])}
+            payload.update(_sparse_top_k(row, top_k))
+            out.append(payload)
+        return out
+
+    def shap_explain(self, embedding, top_k: int = None):
+        """Cheap per-request attributions; exact for linear models, never runs KernelExplainer."""
         if self._stub is not None:
             return self._stub.shap_explain(embedding)
+        if self.coef is None:
+            return {'error': 'exact attributions need a linear model; use /explain?method=kernel'}
+        return self.linear_explain_batch([embedding], top_k=top_k)[0]
+
+    def kernel_explain(self, embedding, nsamples: int = 30):
+        # Use KernelExplainer if available, otherwise return stub
+        if self._stub is not None:
+            return self._stub.kernel_explain(embedding)
 
-        if not _HAS_SHAP:
+        shap = _load_shap()
+        if shap is None:
             return {'shap_values': ['shap not available']}
 
         try:
-            background = np.zeros((1, len(embedding)), dtype=np.float32)
+            if self._kernel_explainer is None:
+                background = np.zeros((1, len(embedding)), dtype=np.float32)
 
-            def f(x):
-                if x.ndim == 1:
-                    x = x.reshape(1, -1)
-                preds = self.session.run([self.output_name], {self.input_name: x.astype(np.float32)})[0]
-                return self._softmax(preds)
+                def f(x):
+                    if x.ndim == 1:
+                        x = x.reshape(1, -1)
+                    return np.array(self._probabilities(np.ascontiguousarray(x, dtype=np.float32)))
 
-            explainer = shap.KernelExplainer(f, background)
-            shap_vals = explainer.shap_values(np.array(embedding).reshape(1, -1), nsamples=30)
+                # built on first use and reused; the background never changes
+                self._kernel_explainer = shap.KernelExplainer(f, background)
+            shap_vals = self._kernel_explainer.shap_values(np.array(embedding).reshape(1, -1), nsamples=nsamples)
             vals = [v.tolist() for v in shap_vals]
-            return {'shap_values': vals}
+            return {'method': 'kernel', 'shap_values': vals}
         except Exception as e:
             return {'error': str(e)}
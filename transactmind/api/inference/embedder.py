@@ -1,13 +1,38 @@
-"""Embedder wrapper with a lightweight stub fallback when SentenceTransformer or model isn't available."""
+"""Embedder wrapper with a lightweight stub fallback when SentenceTransformer or model isn't available.
+
+Two real backends exist: the exported MiniLM ONNX graph (mean pooling + L2 normalization baked in, run by
+onnxruntime with a fast `tokenizers` tokenizer, no torch import) and SentenceTransformer as a fallback.
+"""
 import os
 try:
-    from sentence_transformers import SentenceTransformer
     import numpy as np
-    _HAS_ST = True
+    _HAS_NP = True
 except Exception:
-    SentenceTransformer = None
     import math as np
-    _HAS_ST = False
+    _HAS_NP = False
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    _HAS_ORT = _HAS_NP
+except Exception:
+    ort = None
+    Tokenizer = None
+    _HAS_ORT = False
+
+from api.inference.sessions import create_session, intra_op_threads
+from api.utils.metrics import STUB_FALLBACKS
+
+_STUB_EMBEDS = STUB_FALLBACKS.labels(component='embedder')
+
+
+def _load_sentence_transformer(model_name: str):
+    # imported lazily: sentence_transformers pulls in torch, which the ONNX backend never needs
+    from sentence_transformers import SentenceTransformer
+    import torch
+    # same per-worker thread budget as the ONNX sessions
+    torch.set_num_threads(intra_op_threads())
+    return SentenceTransformer(model_name)
 
 
 class StubEmbedder:
@@ -15,36 +40,81 @@ class StubEmbedder:
         self.dim = dim
 
     def embed(self, texts):
-        # deterministic small embedding per input
+        _STUB_EMBEDS.inc(len(texts))
+        # deterministic small embedding per input; independent of the position in the
+        # batch so a batched call returns the same vectors as one call per text
+        vec = [0.001 * (1 + j % 10) for j in range(self.dim)]
+        return [list(vec) for _ in texts]
+
+
+class ONNXSentenceEncoder:
+    """MiniLM exported by training/export_to_onnx.export_embedder; mirrors SentenceTransformer.encode."""
+
+    def __init__(self, model_path: str, tokenizer_dir: str, max_length: int = 256, batch_size: int = 64):
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(os.path.join(tokenizer_dir, 'tokenizer.json'))
+        pad_id = self.tokenizer.token_to_id('[PAD]') or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token='[PAD]')
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.session = create_session(model_path)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.output_name = self.session.get_outputs()[0].name
+
+    def encode(self, texts, batch_size: int = None, **kwargs):
+        batch_size = batch_size or self.batch_size
         out = []
-        for i, _ in enumerate(texts):
-            vec = [0.001 * ((i + 1) % 10 + j % 10) for j in range(self.dim)]
-            out.append(vec)
-        return out
+        for start in range(0, len(texts), batch_size):
+            encs = self.tokenizer.encode_batch(list(texts[start:start + batch_size]))
+            feed = {
+                'input_ids': np.array([e.ids for e in encs], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encs], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encs], dtype=np.int64),
+            }
+            feed = {k: v for k, v in feed.items() if k in self.input_names}
+            out.append(self.session.run([self.output_name], feed)[0])
+        if not out:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1]), dtype=np.float32)
+        return np.vstack(out)
 
 
 class Embedder:
-    def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2'):
+    def __init__(self, model_name: str = 'sentence-transformers/all-MiniLM-L6-v2', backend: str = 'auto',
+                 onnx_path: str = 'api/models/embedder.onnx', tokenizer_dir: str = 'api/models/embedder_tokenizer',
+                 prefer_quantized: bool = True):
         self.model_name = model_name
         self.is_stub = False
-        if _HAS_ST:
+        self.backend = None
+        self.model = None
+        if backend in ('auto', 'onnx') and _HAS_ORT and os.path.exists(onnx_path):
+            quant_path = onnx_path.replace('.onnx', '.quant.onnx')
+            use_path = quant_path if prefer_quantized and os.path.exists(quant_path) else onnx_path
+            try:
+                self.model = ONNXSentenceEncoder(use_path, tokenizer_dir)
+                self.backend = 'onnx-int8' if use_path == quant_path else 'onnx'
+            except Exception:
+                self.model = None
+        if self.model is None and backend in ('auto', 'sentence-transformers'):
             try:
-                self.model = SentenceTransformer(model_name)
+                self.model = _load_sentence_transformer(model_name)
+                self.backend = 'sentence-transformers'
             except Exception:
                 # fallback to stub if model cannot be loaded (network/offline)
-                self.model = StubEmbedder()
-                self.is_stub = True
-        else:
+                self.model = None
+        if self.model is None:
             self.model = StubEmbedder()
+            self.backend = 'stub'
             self.is_stub = True
 
-    def embed(self, texts):
+    def encode(self, texts):
+        """The model's vectors; unlike embed, a failing model raises instead of returning stub vectors."""
         if getattr(self.model, 'encode', None):
-            try:
-                embs = self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
-                return embs
-            except Exception:
-                # fallback to stub behavior
-                return StubEmbedder().embed(texts)
-        else:
-            return self.model.embed(texts)
+            return self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True)
+        return self.model.embed(texts)
+
+    def embed(self, texts):
+        try:
+            return self.encode(texts)
+        except Exception:
+            # fallback to stub behavior
+            return StubEmbedder().embed(texts)
@@ -0,0 +1,230 @@
+"""Two-tier embedding cache keyed on preprocessed text + model name.
+
+Tier 1 is a bounded in-process LRU. Tier 2 (optional) is an open-addressed hash table stored in two
+memory-mapped files (uint64 keys, float32 rows) that survives restarts and is shared by every worker
+process mapping the same directory.
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from api.inference.embedder import StubEmbedder
+from api.inference.preprocess import preprocess_text
+from api.utils.metrics import EMBED_CACHE_EVICTIONS, EMBED_CACHE_HITS, EMBED_CACHE_MISSES
+
+try:
+    import numpy as np
+    _HAS_NP = True
+except Exception:
+    np = None
+    _HAS_NP = False
+
+try:
+    import fcntl
+except Exception:
+    # Windows: writers in one process are still serialized by the thread lock
+    fcntl = None
+
+
+def _slug(model_name: str) -> str:
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+
+
+def cache_key(text: str, model_name: str) -> int:
+    digest = hashlib.blake2b(f'{model_name}\x00{preprocess_text(text)}'.encode('utf-8'), digest_size=8).digest()
+    # 0 marks an empty slot in the disk table
+    return int.from_bytes(digest, 'little') or 1
+
+
+class DiskEmbeddingStore:
+    def __init__(self, directory: str, model_name: str, dim: int, capacity: int = 1 << 18, max_probe: int = 16):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f'{_slug(model_name)}.{dim}')
+        self.dim = dim
+        self.max_probe = max_probe
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(base + '.lock', 'a+')
+
+        meta_path = base + '.json'
+        with self._locked():
+            if os.path.exists(meta_path):
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    capacity = int(json.load(f)['capacity'])
+                mode = 'r+'
+            else:
+                mode = 'w+'
+            self.capacity = capacity
+            self.keys = np.memmap(base + '.keys', dtype=np.uint64, mode=mode, shape=(capacity,))
+            self.vectors = np.memmap(base + '.f32', dtype=np.float32, mode=mode, shape=(capacity, dim))
+            if mode == 'w+':
+                self.keys.flush()
+                self.vectors.flush()
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model_name': model_name, 'dim': dim, 'capacity': capacity}, f)
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def get(self, key: int):
+        key = np.uint64(key)
+        slot = int(key % np.uint64(self.capacity))
+        for _ in range(self.max_probe):
+            k = self.keys[slot]
+            if k == key:
+                vec = np.array(self.vectors[slot])
+                # lock-free read: re-check the key in case a writer replaced the row meanwhile
+                if self.keys[slot] == key:
+                    return vec
+                return None
+            if k == 0:
+                return None
+            slot = (slot + 1) % self.capacity
+        return None
+
+    def put(self, key: int, vec) -> bool:
+        """Store a row; returns True when an existing entry had to be evicted to make room."""
+        key = np.uint64(key)
+        home = int(key % np.uint64(self.capacity))
+        with self._locked():
+            slot = home
+            for _ in range(self.max_probe):
+                k = self.keys[slot]
+                if k == key:
+                    return False
+                if k == 0:
+                    # write the row before publishing the key so readers never see a half-written row
+                    self.vectors[slot] = vec
+                    self.keys[slot] = key
+                    return False
+                slot = (slot + 1) % self.capacity
+            self.keys[home] = 0
+            self.vectors[home] = vec
+            self.keys[home] = key
+            return True
+
+    def flush(self):
+        self.keys.flush()
+        self.vectors.flush()
+
+
+class CachedEmbedder:
+    def __init__(self, embedder, model_name: str = None, max_entries: int = 50000,
+                 disk_dir: str = None, disk_capacity: int = 1 << 18):
+        self.embedder = embedder
+        self.model_name = model_name or getattr(embedder, 'model_name', type(embedder).__name__)
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir if _HAS_NP else None
+        self.disk_capacity = disk_capacity
+        self.disk = None
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        if self.disk_dir:
+            self._open_existing_store()
+
+    def __getattr__(self, name):
+        # expose is_stub, model, dim ... of the wrapped embedder
+        return getattr(self.embedder, name)
+
+    def _lru_get(self, key):
+        with self._lock:
+            vec = self._lru.get(key)
+            if vec is not None:
+                self._lru.move_to_end(key)
+            return vec
+
+    def _lru_put(self, key, vec):
+        evicted = 0
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                evicted += 1
+        if evicted:
+            EMBED_CACHE_EVICTIONS.labels(tier='memory').inc(evicted)
+
+    def _open_existing_store(self):
+        # reopen the table left by a previous run (or another worker) so it serves hits before any miss
+        meta = glob.glob(os.path.join(self.disk_dir, _slug(self.model_name) + '.*.json'))
+        if meta:
+            try:
+                with open(meta[0], 'r', encoding='utf-8') as f:
+                    self._disk_store(int(json.load(f)['dim']))
+            except Exception:
+                pass
+
+    def _disk_store(self, dim: int):
+        if self.disk is None and self.disk_dir:
+            try:
+                self.disk = DiskEmbeddingStore(self.disk_dir, self.model_name, dim, capacity=self.disk_capacity)
+            except Exception:
+                # an unusable cache directory must never break inference
+                self.disk_dir = None
+        return self.disk
+
+    def _embed_missing(self, texts):
+        """Vectors for the cache misses, and whether they may be cached."""
+        encode = getattr(self.embedder, 'encode', None)
+        if encode is None:
+            return self.embedder.embed(texts), True
+        try:
+            return encode(texts), True
+        except Exception:
+            # what Embedder.embed falls back to; served for this call but kept out of both tiers, where
+            # it would outlive the failure (and size the disk table from the stub's width)
+            return StubEmbedder().embed(texts), False
+
+    def embed(self, texts):
+        keys = [cache_key(t, self.model_name) for t in texts]
+        out = [None] * len(texts)
+        missing = OrderedDict()
+        memory_hits = disk_hits = 0
+        for i, key in enumerate(keys):
+            vec = self._lru_get(key)
+            if vec is not None:
+                memory_hits += 1
+                out[i] = vec
+                continue
+            vec = self.disk.get(key) if self.disk is not None else None
+            if vec is not None:
+                disk_hits += 1
+                self._lru_put(key, vec)
+                out[i] = vec
+                continue
+            missing.setdefault(key, []).append(i)
+        if memory_hits:
+            EMBED_CACHE_HITS.labels(tier='memory').inc(memory_hits)
+        if disk_hits:
+            EMBED_CACHE_HITS.labels(tier='disk').inc(disk_hits)
+
+        if missing:
+            EMBED_CACHE_MISSES.inc(len(missing))
+            # duplicates within one batch are embedded once
+            fresh, cacheable = self._embed_missing([texts[idxs[0]] for idxs in missing.values()])
+            for (key, idxs), vec in zip(missing.items(), fresh):
+                if _HAS_NP:
+                    vec = np.asarray(vec, dtype=np.float32)
+                if cacheable:
+                    self._lru_put(key, vec)
+                    disk = self._disk_store(len(vec))
+                    if disk is not None and disk.put(key, vec):
+                        EMBED_CACHE_EVICTIONS.labels(tier='disk').inc()
+                for i in idxs:
+                    out[i] = vec
+
+        if _HAS_NP and out:
+            return np.stack(out)
+        return out
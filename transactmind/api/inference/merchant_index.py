@@ -0,0 +1,247 @@
+"""Exact-match merchant fast path: known merchants get their category without running the models.
+
+Merchant strings are normalized (case, store numbers, POS/processor noise) and looked up in a hash
+index of canonical merchants built from the taxonomy examples, corrected rows in the feedback CSV and
+optional bulk merchant files. A query also matches the longest canonical merchant that is a token prefix
+of it ("walmart supercenter grocery purchase" -> "walmart supercenter").
+
+    python -m api.inference.merchant_index   # rebuild api/models/merchant_index.json
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api.utils.logger import logger
+from api.utils.metrics import MERCHANT_INDEX_SIZE, MERCHANT_LOOKUPS
+
+# processor / terminal prefixes that say nothing about the merchant
+_POS_PREFIX = re.compile(
+    r'^(?:(?:pos|debit|credit|card|purchase|visa|mastercard|checkcard|recurring|payment|ach|pre-?auth)\b[\s:-]*)+'
+    r'|^(?:sq|tst|sp|pp|paypal|ppl|dd|in)\s*\*\s*')
+# the same noise after the merchant ("... 567 card xxxx9876")
+_POS_SUFFIX = re.compile(r'(?:\s+(?:pos|debit|credit|card|purchase|checkcard|recurring|payment))+$')
+_CARD_SUFFIX = re.compile(r'\b(?:x{2,}|\*{2,})\d+\b')
+_DATE = re.compile(r'\b\d{1,2}[/-]\d{1,2}(?:[/-]\d{2,4})?\b')
+_STORE_NUMBER = re.compile(r'(?:#|\bno\.?\s*|\bstore\s+|\bunit\s+)?\b\d+\b')
+_NON_WORD = re.compile(r'[^a-z0-9&\' ]+')
+
+
+def normalize_merchant(text: str) -> str:
+    s = text.lower().strip()
+    s = _CARD_SUFFIX.sub(' ', s)
+    s = _DATE.sub(' ', s)
+    s = _POS_PREFIX.sub('', s)
+    s = _STORE_NUMBER.sub(' ', s)
+    s = _NON_WORD.sub(' ', s)
+    return _POS_SUFFIX.sub('', ' '.join(s.split()))
+
+
+class MerchantIndex:
+    def __init__(self, entries: Optional[Dict[str, Tuple[str, float, str]]] = None, prefix_match: bool = True):
+        # normalized merchant -> (category, confidence, source)
+        self.entries = dict(entries or {})
+        self.prefix_match = prefix_match
+        self.max_tokens = max((len(k.split()) for k in self.entries), default=0)
+        # content digest, reported as the model_version of fast-path answers
+        digest = hashlib.sha1(json.dumps(sorted(self.entries.items())).encode('utf-8')).hexdigest()
+        self.version = f'merchant_index@{digest[:8]}'
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, text: str) -> Optional[dict]:
+        key = normalize_merchant(text)
+        if not key:
+            return None
+        hit = self.entries.get(key)
+        if hit is None and self.prefix_match:
+            tokens = key.split()
+            for n in range(min(len(tokens) - 1, self.max_tokens), 0, -1):
+                hit = self.entries.get(' '.join(tokens[:n]))
+                if hit is not None:
+                    key = ' '.join(tokens[:n])
+                    break
+        if hit is None:
+            return None
+        category, confidence, source = hit
+        return {'merchant': key, 'category': category, 'confidence': confidence, 'source': source,
+                'version': self.version}
+
+    def save(self, path: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({k: list(v) for k, v in self.entries.items()}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, prefix_match: bool = True):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls({k: tuple(v) for k, v in json.load(f).items()}, prefix_match=prefix_match)
+
+
+def merchant_rationale(hit: dict) -> str:
+    return f"Known merchant '{hit['merchant']}' (source: {hit['source']})."
+
+
+def _taxonomy_labels(path: str) -> set:
+    with open(path, 'r', encoding='utf-8') as f:
+        return set(json.load(f).get('labels', []))
+
+
+def _taxonomy_rows(path: str) -> Iterable[Tuple[str, str]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        for ex in json.load(f).get('examples', []):
+            yield ex['text'], ex['category']
+
+
+def _feedback_rows(path: str) -> Iterable[Tuple[str, str]]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('text') and row.get('correct'):
+                yield row['text'], row['correct'].strip()
+
+
+def _merchant_file_rows(path: str) -> Iterable[Tuple[str, str]]:
+    # bulk merchant files: CSV with merchant/text and category columns
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            text = row.get('merchant') or row.get('text') or row.get('transaction')
+            if text and row.get('category'):
+                yield text, row['category'].strip()
+
+
+def build_merchant_index(taxonomy_path: str, feedback_path: Optional[str] = None,
+                         merchant_paths: Iterable[str] = (), taxonomy_confidence: float = 0.99,
+                         feedback_confidence: float = 1.0, prefix_match: bool = True) -> MerchantIndex:
+    """Sources are applied in order (taxonomy, merchant files, feedback); later sources win.
+
+    Merchants that map to several categories within one source are ambiguous and left to the models. Rows
+    whose category is not one of the taxonomy labels are dropped and counted in a warning.
+    """
+    sources = []
+    labels = set()
+    if taxonomy_path and os.path.exists(taxonomy_path):
+        labels = _taxonomy_labels(taxonomy_path)
+        sources.append(('taxonomy', taxonomy_confidence, _taxonomy_rows(taxonomy_path)))
+    for path in merchant_paths:
+        if os.path.exists(path):
+            sources.append(('merchants', taxonomy_confidence, _merchant_file_rows(path)))
+    if feedback_path and os.path.exists(feedback_path):
+        sources.append(('feedback', feedback_confidence, _feedback_rows(feedback_path)))
+
+    entries: Dict[str, Tuple[str, float, str]] = {}
+    for source, confidence, rows in sources:
+        seen: Dict[str, Optional[str]] = {}
+        unknown = 0
+        for text, category in rows:
+            if labels and category not in labels:
+                # a typo or another taxonomy's category: the fast path would answer with it for good
+                unknown += 1
+                continue
+            key = normalize_merchant(text)
+            if not key:
+                continue
+            if source != 'feedback' and key in seen and seen[key] != category:
+                seen[key] = None
+            else:
+                # feedback rows are corrections: the latest one for a merchant wins
+                seen[key] = category
+        if unknown:
+            logger.warning('merchant index: dropped %d %s rows with a category outside the taxonomy', unknown, source)
+        for key, category in seen.items():
+            if category is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = (category, confidence, source)
+    return MerchantIndex(entries, prefix_match=prefix_match)
+
+
+class MerchantIndexHandle:
+    """Holds the current MerchantIndex and swaps in a rebuilt one when a source file changes."""
+
+    def __init__(self, taxonomy_path: str, feedback_path: Optional[str] = None, merchant_paths: List[str] = (),
+                 index_path: Optional[str] = None, reload_interval_s: float = 30.0, **build_kwargs):
+        self.taxonomy_path = taxonomy_path
+        self.feedback_path = feedback_path
+        self.merchant_paths = list(merchant_paths)
+        self.index_path = index_path
+        self.reload_interval_s = reload_interval_s
+        self.build_kwargs = build_kwargs
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._checked_at = 0.0
+        self._mtimes = self._source_mtimes()
+        self.index = self._initial_index()
+        MERCHANT_INDEX_SIZE.set(len(self.index))
+
+    def _source_mtimes(self):
+        paths = [self.taxonomy_path, self.feedback_path] + self.merchant_paths
+        return tuple(os.path.getmtime(p) if p and os.path.exists(p) else None for p in paths)
+
+    def _initial_index(self) -> MerchantIndex:
+        # a precomputed index is only trusted if it is newer than every source
+        if self.index_path and os.path.exists(self.index_path):
+            built = os.path.getmtime(self.index_path)
+            if all(m is None or m <= built for m in self._mtimes):
+                try:
+                    return MerchantIndex.load(self.index_path, self.build_kwargs.get('prefix_match', True))
+                except Exception:
+                    pass
+        return self._build()
+
+    def _build(self) -> MerchantIndex:
+        return build_merchant_index(self.taxonomy_path, self.feedback_path, self.merchant_paths, **self.build_kwargs)
+
+    def reload(self) -> int:
+        index = self._build()
+        with self._lock:
+            self.index = index
+            self._mtimes = self._source_mtimes()
+        if self.index_path:
+            try:
+                index.save(self.index_path)
+            except Exception:
+                pass
+        MERCHANT_INDEX_SIZE.set(len(index))
+        return len(index)
+
+    def maybe_reload(self):
+        """Rebuild in a background thread when a source changed; lookups keep using the old index meanwhile."""
+        now = time.monotonic()
+        if self._reloading or now - self._checked_at < self.reload_interval_s:
+            return
+        self._checked_at = now
+        if self._source_mtimes() != self._mtimes:
+            self._reloading = True
+            threading.Thread(target=self._background_reload, name='merchant-reload', daemon=True).start()
+
+    def _background_reload(self):
+        try:
+            self.reload()
+        except Exception:
+            pass
+        finally:
+            self._reloading = False
+
+    def lookup(self, text: str) -> Optional[dict]:
+        self.maybe_reload()
+        hit = self.index.lookup(text)
+        MERCHANT_LOOKUPS.labels(result='hit' if hit is not None else 'miss').inc()
+        return hit
+
+    def __len__(self):
+        return len(self.index)
+
+
+if __name__ == '__main__':
+    from api.utils.config import settings
+    index = build_merchant_index(settings.TAXONOMY_PATH, settings.FEEDBACK_PATH, settings.MERCHANT_FILES,
+                                 taxonomy_confidence=settings.MERCHANT_CONFIDENCE,
+                                 prefix_match=settings.MERCHANT_PREFIX_MATCH)
+    index.save(settings.MERCHANT_INDEX_PATH)
+    print(f'Saved {len(index)} merchants to', settings.MERCHANT_INDEX_PATH)
@@ -0,0 +1,36 @@
+"""Hashed character n-gram features for the first-stage cascade classifier.
+
+Shared by training (training/export_to_onnx.py) and serving so both see identical vectors. crc32 is
+used instead of hash() because Python's string hashing is randomized per process.
+"""
+import zlib
+from typing import List, Sequence
+
+import numpy as np
+
+N_FEATURES = 1 << 14
+NGRAM_RANGE = (2, 4)
+
+
+def _ngrams(text: str, ngram_range=NGRAM_RANGE):
+    # pad with spaces so word boundaries become features ("wal" vs " wa")
+    words = text.lower().split()
+    if not words:
+        return
+    s = f" {' '.join(words)} "
+    lo, hi = ngram_range
+    for n in range(lo, hi + 1):
+        for i in range(len(s) - n + 1):
+            yield s[i:i + n]
+
+
+def hashed_ngrams(texts: Sequence[str], n_features: int = N_FEATURES, ngram_range=NGRAM_RANGE) -> np.ndarray:
+    """(len(texts), n_features) float32 matrix of L2-normalized n-gram counts."""
+    out = np.zeros((len(texts), n_features), dtype=np.float32)
+    for row, text in enumerate(texts):
+        cols: List[int] = [zlib.crc32(g.encode('utf-8')) % n_features for g in _ngrams(text, ngram_range)]
+        if cols:
+            np.add.at(out[row], cols, 1.0)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
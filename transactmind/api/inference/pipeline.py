@@ -0,0 +1,431 @@
+"""Component construction and picklable stage functions run by the inference executor.
+
+Stage functions read the module-level component set: the API process installs its own with
+`set_components`, and process-pool workers build a private copy in `init_worker`.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from api.agents.summary_service import template_summary
+from api.inference.bulk import classify_rows
+from api.inference.cascade import cascade_classify
+from api.inference.registry import DEFAULT_MODEL
+from api.inference.sessions import fingerprint, variant_path
+from api.utils.config import settings
+from api.utils.logger import logger
+from api.utils.metrics import MODEL_SWAPS, MODEL_VERSION
+from api.utils.tracing import timed
+
+_components: Dict = {}
+# fork-safe read-only artifacts loaded by `preload_shared` in the gunicorn master
+_preloaded: Dict = {}
+
+
+_manifest = None
+_manifest_stamp = None
+
+
+def _read_manifest() -> Dict:
+    """{'embedder': choice, 'classifiers': {model path: choice}} minus artifacts re-exported since evaluation."""
+    out = {'classifiers': {}}
+    try:
+        with open(settings.VARIANT_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except Exception:
+        return out
+    out['present'] = True
+    entries = dict(manifest.get('classifiers', {}))
+    # manifests written before per-model entries describe a single classifier
+    legacy = manifest.get('artifacts', {}).get('classifier')
+    if legacy and 'classifier' in manifest.get('selected', {}):
+        entries.setdefault(legacy['path'], dict(legacy, selected=manifest['selected']['classifier']))
+    for path, entry in entries.items():
+        fingerprints = {v: fp for v, fp in entry.items() if v in ('fp32', 'int8')}
+        if any(fingerprint(variant_path(path, v)) != fp for v, fp in fingerprints.items()):
+            logger.warning('classifier variant manifest entry for %s is stale (re-exported); serving fp32', path)
+            continue
+        out['classifiers'][os.path.normpath(path)] = entry['selected']
+    embedder = manifest.get('artifacts', {}).get('embedder', {})
+    choice = manifest.get('selected', {}).get('embedder')
+    if choice is not None:
+        if any(fingerprint(variant_path(embedder['path'], v)) != fp for v, fp in embedder.items() if v != 'path'):
+            logger.warning('embedder variant manifest is stale (artifacts re-exported); using defaults')
+        else:
+            out['embedder'] = choice
+    return out
+
+
+def variant_manifest() -> Dict:
+    """The selection written by training/select_variants.py, re-read whenever the manifest file changes."""
+    global _manifest, _manifest_stamp
+    stamp = fingerprint(settings.VARIANT_MANIFEST_PATH)
+    if _manifest is None or stamp != _manifest_stamp:
+        _manifest, _manifest_stamp = _read_manifest(), stamp
+    return _manifest
+
+
+def prefer_quantized(component: str, model_path: Optional[str] = None) -> bool:
+    """Serve the int8 artifact? The measured selection when there is one, else the PREFER_QUANTIZED setting.
+
+    Classifier selections are per model file: a version the manifest never evaluated (a hot-swapped online
+    update, a registry model) or one re-exported since is served fp32 once a manifest exists.
+    """
+    manifest = variant_manifest()
+    if component == 'embedder':
+        choice = manifest.get('embedder')
+        return settings.EMBEDDER_PREFER_QUANTIZED if choice is None else choice == 'int8'
+    if not manifest.get('present'):
+        return settings.CLASSIFIER_PREFER_QUANTIZED
+    choice = manifest['classifiers'].get(os.path.normpath(model_path or resolve_model_path()))
+    return choice == 'int8'
+
+
+def _build_embedder():
+    from api.inference.embedder import Embedder
+    from api.inference.embedding_cache import CachedEmbedder
+    try:
+        embedder = Embedder(settings.EMBEDDER_MODEL_NAME, backend=settings.EMBEDDER_BACKEND,
+                            onnx_path=settings.EMBEDDER_ONNX_PATH, tokenizer_dir=settings.EMBEDDER_TOKENIZER_DIR,
+                            prefer_quantized=prefer_quantized('embedder'))
+    except Exception:
+        from api.inference.embedder import StubEmbedder
+        return StubEmbedder()
+
+    # repeated merchant strings skip the embedder entirely
+    if settings.EMBED_CACHE_ENABLED and not getattr(embedder, 'is_stub', True):
+        # fp32 and int8 vectors differ slightly, so the backend is part of the cache key
+        embedder = CachedEmbedder(embedder, model_name=f'{embedder.model_name}@{embedder.backend}',
+                                  max_entries=settings.EMBED_CACHE_SIZE, disk_dir=settings.EMBED_CACHE_DIR,
+                                  disk_capacity=settings.EMBED_CACHE_DISK_CAPACITY)
+    return embedder
+
+
+def resolve_model_path() -> str:
+    """The classifier MODEL_POINTER_PATH points at (see training/online_update.py), else MODEL_PATH."""
+    try:
+        with open(settings.MODEL_POINTER_PATH, 'r', encoding='utf-8') as f:
+            path = json.load(f)['model_path']
+        if os.path.exists(path):
+            return path
+    except Exception:
+        pass
+    return settings.MODEL_PATH
+
+
+def _build_classifier():
+    try:
+        from api.inference.classifier import ONNXClassifier
+        path = resolve_model_path()
+        classifier = ONNXClassifier(path, prefer_quantized=prefer_quantized('classifier', path))
+        MODEL_VERSION.labels(version=classifier.version).set(1)
+        return classifier
+    except Exception:
+        from api.inference.classifier import StubClassifier
+        return StubClassifier()
+
+
+def _build_rag():
+    try:
+        # try to create real RAG engine, else fallback to stub
+        from api.rag.rag_engine import RAGEngine
+        rag = RAGEngine(index=_preloaded.get('rag_index'), index_dir=settings.RAG_INDEX_DIR,
+                        index_mode=settings.RAG_INDEX_MODE, ivf_nlist=settings.RAG_IVF_NLIST,
+                        ivf_nprobe=settings.RAG_IVF_NPROBE,
+                        ivf_min_rows=settings.RAG_IVF_MIN_ROWS, filter_by_category=settings.RAG_FILTER_BY_CATEGORY,
+                        reload_interval_s=settings.RAG_RELOAD_INTERVAL_S)
+        # ensure an index or collection exists, else use stub
+        if getattr(rag, 'index', None) is not None or getattr(rag, 'collection', None) is not None:
+            return rag
+    except Exception:
+        pass
+    from api.rag.rag_engine import StubRAG
+    return StubRAG()
+
+
+def _build_agent():
+    try:
+        from api.agents.agent_controller import AgentController
+        return AgentController()
+    except Exception:
+        # AgentController already falls back to None agent; provide minimal stub
+        return MinimalAgent()
+
+
+def _build_stage1():
+    if not settings.CASCADE_ENABLED:
+        return None
+    try:
+        from api.inference.cascade import FirstStageClassifier
+        return FirstStageClassifier(settings.CASCADE_MODEL_PATH)
+    except Exception:
+        # no exported first stage: every request takes the transformer path
+        return None
+
+
+def _build_merchants():
+    if not settings.MERCHANT_INDEX_ENABLED:
+        return None
+    if 'merchants' in _preloaded:
+        return _preloaded['merchants']
+    from api.inference.merchant_index import MerchantIndexHandle
+    return MerchantIndexHandle(settings.TAXONOMY_PATH, feedback_path=settings.FEEDBACK_PATH,
+                               merchant_paths=settings.MERCHANT_FILES, index_path=settings.MERCHANT_INDEX_PATH,
+                               reload_interval_s=settings.MERCHANT_RELOAD_INTERVAL_S,
+                               taxonomy_confidence=settings.MERCHANT_CONFIDENCE,
+                               prefix_match=settings.MERCHANT_PREFIX_MATCH)
+
+
+COMPONENT_BUILDERS = {
+    'embedder': _build_embedder,
+    'classifier': _build_classifier,
+    'rag': _build_rag,
+    'agent': _build_agent,
+    'merchants': _build_merchants,
+    'stage1': _build_stage1,
+}
+
+
+def is_fallback(name: str, component) -> bool:
+    """True when a stub stands in for the real component."""
+    if name == 'embedder':
+        return bool(getattr(component, 'is_stub', True))
+    if name == 'classifier':
+        return getattr(component, '_stub', component) is not None
+    if name == 'agent':
+        return not getattr(component, 'has_llm', False)
+    if name in ('merchants', 'stage1'):
+        return component is None
+    return type(component).__name__.startswith('Stub')
+
+
+def preload_shared():
+    """Load what forked workers can share before the fork.
+
+    Only read-only, fork-safe state is loaded here: memory-mapped ONNX weights, the memory-mapped
+    exemplar matrix and the merchant index. ORT sessions (with their thread pools), chroma clients and
+    the LLM are created per worker by `build_components`; LlamaCpp mmaps its weights, so those pages
+    are shared through the page cache as well.
+    """
+    from api.inference import sessions
+    models = [resolve_model_path(), settings.EMBEDDER_ONNX_PATH, settings.CASCADE_MODEL_PATH]
+    sessions.preload(*models, *[m.replace('.onnx', '.quant.onnx') for m in models])
+    try:
+        from api.rag.vector_index import VectorIndex
+        _preloaded['rag_index'] = VectorIndex.load(settings.RAG_INDEX_DIR, mode=settings.RAG_INDEX_MODE,
+                                                   nlist=settings.RAG_IVF_NLIST, nprobe=settings.RAG_IVF_NPROBE,
+                                                   ivf_min_rows=settings.RAG_IVF_MIN_ROWS)
+    except Exception:
+        pass
+    merchants = _build_merchants()
+    if merchants is not None:
+        _preloaded['merchants'] = merchants
+
+
+def build_components(status=None, parallel: bool = True) -> Dict:
+    """Create embedder, classifier, RAG engine and agent with defensive fallbacks.
+
+    The builders are independent, so by default they run concurrently: most of their time is spent in
+    imports, file I/O and native model loading, which release the GIL.
+    """
+    def load(name):
+        if status is not None:
+            status.component_loading(name)
+        t0 = time.perf_counter()
+        component = COMPONENT_BUILDERS[name]()
+        if status is not None:
+            status.component_loaded(name, component, time.perf_counter() - t0, is_fallback(name, component))
+        return component
+
+    if not parallel:
+        return {name: load(name) for name in COMPONENT_BUILDERS}
+    with ThreadPoolExecutor(max_workers=len(COMPONENT_BUILDERS), thread_name_prefix='startup') as pool:
+        futures = {name: pool.submit(load, name) for name in COMPONENT_BUILDERS}
+        return {name: fut.result() for name, fut in futures.items()}
+
+
+def warmup(components: Dict, batch_sizes=(1, 8), status=None):
+    """Push a synthetic batch through every stage so lazy allocations happen before real traffic.
+
+    The LLM agent is skipped: summaries are produced in the background and never on the request path.
+    """
+    texts = ['Walmart Supercenter 1234', 'Netflix subscription', 'Delta Airlines ticket', 'Shell Fuel Station 567']
+    timings = {}
+
+    def timed(stage, fn):
+        t0 = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - t0
+        return result
+
+    for bs in batch_sizes:
+        batch = (texts * (bs // len(texts) + 1))[:bs]
+        embs = timed('embed', lambda: components['embedder'].embed(batch))
+        preds = timed('classify', lambda: components['classifier'].predict_batch(embs))
+        timed('shap', lambda: components['classifier'].shap_explain(embs[0], top_k=settings.SHAP_TOP_K))
+        timed('rag', lambda: components['rag'].explain_batch(batch, [p[0] for p in preds], embs))
+        if components.get('stage1') is not None:
+            timed('stage1', lambda: components['stage1'].predict_batch(batch))
+    if status is not None:
+        for stage, seconds in timings.items():
+            status.warmed(stage, seconds)
+    return timings
+
+
+class MinimalAgent:
+    has_llm = False
+
+    def summarize(self, text, category, confidence, rag_exp):
+        return template_summary(category, confidence, rag_exp)
+
+
+def set_components(components: Dict):
+    global _components
+    _components = components
+
+
+def get_components() -> Dict:
+    return _components
+
+
+_in_worker = False
+_swap_lock = threading.Lock()
+_swap_checked_at = 0.0
+
+
+def init_worker():
+    # process-pool initializer: every worker owns a private set of models
+    global _in_worker
+    _in_worker = True
+    set_components(build_components())
+
+
+def current_model_version() -> Optional[str]:
+    return getattr(_components.get('classifier'), 'version', None)
+
+
+def maybe_reload_classifier(force: bool = False) -> Optional[str]:
+    """Swap in the classifier MODEL_POINTER_PATH points at, if it changed; returns the new version.
+
+    The replacement is loaded and warmed before a single dict assignment publishes it. Calls already
+    running keep the classifier object they started with, so in-flight requests are never dropped.
+    """
+    global _swap_checked_at
+    now = time.monotonic()
+    if not force and now - _swap_checked_at < settings.MODEL_RELOAD_INTERVAL_S:
+        return None
+    _swap_checked_at = now
+    path = resolve_model_path()
+    current = _components.get('classifier')
+    if not force and getattr(current, 'model_path', None) == path:
+        return None
+    # one loader at a time; concurrent callers just keep serving the current model
+    if not _swap_lock.acquire(blocking=False):
+        return None
+    try:
+        import numpy as np
+        from api.inference.classifier import ONNXClassifier
+        candidate = ONNXClassifier(path, prefer_quantized=prefer_quantized('classifier', path))
+        if candidate._stub is not None:
+            return None
+        # first run allocates the session's buffers; do it before the model takes traffic
+        dim = candidate.session.get_inputs()[0].shape[1]
+        if not isinstance(dim, int):
+            dim = candidate.coef.shape[1] if candidate.coef is not None else 1
+        candidate.session.run(None, {candidate.input_name: np.zeros((1, dim), dtype=np.float32)})
+        old = getattr(current, 'version', None)
+        _components['classifier'] = candidate
+        MODEL_SWAPS.inc()
+        if old is not None:
+            MODEL_VERSION.labels(version=old).set(0)
+        MODEL_VERSION.labels(version=candidate.version).set(1)
+        return candidate.version
+    finally:
+        _swap_lock.release()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The model registry of this process (process-pool workers each hold their own, under the same budget)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from api.inference.registry import ModelRegistry
+                _registry = ModelRegistry(settings.MODEL_REGISTRY_DIR, settings.MODEL_REGISTRY_BUDGET_MB << 20,
+                                          shared=get_components,
+                                          embedder_bytes=settings.MODEL_REGISTRY_EMBEDDER_MB << 20)
+    return _registry
+
+
+def components_for(model: Optional[str] = None, version: Optional[str] = None) -> Dict:
+    """The serving components, or those of a registry model / version (loaded on first use)."""
+    if model in (None, DEFAULT_MODEL) and version is None:
+        return _components
+    return get_registry().get(model, version)
+
+
+def embed_and_classify(embedder, classifier, texts: List[str]):
+    """One embed call and one classifier call over the whole batch."""
+    with timed('embed'):
+        embs = embedder.embed(texts)
+    with timed('classify'):
+        preds = classifier.predict_batch(embs)
+    return [(emb, cat, conf, probs) for emb, (cat, conf, probs) in zip(embs, preds)]
+
+
+def embed_classify(texts: List[str]):
+    return embed_and_classify(_components['embedder'], _components['classifier'], texts)
+
+
+def classify(texts: List[str]):
+    """Cascade entry point for /predict: (embedding or None, category, confidence, probs, path, version) per text."""
+    if _in_worker:
+        # process-pool workers hold their own classifier and follow the model pointer themselves
+        maybe_reload_classifier()
+    return cascade_classify(_components.get('stage1'), _components['embedder'], _components['classifier'], texts,
+                            settings.CASCADE_THRESHOLD)
+
+
+def classify_model(model: Optional[str], version: Optional[str], texts: List[str]):
+    """`classify` for a registry model: no merchant index or first stage, those belong to the default taxonomy."""
+    components = components_for(model, version)
+    version = components['classifier'].version
+    return [(emb, cat, conf, probs, 'model', version)
+            for emb, cat, conf, probs in embed_and_classify(components['embedder'], components['classifier'], texts)]
+
+
+def shap_explain(embedding, top_k: int = None, model: Optional[str] = None, version: Optional[str] = None):
+    with timed('shap'):
+        return components_for(model, version)['classifier'].shap_explain(
+            embedding, top_k=settings.SHAP_TOP_K if top_k is None else top_k)
+
+
+def kernel_explain(embedding, nsamples: int = None):
+    with timed('kernel_shap'):
+        return _components['classifier'].kernel_explain(embedding, nsamples=nsamples or settings.KERNEL_SHAP_NSAMPLES)
+
+
+def rag_explain(text: str, category: str, embedding=None, model: Optional[str] = None, version: Optional[str] = None):
+    with timed('rag'):
+        return components_for(model, version)['rag'].explain(text, category, embedding=embedding)
+
+
+def summarize(text: str, category: str, confidence: float, rag_exp: str):
+    with timed('agent'):
+        return _components['agent'].summarize(text, category, confidence, rag_exp)
+
+
+def classify_chunk(rows, offset: int = 0, include_shap: bool = False, include_summary: bool = False):
+    return classify_rows(rows, _components['embedder'], _components['classifier'], _components['rag'],
+                         include_shap=include_shap, include_summary=include_summary,
+                         offset=offset, shap_top_k=settings.SHAP_TOP_K, merchants=_components.get('merchants'),
+                         stage1=_components.get('stage1'), cascade_threshold=settings.CASCADE_THRESHOLD)
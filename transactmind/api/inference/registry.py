@@ -0,0 +1,244 @@
+"""Per-request model selection: more taxonomies and classifier versions next to the serving model.
+
+Each model is a directory under MODEL_REGISTRY_DIR:
+
+    <id>/model.onnx           classifier (plus model.quant.onnx / model.onnx.pkl, as for the default model)
+    <id>/taxonomy.json        its label set
+    <id>/meta.json            optional {"embedder": "<model name>"} when trained on another sentence encoder
+    <id>/rag_index/           optional exemplar index (build_rag_db.py --index-dir); else stub rationales
+    <id>/versions/<version>/  optional older/newer classifiers (training/online_update.py layout)
+
+'default' is the model the server starts with; its versions are read from MODEL_VERSIONS_DIR and share
+its taxonomy, exemplar index and embedder. Everything else is loaded on first use and accounted at its
+on-disk size; past the byte budget the least recently used entries are dropped (requests already holding
+one finish with it). Models trained on the serving encoder share its embedder, others get their own,
+cached and evicted like a model.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from api.inference.classifier import ONNXClassifier
+from api.utils.config import settings
+from api.utils.logger import logger
+from api.utils.metrics import (REGISTRY_BYTES, REGISTRY_ENTRIES, REGISTRY_EVICTIONS, REGISTRY_LOAD_SECONDS,
+                               REGISTRY_LOADS, REGISTRY_LOOKUPS)
+
+DEFAULT_MODEL = 'default'
+_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+class UnknownModelError(LookupError):
+    """No such model id / version in the registry (404)."""
+
+
+class ModelLoadError(RuntimeError):
+    """The model exists but cannot serve: missing runtime, stub embedder or mismatched feature size (503)."""
+
+
+def _dir_bytes(path: str) -> int:
+    try:
+        return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+    except OSError:
+        return 0
+
+
+class ModelRegistry:
+    def __init__(self, root: str, budget_bytes: int, shared: Callable[[], Dict],
+                 embedder_bytes: int = 100 << 20, build_embedder: Optional[Callable] = None):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        # the serving components: the default model, and the embedder compatible models share
+        self.shared = shared
+        self.embedder_bytes = embedder_bytes
+        self.build_embedder = build_embedder or _build_embedder
+        # key -> (value, bytes), least recently used first; keys are (model, version) or ('embedder', name)
+        self._entries: 'OrderedDict[Tuple, Tuple[object, int]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple, threading.Lock] = {}
+        self.bytes = 0
+
+    # --- layout ---
+
+    def available(self) -> Dict[str, List[str]]:
+        """Model id -> versions on disk."""
+        out = {DEFAULT_MODEL: self._versions(settings.MODEL_VERSIONS_DIR)}
+        try:
+            names = sorted(os.listdir(self.root))
+        except OSError:
+            names = []
+        for name in names:
+            if name == DEFAULT_MODEL or not _NAME.match(name):
+                continue
+            if os.path.exists(os.path.join(self.root, name, 'model.onnx')):
+                out[name] = self._versions(os.path.join(self.root, name, 'versions'))
+        return out
+
+    @staticmethod
+    def _versions(directory: str) -> List[str]:
+        try:
+            return sorted(v for v in os.listdir(directory) if os.path.exists(os.path.join(directory, v, 'model.onnx')))
+        except OSError:
+            return []
+
+    def paths(self, model: str, version: Optional[str] = None) -> Dict:
+        """Artifacts of (model, version); UnknownModelError when they are not on disk."""
+        for name in (model, version):
+            if name is not None and not (isinstance(name, str) and _NAME.match(name)):
+                raise UnknownModelError(f'invalid model name {name!r}')
+        if model == DEFAULT_MODEL:
+            base, versions_dir = None, settings.MODEL_VERSIONS_DIR
+            model_path, taxonomy = settings.MODEL_PATH, settings.TAXONOMY_PATH
+        else:
+            base = os.path.join(self.root, model)
+            versions_dir = os.path.join(base, 'versions')
+            model_path, taxonomy = os.path.join(base, 'model.onnx'), os.path.join(base, 'taxonomy.json')
+        if version is not None:
+            model_path = os.path.join(versions_dir, version, 'model.onnx')
+        if not os.path.exists(model_path):
+            raise UnknownModelError(f'unknown model {model}' + (f' version {version}' if version else ''))
+        meta = {}
+        if base is not None:
+            try:
+                with open(os.path.join(base, 'meta.json'), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+        return {'model_path': model_path, 'taxonomy_path': taxonomy, 'embedder': meta.get('embedder'),
+                'index_dir': None if base is None else os.path.join(base, 'rag_index')}
+
+    # --- lookup ---
+
+    def get(self, model: Optional[str] = None, version: Optional[str] = None) -> Dict:
+        """Components (embedder, classifier, rag) for a model, loading it on first use."""
+        model = model or DEFAULT_MODEL
+        if model == DEFAULT_MODEL and version is None:
+            return self.shared()
+        paths = self.paths(model, version)
+        name = paths['embedder']
+        if self._shares_embedder(name):
+            embedder = self.shared()['embedder']
+            # a stub gives vectors the model was not trained on: refuse rather than classify noise
+            if getattr(embedder, 'is_stub', False):
+                raise ModelLoadError(f'model {model} needs {settings.EMBEDDER_MODEL_NAME}, which is not available')
+        else:
+            embedder = self._get_or_load(('embedder', name), lambda: self._load_embedder(name))
+        entry = self._get_or_load((model, version), lambda: self._load_model(model, paths, embedder))
+        # versions of the default model share its taxonomy, so they share its exemplar index too
+        return dict(entry, embedder=embedder, rag=self.shared()['rag'] if entry['rag'] is None else entry['rag'])
+
+    @staticmethod
+    def _shares_embedder(name: Optional[str]) -> bool:
+        return name is None or name == settings.EMBEDDER_MODEL_NAME
+
+    def _get_or_load(self, key: Tuple, load: Callable[[], Tuple[object, int]]):
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                REGISTRY_LOOKUPS.labels(result='hit').inc()
+                return hit[0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        # one loader per key; other keys keep loading and hitting meanwhile
+        with key_lock:
+            with self._lock:
+                hit = self._entries.get(key)
+                if hit is not None:
+                    self._entries.move_to_end(key)
+                    REGISTRY_LOOKUPS.labels(result='hit').inc()
+                    return hit[0]
+            REGISTRY_LOOKUPS.labels(result='miss').inc()
+            label = _label(key)
+            t0 = time.perf_counter()
+            try:
+                value, nbytes = load()
+                REGISTRY_LOAD_SECONDS.labels(model=label).observe(time.perf_counter() - t0)
+                REGISTRY_LOADS.labels(model=label).inc()
+                logger.info('registry loaded %s (%.1f MB)', label, nbytes / 2 ** 20)
+                with self._lock:
+                    self._entries[key] = (value, nbytes)
+                    self.bytes += nbytes
+                    self._evict(keep=key)
+            finally:
+                # a failed load leaves nothing behind either, so bad names cannot grow the lock table
+                with self._lock:
+                    self._loading.pop(key, None)
+            return value
+
+    def _evict(self, keep: Tuple):
+        # the entry just loaded stays even when it alone is over budget
+        while self.bytes > self.budget_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            if key == keep:
+                self._entries.move_to_end(key)
+                continue
+            _, nbytes = self._entries.pop(key)
+            self.bytes -= nbytes
+            REGISTRY_EVICTIONS.labels(model=_label(key)).inc()
+            logger.info('registry evicted %s (%.1f MB)', _label(key), nbytes / 2 ** 20)
+        REGISTRY_BYTES.set(self.bytes)
+        REGISTRY_ENTRIES.set(len(self._entries))
+
+    # --- loaders ---
+
+    def _load_model(self, model: str, paths: Dict, embedder) -> Tuple[Dict, int]:
+        import numpy as np
+        from api.inference.pipeline import prefer_quantized
+        model_path = paths['model_path']
+        classifier = ONNXClassifier(model_path, prefer_quantized=prefer_quantized('classifier', model_path),
+                                    taxonomy_path=paths['taxonomy_path'])
+        if classifier.session is None:
+            raise ModelLoadError(f'model {model} could not be loaded from {paths["model_path"]}')
+        # one probe through embedder and classifier: checks the feature size and allocates the session's buffers
+        probe = np.asarray(embedder.embed(['registry probe']), dtype=np.float32)
+        dim = classifier.session.get_inputs()[0].shape[1]
+        if isinstance(dim, int) and probe.shape[1] != dim:
+            raise ModelLoadError(f'model {model} expects {dim} features, its embedder gives {probe.shape[1]}')
+        classifier.predict_batch(probe)
+        nbytes = _dir_bytes(os.path.dirname(paths['model_path']))
+        rag = None
+        if paths['index_dir'] is not None:
+            rag = _build_rag(paths['index_dir'])
+            if getattr(rag, 'index', None) is not None:
+                from api.rag.vector_index import current_generation
+                nbytes += _dir_bytes(current_generation(paths['index_dir'])[1])
+        return {'model': model, 'classifier': classifier, 'rag': rag, 'version': classifier.version}, nbytes
+
+    def _load_embedder(self, name: str) -> Tuple[object, int]:
+        embedder = self.build_embedder(name)
+        if getattr(embedder, 'is_stub', False):
+            raise ModelLoadError(f'embedder {name} is not available')
+        return embedder, self.embedder_bytes
+
+    # --- introspection ---
+
+    def describe(self) -> Dict:
+        with self._lock:
+            loaded = [{'model': _label(key), 'version': key[1] if key[0] != 'embedder' else None, 'bytes': nbytes}
+                      for key, (_, nbytes) in self._entries.items()]
+            used = self.bytes
+        return {'available': self.available(), 'loaded': loaded, 'bytes': used, 'budget_bytes': self.budget_bytes}
+
+
+def _label(key: Tuple) -> str:
+    return f'embedder:{key[1]}' if key[0] == 'embedder' else key[0]
+
+
+def _build_embedder(name: str):
+    from api.inference.embedder import Embedder
+    return Embedder(name, backend='sentence-transformers')
+
+
+def _build_rag(index_dir: str):
+    from api.rag.rag_engine import RAGEngine, StubRAG
+    try:
+        return RAGEngine(persist_dir=None, index_dir=index_dir, index_mode=settings.RAG_INDEX_MODE,
+                         ivf_nlist=settings.RAG_IVF_NLIST, ivf_nprobe=settings.RAG_IVF_NPROBE,
+                         ivf_min_rows=settings.RAG_IVF_MIN_ROWS, filter_by_category=settings.RAG_FILTER_BY_CATEGORY,
+                         reload_interval_s=settings.RAG_RELOAD_INTERVAL_S, generation_gauge=None)
+    except Exception:
+        return StubRAG()
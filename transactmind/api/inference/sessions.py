@@ -0,0 +1,130 @@
+"""ONNX Runtime session construction shared by the classifier, embedder and cascade wrappers.
+
+Every session gets explicit intra/inter-op thread counts so N workers don't each spin up one thread per
+core. When a model was saved with its large initializers in an external `<model>.weights` file
+(`externalize_weights`, run by training/export_to_onnx.py), the weights are memory-mapped and handed to
+ORT with `add_initializer`: every worker's session then reads the same page-cache pages instead of
+holding a private copy. `preload` maps them in the gunicorn master before fork.
+"""
+import mmap
+import os
+from typing import Dict, Optional
+
+try:
+    import onnxruntime as ort
+    import numpy as np
+    _HAS_ORT = True
+except Exception:
+    ort = None
+    np = None
+    _HAS_ORT = False
+
+from api.utils.config import settings
+
+# model path -> (mmap, {initializer name: OrtValue}); kept for the life of the process (and inherited by forks)
+_SHARED: Dict[str, tuple] = {}
+
+
+def intra_op_threads() -> int:
+    if settings.ORT_INTRA_OP_THREADS:
+        return settings.ORT_INTRA_OP_THREADS
+    # split the cores between the serving workers
+    return max(1, (os.cpu_count() or 1) // max(1, settings.SERVE_WORKERS))
+
+
+_OPT_LEVELS = {'disabled': 'ORT_DISABLE_ALL', 'basic': 'ORT_ENABLE_BASIC', 'extended': 'ORT_ENABLE_EXTENDED',
+               'all': 'ORT_ENABLE_ALL'}
+
+
+def session_options(intra: Optional[int] = None, inter: Optional[int] = None):
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = intra or intra_op_threads()
+    opts.inter_op_num_threads = inter or settings.ORT_INTER_OP_THREADS
+    opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel, _OPT_LEVELS[settings.ORT_GRAPH_OPTIMIZATION])
+    opts.execution_mode = ort.ExecutionMode.ORT_PARALLEL if settings.ORT_EXECUTION_MODE == 'parallel' \
+        else ort.ExecutionMode.ORT_SEQUENTIAL
+    # the arena keeps freed blocks for reuse; turning it off trades a little speed for a smaller resident set
+    opts.enable_cpu_mem_arena = settings.ORT_CPU_MEM_ARENA
+    opts.enable_mem_pattern = settings.ORT_MEM_PATTERN
+    return opts
+
+
+def variant_path(model_path: str, variant: str) -> str:
+    """Artifact of `model_path` for a variant: 'fp32' is the model itself, 'int8' its .quant.onnx copy."""
+    return model_path.replace('.onnx', '.quant.onnx') if variant == 'int8' else model_path
+
+
+def fingerprint(path: str):
+    """[size, mtime_ns] of an artifact, so a selection made for these exact files can detect a re-export."""
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def weights_path(model_path: str) -> str:
+    return model_path + '.weights'
+
+
+def _map_weights(model_path: str):
+    """OrtValues viewing the mmapped external initializers of `model_path`, or None if it has none."""
+    if model_path in _SHARED:
+        return _SHARED[model_path][1]
+    if not os.path.exists(weights_path(model_path)) or not os.path.getsize(weights_path(model_path)):
+        return None
+    import onnx
+    from onnx.helper import tensor_dtype_to_np_dtype
+
+    model = onnx.load(model_path, load_external_data=False)
+    with open(weights_path(model_path), 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    values = {}
+    for init in model.graph.initializer:
+        if init.data_location != onnx.TensorProto.EXTERNAL:
+            continue
+        info = {e.key: e.value for e in init.external_data}
+        dtype = np.dtype(tensor_dtype_to_np_dtype(init.data_type))
+        count = int(np.prod(init.dims)) if len(init.dims) else 1
+        arr = np.frombuffer(buf, dtype=dtype, count=count, offset=int(info.get('offset', 0))).reshape(tuple(init.dims))
+        values[init.name] = ort.OrtValue.ortvalue_from_numpy(arr)
+    # the OrtValues only borrow the mmap, so both must outlive every session built from them
+    _SHARED[model_path] = (buf, values)
+    return values
+
+
+def create_session(model_path: str, intra: Optional[int] = None):
+    opts = session_options(intra)
+    shared = _map_weights(model_path) if settings.ORT_SHARED_WEIGHTS else None
+    if shared:
+        # prepacking would copy every weight into a private per-session buffer
+        opts.add_session_config_entry('session.disable_prepacking', '1')
+        for name, value in shared.items():
+            opts.add_initializer(name, value)
+    return ort.InferenceSession(model_path, opts, providers=['CPUExecutionProvider'])
+
+
+def preload(*model_paths: str):
+    """Map shared weights in the parent process so forked workers inherit the mappings."""
+    if not (_HAS_ORT and settings.ORT_SHARED_WEIGHTS):
+        return
+    for path in model_paths:
+        if path and os.path.exists(path):
+            try:
+                _map_weights(path)
+            except Exception:
+                pass
+
+
+def externalize_weights(model_path: str, size_threshold: int = 1024):
+    """Rewrite `model_path` so initializers above `size_threshold` bytes live in `<model>.weights`."""
+    import onnx
+    from onnx.external_data_helper import convert_model_to_external_data
+
+    model = onnx.load(model_path)
+    # onnx appends to an existing data file, so start from an empty one
+    if os.path.exists(weights_path(model_path)):
+        os.remove(weights_path(model_path))
+    convert_model_to_external_data(model, all_tensors_to_one_file=True,
+                                   location=os.path.basename(weights_path(model_path)),
+                                   size_threshold=size_threshold)
+    onnx.save(model, model_path)
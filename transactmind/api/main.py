@@ -1,79 +1,573 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
+from api.agents.summary_service import SummaryService, template_summary
+from api.inference.cascade import stage1_rationale
+from api.inference.merchant_index import merchant_rationale
 from api.inference.preprocess import preprocess_text
-from api.inference.embedder import Embedder
-from api.inference.classifier import ONNXClassifier
-from api.rag.rag_engine import RAGEngine
-from api.agents.agent_controller import AgentController
+from api.inference import pipeline
+from api.inference.pipeline import build_components
+from api.inference.batcher import MicroBatcher
+from api.inference.bulk import iter_chunks, iter_rows, row_text
+from api.inference.registry import DEFAULT_MODEL, ModelLoadError, UnknownModelError
+from api.utils.budget import DETAIL_STAGES, RequestBudget
 from api.utils.config import settings
-from prometheus_client import Counter, Histogram, make_asgi_app
+from api.utils.encoding import decode, encode, msgpack, negotiate, parse_fields, render, shape
+from api.utils.executor import OverloadedError, StageExecutor
+from api.utils.health import StartupStatus
+from api.utils.logger import logger
+from api.utils.prediction_log import PredictionLogger
+from api.utils.profiler import profile
+from api.utils.stream import PipelinedConnection
+from api.utils.tracing import TimingMiddleware, timed
+from prometheus_client import Counter, Gauge, Histogram, make_asgi_app
+import asyncio
+import json
+import math
+import tempfile
 import time
 
 app = FastAPI(title="TransactMind API")
+if settings.DEBUG_TIMING_ENABLED:
+    app.add_middleware(TimingMiddleware, header=settings.DEBUG_TIMING_HEADER)
 
 REQUEST_COUNT = Counter('transactmind_requests_total', 'Total number of requests')
 REQUEST_LATENCY = Histogram('transactmind_request_latency_seconds', 'Request latency seconds')
+WS_CONNECTIONS = Gauge('transactmind_ws_connections', 'Open /ws/predict connections')
+WS_MESSAGES = Counter('transactmind_ws_messages_total', '/ws/predict messages received and results sent', ['direction'])
+WS_INFLIGHT = Gauge('transactmind_ws_inflight', '/ws/predict messages accepted but not yet answered, all connections')
 
 class PredictRequest(BaseModel):
     transaction_text: str
+    # latency budget for the whole request and how much of the optional output is wanted
+    deadline_ms: Optional[float] = None
+    detail: Optional[str] = None
+    # response shaping: a subset of fields, attribution decimals / top-k, raw float32 arrays in msgpack
+    fields: Optional[List[str]] = None
+    precision: Optional[int] = None
+    shap_top_k: Optional[int] = None
+    raw_floats: bool = False
+    # another taxonomy / classifier version from the model registry (GET /models)
+    model: Optional[str] = None
+    model_version: Optional[str] = None
+
+class ExplainRequest(BaseModel):
+    transaction_text: str
+    method: str = 'kernel'
+    top_k: Optional[int] = None
+    nsamples: Optional[int] = None
+
+class BatchItem(BaseModel):
+    transaction_text: str
+    id: Optional[str] = None
 
 @app.on_event("startup")
 async def startup_event():
-    # initialize components with defensive fallbacks when models or packages are unavailable
-    try:
-        app.state.embedder = Embedder()
-    except Exception:
-        from api.inference.embedder import StubEmbedder
-        app.state.embedder = StubEmbedder()
+    app.state.startup = StartupStatus()
+    app.state.batcher = None
+    app.state.startup_task = None
+    app.state.prediction_log = None
+    # load in the background so /healthz answers and /readyz reports progress while models load;
+    # requests arriving early wait for readiness (see require_ready)
+    if settings.STARTUP_IN_BACKGROUND:
+        app.state.startup_task = asyncio.create_task(_initialize())
+    else:
+        await _initialize()
 
+async def _initialize():
+    status = app.state.startup
+    loop = asyncio.get_running_loop()
+    t0 = time.perf_counter()
     try:
-        app.state.classifier = ONNXClassifier(settings.MODEL_PATH)
-        # if classifier ended up as a stub property use it directly
-    except Exception:
-        # fallback to stub classifier
-        from api.inference.classifier import StubClassifier
-        app.state.classifier = StubClassifier()
+        # initialize components with defensive fallbacks when models or packages are unavailable
+        components = await loop.run_in_executor(
+            None, lambda: build_components(status, parallel=settings.STARTUP_PARALLEL))
+        status.phase('load', time.perf_counter() - t0)
+        pipeline.set_components(components)
+        app.state.embedder = components['embedder']
+        app.state.classifier = components['classifier']
+        app.state.rag = components['rag']
+        app.state.agent = components['agent']
+        app.state.merchants = components['merchants']
 
-    try:
-        # try to create real RAG engine, else fallback to stub
-        rag = RAGEngine()
-        # ensure collection attribute exists, else use stub
-        if getattr(rag, 'collection', None) is None:
-            from api.rag.rag_engine import StubRAG
-            app.state.rag = StubRAG()
-        else:
-            app.state.rag = rag
-    except Exception:
-        from api.rag.rag_engine import StubRAG
-        app.state.rag = StubRAG()
+        # blocking stages run on a bounded executor so one slow request can't stall the event loop
+        app.state.executor = StageExecutor(
+            kind=settings.INFERENCE_EXECUTOR, concurrency=settings.STAGE_CONCURRENCY,
+            max_workers=settings.INFERENCE_WORKERS, max_queue=settings.STAGE_MAX_QUEUE,
+            retry_after=settings.OVERLOAD_RETRY_AFTER_S,
+            initializer=pipeline.init_worker if settings.INFERENCE_EXECUTOR == 'process' else None)
+
+        # LLM summaries are produced off the request path; /predict returns a template plus a summary id
+        app.state.summaries = SummaryService(
+            app.state.agent, workers=settings.SUMMARY_WORKERS, deadline_s=settings.SUMMARY_DEADLINE_S,
+            cache_size=settings.SUMMARY_CACHE_SIZE, confidence_bucket=settings.SUMMARY_CONFIDENCE_BUCKET,
+            max_jobs=settings.SUMMARY_MAX_JOBS)
+
+        # what was predicted, written off the request path; the dashboard reads its aggregates
+        if settings.PREDICTION_LOG_ENABLED:
+            prediction_log = PredictionLogger(
+                settings.PREDICTION_LOG_DIR, flush_rows=settings.PREDICTION_LOG_FLUSH_ROWS,
+                flush_interval_s=settings.PREDICTION_LOG_FLUSH_INTERVAL_S,
+                rotate_rows=settings.PREDICTION_LOG_ROTATE_ROWS,
+                rotate_interval_s=settings.PREDICTION_LOG_ROTATE_INTERVAL_S,
+                max_queue=settings.PREDICTION_LOG_MAX_QUEUE,
+                low_threshold=settings.LOW_CONFIDENCE_THRESHOLD, low_keep=settings.LOW_CONFIDENCE_KEEP)
+            prediction_log.start()
+            app.state.prediction_log = prediction_log
+
+        # coalesce concurrent /predict calls into one embed + classify run per batch
+        if settings.BATCH_ENABLED:
+            batcher = MicroBatcher(pipeline.classify, max_batch_size=settings.BATCH_MAX_SIZE,
+                                   max_wait_ms=settings.BATCH_MAX_WAIT_MS, executor=app.state.executor,
+                                   max_queue=settings.STAGE_MAX_QUEUE)
+            await batcher.start()
+            app.state.batcher = batcher
+
+        if settings.WARMUP_ENABLED:
+            t1 = time.perf_counter()
+            await loop.run_in_executor(None, pipeline.warmup, components, (1, settings.BATCH_MAX_SIZE), status)
+            status.phase('warmup', time.perf_counter() - t1)
+        status.phase('total', time.perf_counter() - t0)
+        status.mark_ready()
+        # pick up classifier versions published by training/online_update.py without a restart
+        if settings.MODEL_RELOAD_INTERVAL_S > 0:
+            app.state.model_watch_task = asyncio.create_task(_watch_model())
+        logger.info('startup complete in %.2fs: %s', time.perf_counter() - t0, status.components)
+    except Exception as e:
+        logger.exception('startup failed')
+        status.mark_failed(str(e))
+
+async def _reload_model(force: bool = False):
+    version = await asyncio.get_running_loop().run_in_executor(None, pipeline.maybe_reload_classifier, force)
+    if version is not None:
+        app.state.classifier = pipeline.get_components()['classifier']
+        logger.info('classifier swapped to version %s', version)
+    return version
+
+async def _watch_model():
+    while True:
+        await asyncio.sleep(settings.MODEL_RELOAD_INTERVAL_S)
+        try:
+            await _reload_model()
+        except Exception:
+            logger.exception('classifier reload failed')
+
+async def require_ready():
+    if not await app.state.startup.wait_ready(settings.STARTUP_WAIT_TIMEOUT_S):
+        raise HTTPException(status_code=503, detail='service is starting up',
+                            headers={'Retry-After': str(max(1, math.ceil(settings.OVERLOAD_RETRY_AFTER_S)))})
+
+@app.get('/healthz')
+async def healthz():
+    # liveness: the process and event loop are responsive, whatever the model state
+    return {'status': 'ok', **app.state.startup.snapshot()}
+
+@app.get('/readyz')
+async def readyz():
+    snapshot = app.state.startup.snapshot()
+    return JSONResponse(status_code=200 if snapshot['ready'] else 503, content=snapshot)
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for name in ('startup_task', 'model_watch_task'):
+        task = getattr(app.state, name, None)
+        if task is not None and not task.done():
+            task.cancel()
+    batcher = getattr(app.state, 'batcher', None)
+    if batcher is not None:
+        await batcher.stop()
+    executor = getattr(app.state, 'executor', None)
+    if executor is not None:
+        executor.shutdown()
+    summaries = getattr(app.state, 'summaries', None)
+    if summaries is not None:
+        summaries.shutdown()
+    prediction_log = getattr(app.state, 'prediction_log', None)
+    if prediction_log is not None:
+        prediction_log.stop()
+
+@app.exception_handler(OverloadedError)
+async def overloaded_handler(request: Request, exc: OverloadedError):
+    return JSONResponse(status_code=429, content={'detail': str(exc)},
+                        headers={'Retry-After': str(max(1, math.ceil(exc.retry_after)))})
+
+@app.exception_handler(UnknownModelError)
+async def unknown_model_handler(request: Request, exc: UnknownModelError):
+    return JSONResponse(status_code=404, content={'detail': str(exc)})
+
+@app.exception_handler(ModelLoadError)
+async def model_load_handler(request: Request, exc: ModelLoadError):
+    return JSONResponse(status_code=503, content={'detail': str(exc)})
+
+def _parse_fields(fields):
     try:
-        app.state.agent = AgentController()
-    except Exception:
-        # AgentController already falls back to None agent; provide minimal stub
-        class MinimalAgent:
-            def summarize(self, text, category, confidence, rag_exp):
-                return f"Predicted '{category}' with confidence {confidence:.2f}. Rationale: {rag_exp}"
-        app.state.agent = MinimalAgent()
-
-@app.post('/predict')
-async def predict(req: PredictRequest):
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def _log_prediction(text: str, result: dict, latency_s: Optional[float] = None):
+    prediction_log = app.state.prediction_log
+    if prediction_log is not None and 'category' in result:
+        prediction_log.log({'ts': time.time(), 'text': text, 'category': result['category'],
+                            'confidence': result['confidence'], 'path': result.get('path'),
+                            'model_version': result.get('model_version'),
+                            'latency_ms': latency_s * 1000 if latency_s is not None else None})
+
+def _log_chunk(chunk: List[dict], results: List[dict]):
+    if app.state.prediction_log is not None:
+        for row, result in zip(chunk, results):
+            _log_prediction(row_text(row), result)
+
+def _queue_summaries(chunk: List[dict], results: List[dict]):
+    # bulk rows get the same background summaries as /predict instead of one blocking LLM call per row
+    if settings.SUMMARY_MODE == 'template':
+        return
+    for row, result in zip(chunk, results):
+        if 'category' in result and result.get('path') != 'merchant_index':
+            job = app.state.summaries.submit(preprocess_text(row_text(row)), result['category'],
+                                             result['confidence'], result.get('rag_explanation'))
+            result.update(agent_summary=job['summary'], summary_id=job['id'], summary_status=job['status'])
+
+def _options(detail: Optional[str], deadline_ms: Optional[float], precision: Optional[int],
+             shap_top_k: Optional[int], fields) -> tuple:
+    """Validated (detail, deadline_ms, fields) for one prediction; ValueError describes what is wrong."""
+    detail = detail or settings.DEFAULT_DETAIL
+    if not isinstance(detail, str) or detail not in DETAIL_STAGES:
+        raise ValueError(f'detail must be one of {", ".join(DETAIL_STAGES)}')
+    deadline_ms = deadline_ms if deadline_ms is not None else settings.DEFAULT_DEADLINE_MS
+    if deadline_ms is not None:
+        # WebSocket frames are not validated by pydantic, so this may be anything JSON / msgpack can carry
+        try:
+            deadline_ms = float(deadline_ms)
+        except (TypeError, ValueError):
+            raise ValueError('deadline_ms must be a number')
+        if not deadline_ms > 0:
+            raise ValueError('deadline_ms must be positive')
+    if precision is not None and not 0 <= precision <= 10:
+        raise ValueError('precision must be between 0 and 10')
+    if shap_top_k is not None and shap_top_k < 0:
+        raise ValueError('shap_top_k must be >= 0 (0 = dense)')
+    return detail, deadline_ms, parse_fields(fields)
+
+async def _load_model(model: Optional[str], version: Optional[str]):
+    """Load a registry model off the event loop; process-pool workers load their own, so only check it exists."""
+    if app.state.executor.kind == 'thread':
+        await asyncio.get_running_loop().run_in_executor(None, pipeline.components_for, model, version)
+    else:
+        pipeline.get_registry().paths(model or DEFAULT_MODEL, version)
+
+async def _predict_text(raw_text: str, detail: str, deadline_ms: Optional[float], fields,
+                        shap_top_k: Optional[int] = None, model: Optional[str] = None,
+                        version: Optional[str] = None) -> dict:
+    """One /predict answer (before field selection); shared by the HTTP and WebSocket endpoints."""
     REQUEST_COUNT.inc()
     start = time.time()
-    text = preprocess_text(req.transaction_text)
-    emb = app.state.embedder.embed([text])[0]
-    category, confidence, raw_scores = app.state.classifier.predict(emb)
-    rag_exp = app.state.rag.explain(text, category)
-    agent_summary = app.state.agent.summarize(text, category, confidence, rag_exp)
-    elapsed = time.time() - start
-    REQUEST_LATENCY.observe(elapsed)
-    return {
+    # the merchant index and first-stage model are built for the serving taxonomy, the batcher for one model
+    selected = model not in (None, DEFAULT_MODEL) or version is not None
+    if selected:
+        await _load_model(model, version)
+
+    def wanted(*names):
+        return fields is None or any(n in fields for n in names)
+
+    with timed('preprocess'):
+        text = preprocess_text(raw_text)
+    # known merchants are answered from the index without touching the models
+    with timed('merchant_lookup'):
+        hit = app.state.merchants.lookup(text) if app.state.merchants is not None and not selected else None
+    if hit is not None:
+        rag_exp = merchant_rationale(hit)
+        result = {
+            'category': hit['category'],
+            'confidence': hit['confidence'],
+            'rag_explanation': rag_exp,
+            'agent_summary': template_summary(hit['category'], hit['confidence'], rag_exp),
+            'shap': None,
+            'path': 'merchant_index',
+            'model_version': hit['version'],
+            'degraded': {},
+        }
+        elapsed = time.time() - start
+        REQUEST_LATENCY.observe(elapsed)
+        _log_prediction(text, result, elapsed)
+        return result
+    executor = app.state.executor
+    batcher = app.state.batcher
+    budget = RequestBudget(deadline_ms, detail,
+                           core_depth=batcher.queue_depth() if batcher is not None else executor.queue_depth('embed'),
+                           core_limit=settings.DEGRADE_CORE_QUEUE_DEPTH, queue_limits=settings.DEGRADE_QUEUE_DEPTH)
+    if selected:
+        emb, category, confidence, raw_scores, path, model_version = (
+            await executor.run('embed', pipeline.classify_model, model, version, [text]))[0]
+    elif batcher is not None:
+        # the batch runs in the batcher's context: only its wall time is attributed to this request
+        with timed('batch', observe=False):
+            emb, category, confidence, raw_scores, path, model_version = await batcher.submit(text)
+    else:
+        emb, category, confidence, raw_scores, path, model_version = (
+            await executor.run('embed', pipeline.classify, [text]))[0]
+    # stages whose fields were not asked for are not run at all (and are not reported as degraded)
+    rag_exp = shap_payload = None
+    if emb is None:
+        # answered by the first-stage cascade model: no embedding to search exemplars or attribute with, so
+        # the rationale is the cascade's template and there are no attributions
+        rag_exp = stage1_rationale(confidence)
+        for stage, name in (('rag', 'rag_explanation'), ('shap', 'shap')):
+            if wanted(name) and budget.allows(stage):
+                budget.degrade(stage, 'cascade')
+    elif wanted('rag_explanation', 'agent_summary'):
+        rag_exp = await budget.run(executor, 'rag', pipeline.rag_explain, text, category, emb, model, version)
+    summary_fields = {}
+    if not wanted('agent_summary', 'summary_id', 'summary_status'):
+        agent_summary = None
+    elif settings.SUMMARY_MODE == 'inline':
+        agent_summary = await budget.run(executor, 'agent', pipeline.summarize, text, category, confidence, rag_exp)
+        if agent_summary is None:
+            agent_summary = template_summary(category, confidence, rag_exp)
+    elif settings.SUMMARY_MODE == 'template' or not budget.allows('agent'):
+        agent_summary = template_summary(category, confidence, rag_exp)
+    else:
+        job = app.state.summaries.submit(text, category, confidence, rag_exp)
+        agent_summary = job['summary']
+        summary_fields = {'summary_id': job['id'], 'summary_status': job['status']}
+    if emb is not None and wanted('shap'):
+        shap_payload = await budget.run(executor, 'shap', pipeline.shap_explain, emb, shap_top_k, model, version)
+    result = {
         'category': category,
         'confidence': float(confidence),
         'rag_explanation': rag_exp,
         'agent_summary': agent_summary,
-        'shap': app.state.classifier.shap_explain(emb)
+        **summary_fields,
+        'shap': shap_payload,
+        'path': path,
+        'model_version': model_version,
+        'degraded': budget.degraded,
     }
+    if selected:
+        result['model'] = model or DEFAULT_MODEL
+    elapsed = time.time() - start
+    REQUEST_LATENCY.observe(elapsed)
+    _log_prediction(text, result, elapsed)
+    return result
+
+@app.post('/predict', dependencies=[Depends(require_ready)])
+async def predict(req: PredictRequest, request: Request):
+    try:
+        detail, deadline_ms, fields = _options(req.detail, req.deadline_ms, req.precision, req.shap_top_k,
+                                               req.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    result = await _predict_text(req.transaction_text, detail, deadline_ms, fields, req.shap_top_k, req.model,
+                                 req.model_version)
+    return render(shape(result, fields, req.precision), negotiate(request.headers.get('accept')), req.raw_floats)
+
+@app.websocket('/ws/predict')
+async def ws_predict(websocket: WebSocket):
+    """Pipelined /predict over one connection (see api/utils/stream.py).
+
+    Frames carry {"id": ..., "transaction_text": ...} or a list of them; `deadline_ms`, `detail`, `model` and
+    `model_version` may be set per message. Results come back as lists tagged with `id`, in completion order.
+    Query parameters: `encoding=msgpack` (binary frames both ways), `fields`, `detail` and `deadline_ms` as
+    connection defaults.
+    """
+    params = websocket.query_params
+    fmt = 'msgpack' if params.get('encoding') == 'msgpack' and msgpack is not None else 'json'
+    await websocket.accept()
+    try:
+        detail, deadline_ms, fields = _options(
+            params.get('detail') or settings.WS_DEFAULT_DETAIL,
+            float(params['deadline_ms']) if params.get('deadline_ms') else None, None, None,
+            params.get('fields') or settings.WS_DEFAULT_FIELDS)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    if not await app.state.startup.wait_ready(settings.STARTUP_WAIT_TIMEOUT_S):
+        await websocket.close(code=1013, reason='service is starting up')
+        return
+
+    async def receive():
+        message = await websocket.receive()
+        if message['type'] == 'websocket.disconnect':
+            return None
+        data = message.get('bytes') if fmt == 'msgpack' else message.get('text')
+        if data is None:
+            raise ValueError(f'expected {"binary" if fmt == "msgpack" else "text"} frames')
+        return decode(data, fmt)
+
+    async def send(results):
+        WS_MESSAGES.labels(direction='out').inc(len(results))
+        payload = encode(results, fmt)
+        if fmt == 'msgpack':
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload.decode('utf-8'))
+
+    async def handle(message):
+        if not isinstance(message, dict) or not isinstance(message.get('transaction_text'), str):
+            return {'error': 'transaction_text is required'}
+        try:
+            msg_detail, msg_deadline, _ = _options(message.get('detail') or detail,
+                                                   message.get('deadline_ms', deadline_ms), None, None, None)
+            result = await _predict_text(message['transaction_text'], msg_detail, msg_deadline, fields,
+                                         model=message.get('model'), version=message.get('model_version'))
+        except (ValueError, UnknownModelError, ModelLoadError) as e:
+            return {'error': str(e)}
+        except OverloadedError as e:
+            return {'error': str(e), 'retry_after': e.retry_after}
+        return shape(result, fields)
+
+    def accepted():
+        WS_MESSAGES.labels(direction='in').inc()
+        WS_INFLIGHT.inc()
+
+    connection = PipelinedConnection(receive, send, handle, max_inflight=settings.WS_MAX_INFLIGHT,
+                                     flush_max=settings.WS_FLUSH_MAX, on_accept=accepted, on_done=WS_INFLIGHT.dec)
+    WS_CONNECTIONS.inc()
+    try:
+        await connection.run()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        WS_CONNECTIONS.dec()
+
+@app.post('/admin/merchants/reload', dependencies=[Depends(require_ready)])
+async def reload_merchants():
+    # rebuild from the taxonomy, merchant files and feedback CSV and swap it in atomically
+    if app.state.merchants is None:
+        raise HTTPException(status_code=404, detail='merchant fast path is disabled')
+    size = await asyncio.get_running_loop().run_in_executor(None, app.state.merchants.reload)
+    return {'merchants': size}
+
+@app.post('/admin/rag/reload', dependencies=[Depends(require_ready)])
+async def reload_rag():
+    # switch to the index generation build_rag_db.py published last, without waiting for the poll
+    if not hasattr(app.state.rag, 'reload'):
+        raise HTTPException(status_code=404, detail='no RAG index is loaded')
+    try:
+        generation = await asyncio.get_running_loop().run_in_executor(None, app.state.rag.reload)
+    except Exception as e:
+        raise HTTPException(status_code=409, detail=f'index could not be loaded: {e}')
+    return {'generation': generation, 'exemplars': len(app.state.rag.index)}
+
+@app.get('/models', dependencies=[Depends(require_ready)])
+async def list_models():
+    # models a request can pick, and what this process has loaded against the byte budget
+    return pipeline.get_registry().describe()
+
+@app.post('/admin/model/reload', dependencies=[Depends(require_ready)])
+async def reload_model():
+    # load whatever the model pointer names now; in-flight requests finish on the old classifier
+    version = await _reload_model(force=True)
+    if version is None and pipeline.current_model_version() is None:
+        raise HTTPException(status_code=409, detail='no loadable classifier at the model pointer')
+    return {'model_version': pipeline.current_model_version(), 'swapped': version is not None}
+
+@app.get('/debug/profile')
+async def debug_profile(seconds: float = Query(5.0, gt=0)):
+    # sample every thread's stack while traffic runs; collapsed stacks feed flamegraph.pl / speedscope
+    if not settings.PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail='profiler is disabled (PROFILER_ENABLED)')
+    seconds = min(seconds, settings.PROFILER_MAX_SECONDS)
+    stacks = await asyncio.get_running_loop().run_in_executor(
+        None, profile, seconds, settings.PROFILER_INTERVAL_MS / 1000.0)
+    return PlainTextResponse(stacks)
+
+@app.get('/summary/{summary_id}', dependencies=[Depends(require_ready)])
+async def get_summary(summary_id: str, wait: bool = Query(False)):
+    summaries = app.state.summaries
+    job = await summaries.wait(summary_id) if wait else summaries.get(summary_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='unknown or expired summary id')
+    return summaries.public(job)
+
+@app.get('/summary/{summary_id}/stream', dependencies=[Depends(require_ready)])
+async def stream_summary(summary_id: str):
+    # NDJSON: the current (template) state first, then the final state once the job finishes or times out
+    summaries = app.state.summaries
+    job = summaries.get(summary_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='unknown or expired summary id')
+
+    async def generate():
+        yield json.dumps(summaries.public(job)) + '\n'
+        if job['status'] == 'pending':
+            final = await summaries.wait(summary_id)
+            yield json.dumps(summaries.public(final)) + '\n'
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+@app.post('/explain', dependencies=[Depends(require_ready)])
+async def explain(req: ExplainRequest):
+    # on-demand attributions; KernelExplainer is only ever built here
+    if req.method not in ('kernel', 'linear'):
+        raise HTTPException(status_code=422, detail="method must be 'kernel' or 'linear'")
+    text = preprocess_text(req.transaction_text)
+    executor = app.state.executor
+    emb, category, confidence, _ = (await executor.run('embed', pipeline.embed_classify, [text]))[0]
+    if req.method == 'kernel':
+        payload = await executor.run('shap', pipeline.kernel_explain, emb, req.nsamples)
+    else:
+        payload = await executor.run('shap', pipeline.shap_explain, emb, req.top_k)
+    return {'category': category, 'confidence': float(confidence), 'shap': payload,
+            'model_version': pipeline.current_model_version()}
+
+@app.post('/predict/batch', dependencies=[Depends(require_ready)])
+async def predict_batch(items: List[BatchItem], request: Request,
+                        include_shap: bool = Query(False),
+                        include_summary: bool = Query(False),
+                        fields: Optional[str] = Query(None),
+                        precision: Optional[int] = Query(None, ge=0, le=10),
+                        raw_floats: bool = Query(False)):
+    if len(items) > settings.BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f'at most {settings.BULK_MAX_ITEMS} items per request; '
+                                                    'use /predict/stream for larger backfills')
+    selected = _parse_fields(fields)
+    rows = [item.dict(exclude_none=True) for item in items]
+    executor = app.state.executor
+    executor.check('bulk')
+    results = []
+    for offset in range(0, len(rows), settings.BULK_CHUNK_SIZE):
+        chunk = rows[offset:offset + settings.BULK_CHUNK_SIZE]
+        chunk_results = await executor.run('bulk', pipeline.classify_chunk, chunk, offset,
+                                           include_shap, include_summary, shed=False)
+        if include_summary:
+            _queue_summaries(chunk, chunk_results)
+        _log_chunk(chunk, chunk_results)
+        results.extend(shape(r, selected, precision) for r in chunk_results)
+    return render({'results': results}, negotiate(request.headers.get('accept')), raw_floats)
+
+@app.post('/predict/stream', dependencies=[Depends(require_ready)])
+async def predict_stream(request: Request,
+                         format: Optional[str] = Query(None, regex='^(ndjson|csv)$'),
+                         include_shap: bool = Query(False),
+                         include_summary: bool = Query(False)):
+    fmt = format or ('csv' if 'csv' in request.headers.get('content-type', '') else 'ndjson')
+    executor = app.state.executor
+    # reject before accepting the upload; once streaming has started chunks wait their turn instead
+    executor.check('bulk')
+    # spool the upload first: starlette's StreamingResponse listens on receive() for disconnects,
+    # so the body can't be read lazily while streaming. Large uploads spill to disk, keeping memory bounded.
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.BULK_SPOOL_MAX_BYTES)
+    async for part in request.stream():
+        spool.write(part)
+    spool.seek(0)
+
+    async def generate():
+        try:
+            offset = 0
+            for chunk in iter_chunks(iter_rows(spool, fmt), settings.BULK_CHUNK_SIZE):
+                results = await executor.run('bulk', pipeline.classify_chunk, chunk, offset,
+                                             include_shap, include_summary, shed=False)
+                if include_summary:
+                    _queue_summaries(chunk, results)
+                _log_chunk(chunk, results)
+                yield ''.join(json.dumps(res) + '\n' for res in results)
+                offset += len(chunk)
+        finally:
+            spool.close()
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
 
 # mount prometheus ASGI app
 app.mount('/metrics', make_asgi_app())
@@ -1,28 +1,243 @@
-import chromadb
-from chromadb.config import Settings
+"""Incremental RAG index builds from the taxonomy examples, bulk merchant files and feedback corrections.
+
+Every exemplar gets a stable id, a hash of its preprocessed text, so re-runs only do work for what changed:
+
+  * texts already in the current generation keep their vectors; new texts are embedded with the serving
+    Embedder through the training feature cache, in parallel and `chunk_rows` at a time;
+  * the result is written as a new generation under the index directory, and `current.json` is flipped
+    atomically, so running RAGEngines pick it up without a restart (RAG_RELOAD_INTERVAL_S);
+  * the chroma collection is synced in RAG_UPSERT_BATCH batches: new or changed rows upserted,
+    removed rows deleted.
+
+    python api/rag/build_rag_db.py --merchants merchants.csv --workers 4
+"""
+import argparse
+import hashlib
 import json
 import os
+import shutil
+import sys
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np  # noqa: E402
+
+from api.inference.merchant_index import _feedback_rows, _merchant_file_rows, _taxonomy_rows  # noqa: E402
+from api.inference.preprocess import preprocess_text  # noqa: E402
+from api.rag.vector_index import _normalize, current_generation  # noqa: E402
+from api.utils.config import settings  # noqa: E402
+
+
+def _client():
+    import chromadb
+    from chromadb.config import Settings
+    return chromadb.Client(Settings(chroma_db_impl="chromadb.db.duckdb.DuckDB",
+                                    persist_directory=os.path.abspath('./api/rag/chroma_db')))
+
 
-client = chromadb.Client(Settings(chroma_db_impl="chromadb.db.duckdb.DuckDB", persist_directory=os.path.abspath('./api/rag/chroma_db')))
+def row_id(text: str) -> str:
+    return hashlib.sha1(preprocess_text(text).encode('utf-8')).hexdigest()[:20]
 
-def build_db(taxonomy_path: str = 'api/models/taxonomy.json'):
-    with open(taxonomy_path, 'r', encoding='utf-8') as f:
-        taxonomy = json.load(f)
+
+def collect_rows(taxonomy_path: Optional[str], feedback_path: Optional[str] = None,
+                 merchant_paths: Iterable[str] = ()) -> Dict[str, Tuple[str, str, str]]:
+    """id -> (text, category, source). Sources apply in order (taxonomy, merchant files, feedback); later wins."""
+    sources = []
+    if taxonomy_path and os.path.exists(taxonomy_path):
+        sources.append(('taxonomy', _taxonomy_rows(taxonomy_path)))
+    for path in merchant_paths:
+        if os.path.exists(path):
+            sources.append(('merchants', _merchant_file_rows(path)))
+    if feedback_path and os.path.exists(feedback_path):
+        sources.append(('feedback', _feedback_rows(feedback_path)))
+    rows = {}
+    for source, pairs in sources:
+        for text, category in pairs:
+            if text and category:
+                rows[row_id(text)] = (text, category, source)
+    return rows
+
+
+def _model(embedder) -> str:
+    return f"{getattr(embedder, 'model_name', type(embedder).__name__)}@{getattr(embedder, 'backend', None)}"
+
+
+def _previous(index_dir: str, model: str):
+    """(generation, {id: (row, category, source)}, vectors) of the current generation; no rows if the model differs."""
+    generation, path = current_generation(index_dir)
+    try:
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+    except (OSError, ValueError):
+        return generation, {}, None
+    if meta.get('model', model) != model:
+        # vectors from another embedding model are not comparable: re-embed everything
+        return generation, {}, None
+    # the flat layout has no ids: recompute them from the texts
+    ids = meta.get('ids') or [row_id(t) for t in meta['texts']]
+    sources = meta.get('sources') or [None] * len(ids)
+    return generation, {i: (r, c, s) for r, (i, c, s) in enumerate(zip(ids, meta['categories'], sources))}, vectors
+
+
+def _encoded_chunks(texts, embedder, workers, batch_size, chunk_rows, stats):
+    """Normalized vectors for `texts`, `chunk_rows` at a time."""
+    if getattr(embedder, 'is_stub', False):
+        # no model: stub vectors match what a stub-backed server searches with, but are never cached
+        for start in range(0, len(texts), chunk_rows):
+            stats['encoded'] += len(texts[start:start + chunk_rows])
+            yield np.asarray(embedder.embed(texts[start:start + chunk_rows]), dtype=np.float32)
+        return
+    from training.embedding_pipeline import extract_features
+    chunks = ((texts[s:s + chunk_rows], np.zeros(len(texts[s:s + chunk_rows]), dtype=np.int64))
+              for s in range(0, len(texts), chunk_rows))
+    cache, rows, _, _, encode_stats = extract_features(chunks, embedder, workers=workers, batch_size=batch_size)
+    stats['encoded'] += encode_stats['encoded']
+    stats['cache_hits'] += encode_stats['cache_hits']
+    for start in range(0, len(rows), chunk_rows):
+        yield cache.gather(rows[start:start + chunk_rows])
+
+
+def _write_pointer(index_dir: str, generation: int, path: str):
+    tmp = os.path.join(index_dir, 'current.json.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'generation': generation, 'path': path, 'created': time.strftime('%Y-%m-%dT%H:%M:%S')}, f)
+    os.replace(tmp, os.path.join(index_dir, 'current.json'))
+
+
+def _prune(index_dir: str, keep: int):
+    root = os.path.join(index_dir, 'generations')
+    for name in sorted(os.listdir(root))[:-max(1, keep)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def build_index(taxonomy_path: str = 'api/models/taxonomy.json', index_dir: str = 'api/rag/index', embedder=None,
+                feedback_path: Optional[str] = None, merchant_paths: Iterable[str] = (), workers: Optional[int] = None,
+                batch_size: Optional[int] = None, chunk_rows: Optional[int] = None, keep: Optional[int] = None):
+    """Write a new index generation if any exemplar changed. Returns (rows by id, vectors, report)."""
+    if embedder is None:
+        from training.embedding_pipeline import build_embedder
+        embedder = build_embedder()
+    chunk_rows = chunk_rows or settings.TRAIN_CHUNK_ROWS
+    t0 = time.perf_counter()
+    rows = collect_rows(taxonomy_path, feedback_path, merchant_paths)
+    model = _model(embedder)
+    generation, previous, old_vectors = _previous(index_dir, model)
+    report = {'rows': len(rows), 'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0, 'encoded': 0,
+              'cache_hits': 0, 'generation': generation}
+    for i, (_, category, source) in rows.items():
+        if i not in previous:
+            report['added'] += 1
+        elif previous[i][1:] != (category, source):
+            report['updated'] += 1
+        else:
+            report['unchanged'] += 1
+    report['removed'] = sum(1 for i in previous if i not in rows)
+
+    # rows grouped by category (the order VectorIndex keeps), then by id so generations are reproducible
+    order = sorted(rows, key=lambda i: (rows[i][1], i))
+    if order and (report['added'] or report['updated'] or report['removed'] or old_vectors is None
+                  or generation is None):
+        generation = (generation or 0) + 1
+        name = f'g{generation:06d}'
+        path = os.path.join(index_dir, 'generations', name)
+        os.makedirs(path, exist_ok=True)
+        todo = [pos for pos, i in enumerate(order) if i not in previous]
+        dim = old_vectors.shape[1] if len(todo) < len(order) else len(embedder.embed(['dimension probe'])[0])
+        vectors = np.lib.format.open_memmap(os.path.join(path, 'vectors.npy'), mode='w+', dtype=np.float32,
+                                            shape=(len(order), dim))
+        # unchanged texts keep their vectors (a category change does not change the embedding)
+        for pos, i in enumerate(order):
+            if i in previous:
+                vectors[pos] = old_vectors[previous[i][0]]
+        texts = [rows[order[pos]][0] for pos in todo]
+        offset = 0
+        for block in _encoded_chunks(texts, embedder, workers, batch_size, chunk_rows, report):
+            vectors[todo[offset:offset + len(block)]] = _normalize(np.asarray(block, dtype=np.float32))
+            offset += len(block)
+        vectors.flush()
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'model': model, 'ids': order, 'texts': [rows[i][0] for i in order],
+                       'categories': [rows[i][1] for i in order], 'sources': [rows[i][2] for i in order]}, f)
+        _write_pointer(index_dir, generation, os.path.join('generations', name))
+        _prune(index_dir, keep or settings.RAG_KEEP_GENERATIONS)
+        report['generation'] = generation
+        old_vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        print(f'Saved generation {generation} ({len(order)} exemplars) to', path)
+
+    wall = time.perf_counter() - t0
+    from training.embedding_pipeline import peak_rss_mb
+    report.update({'wall_seconds': wall, 'rows_per_s': len(rows) / wall if wall else None})
+    report['peak_rss_mb'], report['peak_rss_worker_mb'] = peak_rss_mb()
+    return rows, old_vectors, report
+
+
+def sync_collection(collection, rows: Dict[str, Tuple[str, str, str]], index_dir: str,
+                    batch_size: Optional[int] = None) -> Dict[str, int]:
+    """Upsert new or changed rows and delete removed ones, `batch_size` ids per chroma call."""
+    batch_size = batch_size or settings.RAG_UPSERT_BATCH
+    _, path = current_generation(index_dir)
+    with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+        ids = json.load(f)['ids']
+    vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+    counts = {'upserted': 0, 'deleted': 0}
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        existing = collection.get(ids=batch, include=['metadatas'])
+        known = dict(zip(existing['ids'], existing['metadatas']))
+        changed = [(start + k, i) for k, i in enumerate(batch)
+                   if known.get(i) != {'category': rows[i][1], 'source': rows[i][2]}]
+        if changed:
+            collection.upsert(ids=[i for _, i in changed],
+                              embeddings=[[float(v) for v in vectors[pos]] for pos, _ in changed],
+                              documents=[rows[i][0] for _, i in changed],
+                              metadatas=[{'category': rows[i][1], 'source': rows[i][2]} for _, i in changed])
+            counts['upserted'] += len(changed)
+    # positional ids from older builds are dropped here too
+    stale = [i for i in collection.get(include=[])['ids'] if i not in rows]
+    for start in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[start:start + batch_size])
+    counts['deleted'] = len(stale)
+    return counts
+
+
+def build_db(rows: Dict[str, Tuple[str, str, str]], index_dir: str = 'api/rag/index', batch_size: Optional[int] = None):
+    client = _client()
     try:
         collection = client.create_collection(name='merchants')
     except Exception:
         collection = client.get_collection('merchants')
-    ids = []
-    metadatas = []
-    documents = []
-    for i, item in enumerate(taxonomy.get('examples', [])):
-        ids.append(str(i))
-        documents.append(item['text'])
-        metadatas.append({'category': item['category']})
-    if documents:
-        collection.add(ids=ids, documents=documents, metadatas=metadatas)
-        client.persist()
+    counts = sync_collection(collection, rows, index_dir, batch_size)
+    client.persist()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--taxonomy', default=settings.TAXONOMY_PATH)
+    parser.add_argument('--feedback', default=settings.FEEDBACK_PATH)
+    parser.add_argument('--merchants', action='append', default=None, help='bulk merchant CSV (repeatable)')
+    parser.add_argument('--index-dir', default=settings.RAG_INDEX_DIR)
+    parser.add_argument('--workers', type=int, default=None, help='encoder processes (default TRAIN_WORKERS)')
+    parser.add_argument('--batch-size', type=int, default=None, help='texts per encode call')
+    parser.add_argument('--chunk-rows', type=int, default=None)
+    parser.add_argument('--upsert-batch', type=int, default=settings.RAG_UPSERT_BATCH)
+    parser.add_argument('--no-chroma', action='store_true')
+    args = parser.parse_args()
+
+    merchants = args.merchants if args.merchants is not None else settings.MERCHANT_FILES
+    rows, vectors, report = build_index(args.taxonomy, args.index_dir, feedback_path=args.feedback,
+                                        merchant_paths=merchants, workers=args.workers, batch_size=args.batch_size,
+                                        chunk_rows=args.chunk_rows)
+    if not args.no_chroma and vectors is not None:
+        try:
+            report['chroma'] = build_db(rows, args.index_dir, args.upsert_batch)
+        except ImportError:
+            print('chromadb not installed; only the in-process index was built')
+    print(json.dumps(report, indent=2))
+
 
 if __name__ == '__main__':
-    os.makedirs(os.path.dirname(os.path.abspath('api/rag/chroma_db')), exist_ok=True)
-    build_db()
+    main()
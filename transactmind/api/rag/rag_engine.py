@@ -1,9 +1,70 @@
-from chromadb import Client
-from chromadb.config import Settings
 import os
+import threading
+import time
+from typing import Optional
+
+from api.rag.vector_index import VectorIndex, current_generation
+from api.utils.logger import logger
+from api.utils.metrics import RAG_INDEX_GENERATION, STUB_FALLBACKS
+
+_STUB_EXPLAINS = STUB_FALLBACKS.labels(component='rag')
+
+
+def _stub_rationale(category: str) -> str:
+    _STUB_EXPLAINS.inc()
+    return f"(stub) No local RAG DB available — fallback rationale for '{category}'."
+
+
+def _format_rationale(docs, metas, category: str) -> str:
+    if not docs:
+        return f"No similar examples found for category {category}."
+    rationale = []
+    for d, m in zip(docs, metas):
+        rationale.append(f"Example: '{d[:120]}' (category: {m.get('category')})")
+    return ' '.join(rationale[:2])
+
 
 class RAGEngine:
-    def __init__(self, persist_dir: str = './api/rag/chroma_db'):
+    def __init__(self, persist_dir: Optional[str] = './api/rag/chroma_db', index_dir: str = 'api/rag/index',
+                 index_mode: str = 'exact', ivf_nlist: int = 0, ivf_nprobe: int = 8, ivf_min_rows: int = 10000,
+                 filter_by_category: bool = False, index: VectorIndex = None, reload_interval_s: float = 30.0,
+                 generation_gauge=RAG_INDEX_GENERATION):
+        self.filter_by_category = filter_by_category
+        # registry models (api/inference/registry.py) search their own index and leave the gauge alone
+        self.generation_gauge = generation_gauge
+        # in-process exemplar index built by build_rag_db.build_index; searched with the request embedding.
+        # A preloaded (memory-mapped) index can be passed in so forked workers share it.
+        self.index_dir = index_dir
+        self.index_kwargs = {'mode': index_mode, 'nlist': ivf_nlist, 'nprobe': ivf_nprobe,
+                             'ivf_min_rows': ivf_min_rows}
+        self.reload_interval_s = reload_interval_s
+        self._reloading = False
+        self._checked_at = time.monotonic()
+        self.index = index
+        if self.index is None and os.path.exists(os.path.join(current_generation(index_dir)[1], 'vectors.npy')):
+            try:
+                self.index = VectorIndex.load(index_dir, **self.index_kwargs)
+            except Exception:
+                self.index = None
+        if self.index is not None and self.index.generation is not None and self.generation_gauge is not None:
+            self.generation_gauge.set(self.index.generation)
+
+        self.client = None
+        self.collection = None
+        if persist_dir is None:
+            if self.index is None:
+                raise FileNotFoundError(f'no exemplar index in {index_dir}')
+            return
+        try:
+            self._open_collection(persist_dir)
+        except Exception:
+            # chroma is optional once the in-process index is available
+            if self.index is None:
+                raise
+
+    def _open_collection(self, persist_dir: str):
+        from chromadb import Client
+        from chromadb.config import Settings
         try:
             self.client = Client(Settings(chroma_db_impl="chromadb.db.duckdb.DuckDB", persist_directory=os.path.abspath(persist_dir)))
             self.collection = self.client.get_collection('merchants')
@@ -14,24 +75,78 @@ class RAGEngine:
             except Exception:
                 self.collection = self.client.get_collection('merchants')
 
-    def explain(self, text: str, category: str, k: int = 3) -> str:
+    def reload(self) -> Optional[int]:
+        """Load the generation `current.json` names now; searches in flight finish on the old index."""
+        index = VectorIndex.load(self.index_dir, **self.index_kwargs)
+        self.index = index
+        if index.generation is not None and self.generation_gauge is not None:
+            self.generation_gauge.set(index.generation)
+        return index.generation
+
+    def maybe_reload(self):
+        """Swap in a newer index generation from a background thread, at most every `reload_interval_s`."""
+        now = time.monotonic()
+        if self.reload_interval_s <= 0 or self._reloading or now - self._checked_at < self.reload_interval_s:
+            return
+        self._checked_at = now
+        generation, _ = current_generation(self.index_dir)
+        if generation is not None and generation != getattr(self.index, 'generation', None):
+            self._reloading = True
+            threading.Thread(target=self._background_reload, name='rag-reload', daemon=True).start()
+
+    def _background_reload(self):
         try:
-            res = self.collection.query(query_texts=[text], n_results=k)
+            self.reload()
+        except Exception:
+            pass
+        finally:
+            self._reloading = False
+
+    def _use_index(self, embedding) -> bool:
+        return self.index is not None and embedding is not None and len(embedding) == self.index.dim
+
+    def explain(self, text: str, category: str, k: int = 3, embedding=None) -> str:
+        self.maybe_reload()
+        if self._use_index(embedding):
+            return self.explain_batch([text], [category], [embedding], k=k)[0]
+        if self.collection is None:
+            # index-only engine and no usable embedding (none given, or from another encoder)
+            return _stub_rationale(category)
+        try:
+            where = {'category': category} if self.filter_by_category else None
+            if embedding is not None:
+                # reuse the request embedding instead of letting chroma embed the text again
+                res = self.collection.query(query_embeddings=[[float(v) for v in embedding]], n_results=k, where=where)
+            else:
+                res = self.collection.query(query_texts=[text], n_results=k, where=where)
             docs = res.get('documents', [[]])[0]
             metas = res.get('metadatas', [[]])[0]
-            if not docs:
-                return f"No similar examples found for category {category}."
-            rationale = []
-            for d, m in zip(docs, metas):
-                rationale.append(f"Example: '{d[:120]}' (category: {m.get('category')})")
-            return ' '.join(rationale[:2])
-        except Exception as e:
-            return str(e)
+            return _format_rationale(docs, metas, category)
+        except Exception:
+            logger.exception('chroma query failed')
+            return _stub_rationale(category)
+
+    def explain_batch(self, texts, categories, embeddings, k: int = 3):
+        """Rationales for many requests with one matrix multiply per category group."""
+        self.maybe_reload()
+        if self.index is None or not len(embeddings) or len(embeddings[0]) != self.index.dim:
+            return [self.explain(t, c, k=k, embedding=e) for t, c, e in zip(texts, categories, embeddings)]
+        index = self.index
+        hits = index.search(embeddings, k=k, categories=categories if self.filter_by_category else None)
+        out = []
+        for category, rows in zip(categories, hits):
+            docs = [index.texts[r] for r, _ in rows]
+            metas = [{'category': index.categories[r]} for r, _ in rows]
+            out.append(_format_rationale(docs, metas, category))
+        return out
 
 
 class StubRAG:
     def __init__(self):
         pass
 
-    def explain(self, text: str, category: str, k: int = 3) -> str:
-        return f"(stub) No local RAG DB available — fallback rationale for '{category}'."
+    def explain(self, text: str, category: str, k: int = 3, embedding=None) -> str:
+        return _stub_rationale(category)
+
+    def explain_batch(self, texts, categories, embeddings, k: int = 3):
+        return [self.explain(t, c, k=k) for t, c in zip(texts, categories)]
@@ -0,0 +1,144 @@
+"""In-process exemplar index: a contiguous float32 matrix searched with batched matrix multiplies.
+
+Rows are stored grouped by category, so filtering by the predicted category is a slice of the matrix
+rather than a post-filter scan. For large catalogs an optional IVF (inverted file) layer clusters each
+searchable range with spherical k-means and only scores the `nprobe` closest clusters; raising
+`nprobe` trades speed for recall.
+
+Incremental builds (build_rag_db.py) write numbered generations under the index directory and flip
+`current.json` to the new one; `load` follows that pointer, or reads the flat layout when there is none.
+"""
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def _normalize(x):
+    x = np.ascontiguousarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def current_generation(directory: str) -> Tuple[Optional[int], str]:
+    """(generation number, directory holding vectors.npy/meta.json); the flat layout is generation None."""
+    try:
+        with open(os.path.join(directory, 'current.json'), 'r', encoding='utf-8') as f:
+            pointer = json.load(f)
+        return int(pointer['generation']), os.path.join(directory, pointer['path'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, directory
+
+
+def _top_k(scores, k: int):
+    """Row-wise indices of the k best scores, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, axis=1), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+
+class _IVF:
+    """Inverted lists over rows [start, end) of the parent matrix."""
+
+    def __init__(self, vectors, start: int, end: int, nlist: int, iters: int = 10, seed: int = 0):
+        data = vectors[start:end]
+        rng = np.random.default_rng(seed)
+        nlist = max(1, min(nlist, len(data)))
+        centroids = np.array(data[rng.choice(len(data), nlist, replace=False)])
+        for _ in range(iters):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = data[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assign = np.argmax(data @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assign == c) + start for c in range(nlist)]
+
+    def candidates(self, query, nprobe: int):
+        probe = _top_k((query @ self.centroids.T)[None, :], nprobe)[0]
+        return np.concatenate([self.lists[c] for c in probe])
+
+
+class VectorIndex:
+    def __init__(self, vectors, texts: Sequence[str], categories: Sequence[str], mode: str = 'exact',
+                 nlist: int = 0, nprobe: int = 8, ivf_min_rows: int = 10000):
+        categories = list(categories)
+        order = sorted(range(len(categories)), key=lambda i: categories[i])
+        if order != list(range(len(categories))):
+            vectors = np.asarray(vectors)[order]
+            texts = [texts[i] for i in order]
+            categories = [categories[i] for i in order]
+        # memory-mapped, already normalized input is used as-is (no private copy)
+        if isinstance(vectors, np.memmap) and vectors.dtype == np.float32:
+            self.vectors = vectors
+        else:
+            self.vectors = _normalize(vectors)
+        self.texts = list(texts)
+        self.categories = categories
+        self.dim = self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+        self.generation: Optional[int] = None
+        self.nprobe = nprobe
+        self.ranges: Dict[Optional[str], Tuple[int, int]] = {None: (0, len(categories))}
+        start = 0
+        for i in range(1, len(categories) + 1):
+            if i == len(categories) or categories[i] != categories[start]:
+                self.ranges[categories[start]] = (start, i)
+                start = i
+
+        self.ivf: Dict[Optional[str], _IVF] = {}
+        if mode != 'exact':
+            for cat, (lo, hi) in self.ranges.items():
+                n = hi - lo
+                if mode == 'ivf' or n >= ivf_min_rows:
+                    self.ivf[cat] = _IVF(self.vectors, lo, hi, nlist or max(1, int(np.sqrt(n))))
+
+    def __len__(self):
+        return len(self.texts)
+
+    def search(self, queries, k: int = 3, categories: Optional[Sequence[Optional[str]]] = None,
+               nprobe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (row, cosine) per query; `categories[i]` restricts query i to that category's rows."""
+        q = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        categories = list(categories) if categories is not None else [None] * len(q)
+        results: List[List[Tuple[int, float]]] = [[] for _ in range(len(q))]
+        groups: Dict[Optional[str], List[int]] = {}
+        for i, cat in enumerate(categories):
+            groups.setdefault(cat if cat in self.ranges else '__missing__', []).append(i)
+        for cat, rows in groups.items():
+            if cat == '__missing__':
+                continue
+            ivf = self.ivf.get(cat)
+            if ivf is None:
+                lo, hi = self.ranges[cat]
+                scores = q[rows] @ self.vectors[lo:hi].T
+                for r, idx, sc in zip(rows, _top_k(scores, k), scores):
+                    results[r] = [(lo + int(j), float(sc[j])) for j in idx]
+            else:
+                for r in rows:
+                    cand = ivf.candidates(q[r], nprobe or self.nprobe)
+                    scores = (self.vectors[cand] @ q[r])[None, :]
+                    results[r] = [(int(cand[j]), float(scores[0, j])) for j in _top_k(scores, k)[0]]
+        return results
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'vectors.npy'), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'texts': self.texts, 'categories': self.categories}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True, **kwargs):
+        generation, directory = current_generation(directory)
+        vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode='r' if mmap else None)
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        index = cls(vectors, meta['texts'], meta['categories'], **kwargs)
+        index.generation = generation
+        return index
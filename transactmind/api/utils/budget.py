@@ -0,0 +1,78 @@
+"""Per-request latency budgets: which optional /predict stages run, get cut short or are skipped.
+
+Category and confidence are always computed; RAG, the LLM summary and SHAP are optional. A stage is
+skipped when the requested detail level leaves it out, when the core path or the stage itself is backed up,
+or when its expected completion (StageExecutor.estimate) would overrun the deadline. A stage that starts
+but outlives the deadline keeps running in the background and frees its slot when done; the response
+goes out without it. Every degraded field is recorded with its reason and counted in metrics.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from api.utils.executor import OverloadedError
+from api.utils.metrics import DEGRADED_FIELDS, DEGRADED_REQUESTS
+
+# optional stages each detail level keeps
+DETAIL_STAGES = {'full': ('rag', 'agent', 'shap'), 'standard': ('rag',), 'minimal': ()}
+STAGE_FIELDS = {'rag': 'rag_explanation', 'agent': 'agent_summary', 'shap': 'shap'}
+
+
+def _discard(task):
+    if not task.cancelled():
+        task.exception()
+
+
+class RequestBudget:
+    def __init__(self, deadline_ms: Optional[float] = None, detail: str = 'full', core_depth: int = 0,
+                 core_limit: Optional[int] = None, queue_limits: Optional[Dict[str, int]] = None):
+        self.started = time.perf_counter()
+        self.deadline = None if deadline_ms is None else self.started + deadline_ms / 1000.0
+        self.detail = detail
+        # a backed-up core path sheds every optional stage so category and confidence keep their SLO
+        self.core_overloaded = core_limit is not None and core_depth >= core_limit
+        self.queue_limits = queue_limits or {}
+        self.degraded: Dict[str, str] = {}
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.perf_counter()
+
+    def degrade(self, stage: str, reason: str):
+        field = STAGE_FIELDS[stage]
+        if not self.degraded:
+            DEGRADED_REQUESTS.inc()
+        self.degraded[field] = reason
+        DEGRADED_FIELDS.labels(field=field, reason=reason).inc()
+
+    def allows(self, stage: str, executor=None) -> bool:
+        """True if the optional `stage` should run; otherwise records why its field is degraded."""
+        reason = None
+        if stage not in DETAIL_STAGES[self.detail]:
+            reason = 'detail'
+        elif self.core_overloaded:
+            reason = 'overload'
+        elif executor is not None:
+            limit = self.queue_limits.get(stage)
+            remaining = self.remaining()
+            if limit is not None and executor.queue_depth(stage) >= limit:
+                reason = 'overload'
+            elif remaining is not None and (remaining <= 0 or executor.estimate(stage) > remaining):
+                reason = 'deadline'
+        if reason is not None:
+            self.degrade(stage, reason)
+            return False
+        return True
+
+    async def run(self, executor, stage: str, fn, *args, fallback=None):
+        """Run an optional stage within what is left of the budget; `fallback` when it is skipped or cut short."""
+        if not self.allows(stage, executor):
+            return fallback
+        task = asyncio.ensure_future(executor.run(stage, fn, *args))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=self.remaining())
+        except asyncio.TimeoutError:
+            task.add_done_callback(_discard)
+            self.degrade(stage, 'timeout')
+        except OverloadedError:
+            self.degrade(stage, 'overload')
+        return fallback
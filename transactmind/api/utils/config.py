@@ -1,7 +1,172 @@
+from typing import Dict, List, Optional
+
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     MODEL_PATH: str = 'api/models/model.onnx'
     TAXONOMY_PATH: str = 'api/models/taxonomy.json'
 
+    # dynamic micro-batching of concurrent /predict calls
+    BATCH_ENABLED: bool = True
+    BATCH_MAX_SIZE: int = 32
+    BATCH_MAX_WAIT_MS: float = 5.0
+
+    # bulk /predict/batch and /predict/stream backfills
+    BULK_CHUNK_SIZE: int = 256
+    BULK_MAX_ITEMS: int = 10000
+    BULK_SPOOL_MAX_BYTES: int = 8 * 1024 * 1024
+
+    # embedding cache: in-memory LRU plus optional mmap tier shared across workers/restarts
+    EMBED_CACHE_ENABLED: bool = True
+    EMBED_CACHE_SIZE: int = 50000
+    EMBED_CACHE_DIR: Optional[str] = None
+    EMBED_CACHE_DISK_CAPACITY: int = 1 << 18
+
+    # executor for blocking stages ('thread' or 'process') and per-stage backpressure
+    INFERENCE_EXECUTOR: str = 'thread'
+    INFERENCE_WORKERS: Optional[int] = None
+    STAGE_CONCURRENCY: Dict[str, int] = {'embed': 2, 'shap': 2, 'rag': 4, 'agent': 1, 'bulk': 1}
+    STAGE_MAX_QUEUE: int = 128
+    OVERLOAD_RETRY_AFTER_S: float = 1.0
+
+    # attributions: exact linear top-k on /predict (0 = dense), KernelExplainer only on /explain
+    SHAP_TOP_K: int = 10
+    KERNEL_SHAP_NSAMPLES: int = 30
+
+    # sentence embedder: 'auto' prefers the exported ONNX MiniLM and falls back to sentence-transformers
+    EMBEDDER_MODEL_NAME: str = 'sentence-transformers/all-MiniLM-L6-v2'
+    EMBEDDER_BACKEND: str = 'auto'
+    EMBEDDER_ONNX_PATH: str = 'api/models/embedder.onnx'
+    EMBEDDER_TOKENIZER_DIR: str = 'api/models/embedder_tokenizer'
+    EMBEDDER_PREFER_QUANTIZED: bool = True
+
+    # RAG: in-process exemplar index (exact, or IVF for large catalogs) ahead of chroma
+    RAG_INDEX_DIR: str = 'api/rag/index'
+    RAG_INDEX_MODE: str = 'auto'
+    RAG_IVF_NLIST: int = 0
+    RAG_IVF_NPROBE: int = 8
+    RAG_IVF_MIN_ROWS: int = 10000
+    RAG_FILTER_BY_CATEGORY: bool = False
+
+    # agent summaries: 'async' (template now, LLM in background), 'inline' (blocking) or 'template'
+    SUMMARY_MODE: str = 'async'
+    SUMMARY_WORKERS: int = 1
+    SUMMARY_DEADLINE_S: float = 10.0
+    SUMMARY_CACHE_SIZE: int = 10000
+    SUMMARY_CONFIDENCE_BUCKET: float = 0.1
+    SUMMARY_MAX_JOBS: int = 10000
+
+    # startup: load components concurrently in the background, then warm every stage
+    STARTUP_PARALLEL: bool = True
+    STARTUP_IN_BACKGROUND: bool = True
+    STARTUP_WAIT_TIMEOUT_S: float = 120.0
+    WARMUP_ENABLED: bool = True
+
+    # merchant fast path: known merchants are answered from an index built from taxonomy examples,
+    # bulk merchant files and corrected feedback rows, without running the models
+    MERCHANT_INDEX_ENABLED: bool = True
+    MERCHANT_INDEX_PATH: str = 'api/models/merchant_index.json'
+    MERCHANT_FILES: List[str] = []
+    FEEDBACK_PATH: str = 'data/feedback.csv'
+    MERCHANT_CONFIDENCE: float = 0.99
+    MERCHANT_PREFIX_MATCH: bool = True
+    MERCHANT_RELOAD_INTERVAL_S: float = 30.0
+
+    # cascade: a hashed n-gram model answers when its confidence reaches the threshold, else MiniLM + ONNX
+    CASCADE_ENABLED: bool = True
+    CASCADE_MODEL_PATH: str = 'api/models/stage1.onnx'
+    CASCADE_THRESHOLD: float = 0.9
+
+    # multi-worker serving (gunicorn_conf.py): models are preloaded in the master, ONNX weights are
+    # memory-mapped and shared, and each worker's ORT sessions get cpu_count // SERVE_WORKERS threads
+    SERVE_WORKERS: int = 1
+    SERVE_PRELOAD: bool = True
+    ORT_INTRA_OP_THREADS: Optional[int] = None
+    ORT_INTER_OP_THREADS: int = 1
+    ORT_SHARED_WEIGHTS: bool = True
+
+    # tracing: requests with DEBUG_TIMING_HEADER get a Server-Timing breakdown; /debug/profile samples stacks.
+    # Both are off by default: any client could read the per-stage timings
+    DEBUG_TIMING_ENABLED: bool = False
+    DEBUG_TIMING_HEADER: str = 'X-Debug-Timing'
+    PROFILER_ENABLED: bool = False
+    PROFILER_INTERVAL_MS: float = 5.0
+    PROFILER_MAX_SECONDS: float = 60.0
+
+    # online learning: training/online_update.py writes versioned classifiers and moves MODEL_POINTER_PATH;
+    # the server swaps the classifier in when the pointer changes
+    MODEL_VERSIONS_DIR: str = 'api/models/versions'
+    MODEL_POINTER_PATH: str = 'api/models/current.json'
+    MODEL_RELOAD_INTERVAL_S: float = 10.0
+    FEATURE_STORE_DIR: str = 'data/feature_store'
+    ONLINE_FEEDBACK_WEIGHT: float = 2.0
+    # continuation over the new rows plus a replay sample of older ones (training/online_update.py); epochs,
+    # rate and alpha apply to SGD-trained models, a LogisticRegression is refit warm-started with its own settings
+    ONLINE_EPOCHS: int = 5
+    ONLINE_REPLAY_ROWS: int = 5000
+    ONLINE_LEARNING_RATE: float = 0.01
+    ONLINE_SGD_ALPHA: float = 1e-4
+
+    # training: chunked CSV streaming, parallel encoding into the content-addressed feature cache
+    FEATURE_CACHE_DIR: str = 'data/feature_cache'
+    TRAIN_CHUNK_ROWS: int = 20000
+    TRAIN_WORKERS: int = 0  # encoder processes; 0 = one per core
+    TRAIN_ENCODE_BATCH: int = 256
+    # above this many MB of features the classifier is fit out-of-core with SGD instead of lbfgs in memory
+    TRAIN_MEMORY_BUDGET_MB: int = 1024
+    TRAIN_SGD_EPOCHS: int = 5
+
+    # prediction log: buffered Parquet files plus the aggregates the dashboard reads
+    PREDICTION_LOG_ENABLED: bool = True
+    PREDICTION_LOG_DIR: str = 'data/prediction_log'
+    PREDICTION_LOG_FLUSH_ROWS: int = 1000
+    PREDICTION_LOG_FLUSH_INTERVAL_S: float = 2.0
+    PREDICTION_LOG_ROTATE_ROWS: int = 50_000
+    # a file only becomes readable once closed, so this bounds both reader lag and rows lost to a killed worker
+    PREDICTION_LOG_ROTATE_INTERVAL_S: float = 60.0
+    PREDICTION_LOG_MAX_QUEUE: int = 100_000
+    LOW_CONFIDENCE_THRESHOLD: float = 0.6
+    LOW_CONFIDENCE_KEEP: int = 500
+
+    # ONNX Runtime session tuning for the exported graphs
+    ORT_GRAPH_OPTIMIZATION: str = 'all'  # disabled | basic | extended | all
+    ORT_EXECUTION_MODE: str = 'sequential'  # sequential | parallel (inter-op threads only help in parallel)
+    ORT_CPU_MEM_ARENA: bool = True
+    ORT_MEM_PATTERN: bool = True
+    # classifier: fetch probabilities into a reused per-thread buffer instead of a fresh array per call
+    ORT_IO_BINDING: bool = True
+
+    # int8 classifier variant; the fp32/int8 choice measured by training/select_variants.py overrides the
+    # two PREFER_QUANTIZED defaults
+    CLASSIFIER_PREFER_QUANTIZED: bool = True
+    VARIANT_MANIFEST_PATH: str = 'api/models/variants.json'
+    VARIANT_ACCURACY_TOLERANCE: float = 0.005
+    VARIANT_MIN_AGREEMENT: float = 0.98
+
+    # /predict degradation: optional stages (rag, agent, shap) are dropped by detail level, deadline or load.
+    # DEFAULT_DEADLINE_MS applies when the client sends none; a stage is skipped once DEGRADE_QUEUE_DEPTH calls
+    # are waiting for it, and all of them once DEGRADE_CORE_QUEUE_DEPTH texts are waiting for classification
+    DEFAULT_DETAIL: str = 'full'
+    DEFAULT_DEADLINE_MS: Optional[float] = None
+    DEGRADE_QUEUE_DEPTH: Dict[str, int] = {'rag': 16, 'agent': 4, 'shap': 16}
+    DEGRADE_CORE_QUEUE_DEPTH: Optional[int] = 64
+
+    # incremental RAG builds (build_rag_db.py): new generations are picked up every RAG_RELOAD_INTERVAL_S
+    RAG_RELOAD_INTERVAL_S: float = 30.0
+    RAG_UPSERT_BATCH: int = 1000
+    RAG_KEEP_GENERATIONS: int = 2
+
+    # /ws/predict: pipelined messages per connection; WS_MAX_INFLIGHT accepted-but-unsent messages bound memory
+    # (uvicorn's --ws-max-size bounds a single frame). Streams default to the lean fields below
+    WS_MAX_INFLIGHT: int = 256
+    WS_FLUSH_MAX: int = 64
+    WS_DEFAULT_DETAIL: str = 'minimal'
+    WS_DEFAULT_FIELDS: List[str] = ['category', 'confidence', 'path', 'model_version', 'degraded']
+
+    # other taxonomies / versions picked per request (api/inference/registry.py), loaded on first use and
+    # evicted least recently used past the budget; a model with its own embedder is accounted EMBEDDER_MB extra
+    MODEL_REGISTRY_DIR: str = 'api/models/registry'
+    MODEL_REGISTRY_BUDGET_MB: int = 1024
+    MODEL_REGISTRY_EMBEDDER_MB: int = 100
+
 settings = Settings()
@@ -0,0 +1,126 @@
+"""Response shaping for the predict endpoints: field selection, attribution precision and encodings.
+
+    JSON                    orjson when installed (numpy-aware, no jsonable_encoder pass), else json.dumps
+    application/msgpack     the same structure as MessagePack
+      + raw_floats          attribution arrays packed as {'dtype', 'shape', 'data'} raw little-endian buffers,
+                            read back with np.frombuffer(data, dtype).reshape(shape)
+
+Payloads are rendered into a Response here, so FastAPI's default encoder never walks the SHAP lists.
+"""
+import json
+from typing import Iterable, Optional
+
+import numpy as np
+from fastapi.responses import Response
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+RESPONSE_FIELDS = ('category', 'confidence', 'rag_explanation', 'agent_summary', 'summary_id', 'summary_status',
+                   'shap', 'path', 'model', 'model_version', 'degraded', 'id', 'row', 'error')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+# float arrays inside a SHAP payload; `indices` are the only integer array
+ATTRIBUTION_KEYS = ('shap_values', 'values', 'base_values')
+
+
+def parse_fields(fields) -> Optional[frozenset]:
+    """`fields` as a set (None = everything); accepts a list or a comma-separated string."""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    names = frozenset(f.strip() for f in fields if f.strip())
+    unknown = names - set(RESPONSE_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+    return names or None
+
+
+def select_fields(result: dict, fields: Optional[Iterable[str]]) -> dict:
+    return result if fields is None else {k: v for k, v in result.items() if k in fields}
+
+
+def round_attributions(shap, precision: Optional[int]):
+    """Copy of a SHAP payload with its attribution arrays rounded to `precision` decimals."""
+    if precision is None or not isinstance(shap, dict):
+        return shap
+    out = dict(shap)
+    for key in ATTRIBUTION_KEYS:
+        value = out.get(key)
+        if isinstance(value, list) and value and not isinstance(value[0], str):
+            out[key] = np.round(np.asarray(value, dtype=np.float64), precision).tolist()
+    if isinstance(out.get('base_value'), float):
+        out['base_value'] = round(out['base_value'], precision)
+    return out
+
+
+def shape(result: dict, fields: Optional[frozenset] = None, precision: Optional[int] = None) -> dict:
+    result = select_fields(result, fields)
+    if precision is not None and result.get('shap') is not None:
+        result = dict(result, shap=round_attributions(result['shap'], precision))
+    return result
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """'msgpack' when the Accept header asks for it (and msgpack is installed), else 'json'."""
+    if accept and msgpack is not None and any(t in accept for t in MSGPACK_TYPES):
+        return 'msgpack'
+    return 'json'
+
+
+def _raw_arrays(shap):
+    if not isinstance(shap, dict):
+        return shap
+    out = dict(shap)
+    for key in ATTRIBUTION_KEYS + ('indices',):
+        value = out.get(key)
+        if isinstance(value, list) and value and not isinstance(value[0], str):
+            arr = np.asarray(value, dtype=np.int32 if key == 'indices' else np.float32)
+            out[key] = {'dtype': arr.dtype.str, 'shape': list(arr.shape), 'data': arr.tobytes()}
+    return out
+
+
+def _pack_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'cannot serialize {type(obj).__name__}')
+
+
+def encode(payload, fmt: str = 'json', raw_floats: bool = False) -> bytes:
+    if fmt == 'msgpack':
+        if raw_floats:
+            if 'results' in payload:
+                payload = dict(payload, results=[dict(r, shap=_raw_arrays(r['shap'])) if r.get('shap') else r
+                                                 for r in payload['results']])
+            elif payload.get('shap') is not None:
+                payload = dict(payload, shap=_raw_arrays(payload['shap']))
+        return msgpack.packb(payload, default=_pack_default, use_bin_type=True)
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_pack_default).encode('utf-8')
+
+
+def decode(data, fmt: str = 'json'):
+    """Parse a request frame; ValueError when it is not valid JSON / MessagePack."""
+    try:
+        if fmt == 'msgpack':
+            return msgpack.unpackb(data, raw=False)
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(str(e))
+
+
+def render(payload, fmt: str = 'json', raw_floats: bool = False) -> Response:
+    media_type = MSGPACK_TYPES[0] if fmt == 'msgpack' else 'application/json'
+    return Response(encode(payload, fmt, raw_floats), media_type=media_type, headers={'Vary': 'Accept'})
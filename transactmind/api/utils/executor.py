@@ -0,0 +1,110 @@
+"""Executor-backed stage runner with bounded per-stage concurrency and fast overload rejection."""
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from api.utils import tracing
+from api.utils.metrics import QUEUE_DEPTH, SHED, STAGE_INFLIGHT, STAGE_QUEUE_SECONDS
+
+
+class OverloadedError(Exception):
+    def __init__(self, stage: str, retry_after: float = 1.0):
+        super().__init__(f"stage '{stage}' is overloaded")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class StageExecutor:
+    """Runs blocking stage functions off the event loop.
+
+    Each stage may have at most `concurrency[stage]` calls running and `max_queue` calls waiting;
+    anything beyond that is rejected immediately with OverloadedError instead of queueing without limit.
+    In 'process' mode the functions must be picklable (see api.inference.pipeline) and every worker
+    builds its own components through `initializer`.
+    """
+
+    def __init__(self, kind: str = 'thread', concurrency: Optional[Dict[str, int]] = None,
+                 max_workers: Optional[int] = None, max_queue: int = 128, retry_after: float = 1.0,
+                 default_concurrency: int = 1, initializer=None):
+        self.kind = kind
+        self.concurrency = dict(concurrency or {})
+        self.default_concurrency = default_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        workers = max_workers or max(1, sum(self.concurrency.values()) or default_concurrency)
+        if kind == 'process':
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+        else:
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='inference')
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._waiting: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._gauges: Dict[str, tuple] = {}
+        # smoothed run time per stage, for deadline planning (see api.utils.budget)
+        self._cost: Dict[str, float] = {}
+
+    def _slot(self, stage: str) -> asyncio.Semaphore:
+        sem = self._slots.get(stage)
+        if sem is None:
+            sem = self._slots[stage] = asyncio.Semaphore(self.concurrency.get(stage, self.default_concurrency))
+            self._waiting[stage] = 0
+            self._running[stage] = 0
+            # pre-bound metric children: no label lookup on the hot path
+            self._gauges[stage] = (QUEUE_DEPTH.labels(stage=stage), STAGE_INFLIGHT.labels(stage=stage),
+                                   STAGE_QUEUE_SECONDS.labels(stage=stage))
+        return sem
+
+    def check(self, stage: str):
+        """Raise OverloadedError if a new call to `stage` would exceed its queue limit."""
+        if self._slot(stage).locked() and self._waiting[stage] >= self.max_queue:
+            SHED.labels(stage=stage).inc()
+            raise OverloadedError(stage, self.retry_after)
+
+    def queue_depth(self, stage: str) -> int:
+        return self._waiting.get(stage, 0)
+
+    def estimate(self, stage: str) -> float:
+        """Expected seconds until a call to `stage` submitted now completes (0 until one has run)."""
+        cost = self._cost.get(stage, 0.0)
+        if not cost:
+            return 0.0
+        slots = self.concurrency.get(stage, self.default_concurrency)
+        return cost * (1 + (self._waiting.get(stage, 0) + self._running.get(stage, 0)) // max(1, slots))
+
+    async def run(self, stage: str, fn, *args, shed: bool = True):
+        sem = self._slot(stage)
+        depth, inflight, queue_seconds = self._gauges[stage]
+        if shed:
+            self.check(stage)
+        self._waiting[stage] += 1
+        depth.set(self._waiting[stage])
+        t0 = time.perf_counter()
+        try:
+            await sem.acquire()
+        finally:
+            self._waiting[stage] -= 1
+            depth.set(self._waiting[stage])
+        waited = time.perf_counter() - t0
+        queue_seconds.observe(waited)
+        tracing.record(f'queue_{stage}', waited, observe=False)
+        self._running[stage] += 1
+        inflight.set(self._running[stage])
+        t1 = time.perf_counter()
+        try:
+            if self.kind == 'process':
+                return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+            # run in a copy of the caller's context so stage timings reach its request breakdown
+            ctx = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(self.pool, ctx.run, fn, *args)
+        finally:
+            took = time.perf_counter() - t1
+            prev = self._cost.get(stage)
+            self._cost[stage] = took if prev is None else 0.8 * prev + 0.2 * took
+            self._running[stage] -= 1
+            inflight.set(self._running[stage])
+            sem.release()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,55 @@
+"""Startup bookkeeping behind /healthz and /readyz: per-component load state and timings."""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from api.utils.metrics import COMPONENT_LOAD_SECONDS, COMPONENT_READY, STARTUP_PHASE_SECONDS, WARMUP_STAGE_SECONDS
+
+
+class StartupStatus:
+    def __init__(self):
+        self.started_at = time.time()
+        self.components: Dict[str, dict] = {}
+        self.phases: Dict[str, float] = {}
+        self.warmup: Dict[str, float] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+        self._event = asyncio.Event()
+
+    def component_loading(self, name: str):
+        self.components[name] = {'state': 'loading', 'load_seconds': None, 'implementation': None}
+
+    def component_loaded(self, name: str, component, seconds: float, fallback: bool):
+        # 'fallback' means a stub is serving: the pod works, but with degraded answers
+        self.components[name] = {'state': 'fallback' if fallback else 'ready', 'load_seconds': round(seconds, 4),
+                                 'implementation': type(component).__name__}
+        COMPONENT_LOAD_SECONDS.labels(component=name).set(seconds)
+        COMPONENT_READY.labels(component=name).set(0 if fallback else 1)
+
+    def phase(self, name: str, seconds: float):
+        self.phases[name] = round(seconds, 4)
+        STARTUP_PHASE_SECONDS.labels(phase=name).set(seconds)
+
+    def warmed(self, stage: str, seconds: float):
+        self.warmup[stage] = round(seconds, 4)
+        WARMUP_STAGE_SECONDS.labels(stage=stage).set(seconds)
+
+    def mark_ready(self):
+        self.ready = True
+        self._event.set()
+
+    def mark_failed(self, error: str):
+        self.error = error
+        self._event.set()
+
+    async def wait_ready(self, timeout: float) -> bool:
+        if not self._event.is_set():
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.ready
+
+    def snapshot(self) -> dict:
+        return {'ready': self.ready, 'error': self.error, 'uptime_seconds': round(time.time() - self.started_at, 3),
+                'components': self.components, 'startup_phases': self.phases, 'warmup': self.warmup}
@@ -0,0 +1,81 @@
+"""Prometheus metrics shared by modules outside api/main.py; no-ops when prometheus_client is missing."""
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+except Exception:
+    class _NoopMetric:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self, amount=1):
+            pass
+
+        def dec(self, amount=1):
+            pass
+
+        def set(self, value):
+            pass
+
+        def observe(self, value):
+            pass
+
+    Counter = Gauge = Histogram = _NoopMetric
+
+
+EMBED_CACHE_HITS = Counter('transactmind_embedding_cache_hits_total', 'Embedding cache hits', ['tier'])
+EMBED_CACHE_MISSES = Counter('transactmind_embedding_cache_misses_total',
+                             'Embedding cache misses (texts sent to the model)')
+EMBED_CACHE_EVICTIONS = Counter('transactmind_embedding_cache_evictions_total', 'Embedding cache evictions', ['tier'])
+
+COMPONENT_LOAD_SECONDS = Gauge('transactmind_component_load_seconds', 'Time to construct each component at startup',
+                               ['component'])
+COMPONENT_READY = Gauge('transactmind_component_ready', '1 when the real component loaded, 0 when a stub is in use',
+                        ['component'])
+STARTUP_PHASE_SECONDS = Gauge('transactmind_startup_phase_seconds', 'Startup time per phase (load, warmup, total)',
+                              ['phase'])
+WARMUP_STAGE_SECONDS = Gauge('transactmind_warmup_stage_seconds', 'Warmup time per pipeline stage', ['stage'])
+
+RAG_INDEX_GENERATION = Gauge('transactmind_rag_index_generation', 'Exemplar index generation being searched')
+
+MERCHANT_LOOKUPS = Counter('transactmind_merchant_lookups_total', 'Merchant fast-path lookups', ['result'])
+MERCHANT_INDEX_SIZE = Gauge('transactmind_merchant_index_size', 'Canonical merchants in the fast-path index')
+
+CASCADE_ROUTED = Counter('transactmind_cascade_routed_total',
+                         'Texts answered per cascade stage (stage1 = n-gram model, model = MiniLM + classifier)',
+                         ['stage'])
+
+# per-stage instrumentation (see api/utils/tracing.py)
+_STAGE_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+STAGE_LATENCY = Histogram('transactmind_stage_latency_seconds', 'Compute time per pipeline stage', ['stage'],
+                          buckets=_STAGE_BUCKETS)
+STAGE_QUEUE_SECONDS = Histogram('transactmind_stage_queue_seconds', 'Time waiting for a stage executor slot',
+                                ['stage'], buckets=_STAGE_BUCKETS)
+QUEUE_DEPTH = Gauge('transactmind_queue_depth', 'Calls waiting per stage (and in the micro-batcher)', ['stage'])
+STAGE_INFLIGHT = Gauge('transactmind_stage_inflight', 'Calls running per stage', ['stage'])
+BATCH_SIZE = Histogram('transactmind_batch_size', 'Texts per micro-batch', buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+SHED = Counter('transactmind_shed_total', 'Calls rejected by per-stage backpressure (429, or a degraded field)',
+               ['stage'])
+DEGRADED_FIELDS = Counter('transactmind_degraded_fields_total',
+                          'Optional /predict fields skipped or cut short (reason: detail, deadline, overload, timeout)',
+                          ['field', 'reason'])
+DEGRADED_REQUESTS = Counter('transactmind_degraded_requests_total',
+                            '/predict responses with at least one degraded field')
+STUB_FALLBACKS = Counter('transactmind_stub_fallbacks_total', 'Items served by a stub instead of the real component',
+                         ['component'])
+
+MODEL_SWAPS = Counter('transactmind_model_swaps_total', 'Classifier hot-swaps to a new model version')
+MODEL_VERSION = Gauge('transactmind_model_version_info', '1 for the classifier version currently serving', ['version'])
+REGISTRY_LOADS = Counter('transactmind_registry_loads_total', 'Registry models / embedders loaded on first use',
+                         ['model'])
+REGISTRY_LOAD_SECONDS = Histogram('transactmind_registry_load_seconds', 'Time to load a registry entry', ['model'])
+REGISTRY_EVICTIONS = Counter('transactmind_registry_evictions_total',
+                             'Registry entries dropped to stay under MODEL_REGISTRY_BUDGET_MB', ['model'])
+REGISTRY_LOOKUPS = Counter('transactmind_registry_lookups_total', 'Registry lookups (result: hit, miss)', ['result'])
+REGISTRY_BYTES = Gauge('transactmind_registry_bytes', 'Accounted size of the loaded registry entries')
+REGISTRY_ENTRIES = Gauge('transactmind_registry_entries', 'Registry entries loaded')
+
+PREDICTION_LOG_ROWS = Counter('transactmind_prediction_log_rows_total', 'Predictions written to the prediction log')
+PREDICTION_LOG_DROPPED = Counter('transactmind_prediction_log_dropped_total',
+                                 'Predictions dropped by the prediction log (queue full or write error)')
@@ -0,0 +1,272 @@
+"""Buffered prediction log plus incrementally maintained aggregates for the dashboard.
+
+`PredictionLogger.log` only appends a dict to a deque; a background thread drains it every
+`flush_interval_s` (or once `flush_rows` are waiting) and, per batch:
+
+  * appends one Parquet row group to `predictions-<time>-<pid>-<n>.parquet` (JSON lines when pyarrow is missing),
+    starting a new file every `rotate_rows` rows or `rotate_interval_s` seconds, whichever comes first. The
+    file being written is named `*.part` and renamed once closed (a Parquet file has no footer until then),
+    so every `predictions-*.parquet` is complete and a killed worker loses at most one interval of rows;
+  * folds the batch into this process's aggregates and rewrites `aggregates-<pid>.json` atomically.
+
+Aggregates are additive: category and path counts, confidence histograms (overall and per category),
+hourly volume and the most recent low-confidence predictions. Readers merge the per-process files with
+`load_aggregates`, so the dashboard's cost is independent of how many predictions were logged. Files
+left by processes that have exited are folded into `aggregates.json` when the next logger starts.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from api.utils.metrics import PREDICTION_LOG_DROPPED, PREDICTION_LOG_ROWS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = None
+    pq = None
+
+try:
+    import fcntl
+except Exception:
+    fcntl = None
+
+CONFIDENCE_BINS = 20
+HOURLY_WINDOW = 24 * 14
+FIELDS = ('ts', 'text', 'category', 'confidence', 'path', 'model_version', 'latency_ms')
+
+
+def empty_aggregates() -> Dict:
+    return {'total': 0, 'categories': {}, 'paths': {}, 'confidence_bins': [0] * CONFIDENCE_BINS,
+            'category_confidence': {}, 'hourly': {}, 'low_confidence_total': 0, 'low_confidence': [],
+            'first_ts': None, 'last_ts': None}
+
+
+def _bin(confidence: float) -> int:
+    return min(CONFIDENCE_BINS - 1, max(0, int(confidence * CONFIDENCE_BINS)))
+
+
+def _trim_hourly(hourly: Dict[str, int]) -> Dict[str, int]:
+    if len(hourly) <= HOURLY_WINDOW:
+        return hourly
+    return dict(sorted(hourly.items())[-HOURLY_WINDOW:])
+
+
+def update_aggregates(agg: Dict, records: List[Dict], low_threshold: float, low_keep: int) -> Dict:
+    for r in records:
+        category, confidence = r['category'], float(r['confidence'])
+        agg['total'] += 1
+        agg['categories'][category] = agg['categories'].get(category, 0) + 1
+        agg['paths'][r['path']] = agg['paths'].get(r['path'], 0) + 1
+        b = _bin(confidence)
+        agg['confidence_bins'][b] += 1
+        agg['category_confidence'].setdefault(category, [0] * CONFIDENCE_BINS)[b] += 1
+        hour = time.strftime('%Y-%m-%dT%H', time.gmtime(r['ts']))
+        agg['hourly'][hour] = agg['hourly'].get(hour, 0) + 1
+        if confidence < low_threshold:
+            agg['low_confidence_total'] += 1
+            agg['low_confidence'].append({k: r.get(k) for k in ('ts', 'text', 'category', 'confidence',
+                                                                'model_version')})
+        agg['first_ts'] = r['ts'] if agg['first_ts'] is None else min(agg['first_ts'], r['ts'])
+        agg['last_ts'] = r['ts'] if agg['last_ts'] is None else max(agg['last_ts'], r['ts'])
+    agg['low_confidence'] = agg['low_confidence'][-low_keep:]
+    agg['hourly'] = _trim_hourly(agg['hourly'])
+    return agg
+
+
+def merge_aggregates(parts: List[Dict], low_keep: int = 500) -> Dict:
+    out = empty_aggregates()
+    for part in parts:
+        out['total'] += part.get('total', 0)
+        out['low_confidence_total'] += part.get('low_confidence_total', 0)
+        for key in ('categories', 'paths', 'hourly'):
+            for name, n in part.get(key, {}).items():
+                out[key][name] = out[key].get(name, 0) + n
+        for i, n in enumerate(part.get('confidence_bins', [])):
+            out['confidence_bins'][i] += n
+        for category, bins in part.get('category_confidence', {}).items():
+            acc = out['category_confidence'].setdefault(category, [0] * CONFIDENCE_BINS)
+            for i, n in enumerate(bins):
+                acc[i] += n
+        out['low_confidence'].extend(part.get('low_confidence', []))
+        for key, pick in (('first_ts', min), ('last_ts', max)):
+            if part.get(key) is not None:
+                out[key] = part[key] if out[key] is None else pick(out[key], part[key])
+    out['low_confidence'] = sorted(out['low_confidence'], key=lambda r: r['ts'])[-low_keep:]
+    out['hourly'] = _trim_hourly(out['hourly'])
+    return out
+
+
+def _write_json(path: str, data: Dict):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def load_aggregates(directory: str, low_keep: int = 500) -> Dict:
+    """Merged aggregates of every process that has logged to `directory`."""
+    parts = [_read_json(p) for p in glob.glob(os.path.join(directory, 'aggregates*.json'))]
+    return merge_aggregates([p for p in parts if p], low_keep)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except Exception:
+        # no permission to signal it (or no signals on this platform): assume it is running
+        return True
+    return True
+
+
+class PredictionLogger:
+    def __init__(self, directory: str, flush_rows: int = 1000, flush_interval_s: float = 2.0,
+                 rotate_rows: int = 50_000, rotate_interval_s: float = 60.0, max_queue: int = 100_000,
+                 low_threshold: float = 0.6, low_keep: int = 500):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval_s = flush_interval_s
+        self.rotate_rows = rotate_rows
+        self.rotate_interval_s = rotate_interval_s
+        self.max_queue = max_queue
+        self.low_threshold = low_threshold
+        self.low_keep = low_keep
+        self.format = 'parquet' if pq is not None else 'jsonl'
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._path = None
+        self._opened_at = 0.0
+        self._file_rows = 0
+        self._file_seq = 0
+        os.makedirs(directory, exist_ok=True)
+        self.aggregates_path = os.path.join(directory, f'aggregates-{os.getpid()}.json')
+        # a restarted container often reuses the pid: continue that file rather than overwrite it
+        self.aggregates = _read_json(self.aggregates_path) or empty_aggregates()
+
+    def log(self, record: Dict):
+        """Queue one prediction; never blocks. Drops (and counts) it when the writer has fallen behind."""
+        if len(self._queue) >= self.max_queue:
+            PREDICTION_LOG_DROPPED.inc()
+            return
+        self._queue.append(record)
+        if len(self._queue) >= self.flush_rows:
+            self._wake.set()
+
+    def start(self):
+        self._compact()
+        self._thread = threading.Thread(target=self._run, name='prediction-log', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._close_file()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        batch = []
+        while self._queue:
+            batch.append(self._queue.popleft())
+        if self._writer is not None and (self._file_rows >= self.rotate_rows or
+                                         time.monotonic() - self._opened_at >= self.rotate_interval_s):
+            # finish the file on time even when no traffic arrives to start the next one
+            self._close_file()
+        if not batch:
+            return 0
+        try:
+            self._write(batch)
+            update_aggregates(self.aggregates, batch, self.low_threshold, self.low_keep)
+            _write_json(self.aggregates_path, self.aggregates)
+            PREDICTION_LOG_ROWS.inc(len(batch))
+        except Exception:
+            # logging must never take the API down; the batch is lost and counted
+            PREDICTION_LOG_DROPPED.inc(len(batch))
+        return len(batch)
+
+    def _new_path(self) -> str:
+        self._file_seq += 1
+        stamp = time.strftime('%Y%m%dT%H%M%S')
+        return os.path.join(self.directory, f'predictions-{stamp}-{os.getpid()}-{self._file_seq}.{self.format}')
+
+    def _write(self, batch: List[Dict]):
+        if self._writer is None or self._file_rows >= self.rotate_rows:
+            self._close_file()
+            self._path = self._new_path()
+            self._opened_at = time.monotonic()
+            path = self._path + '.part'
+            if self.format == 'parquet':
+                schema = pa.schema([('ts', pa.float64()), ('text', pa.string()), ('category', pa.string()),
+                                    ('confidence', pa.float32()), ('path', pa.string()),
+                                    ('model_version', pa.string()), ('latency_ms', pa.float32())])
+                self._writer = pq.ParquetWriter(path, schema, compression='zstd')
+            else:
+                self._writer = open(path, 'a', encoding='utf-8')
+            self._file_rows = 0
+        if self.format == 'parquet':
+            columns = {k: [r.get(k) for r in batch] for k in FIELDS}
+            self._writer.write_table(pa.table(columns, schema=self._writer.schema))
+        else:
+            self._writer.write(''.join(json.dumps({k: r.get(k) for k in FIELDS}) + '\n' for r in batch))
+            self._writer.flush()
+        self._file_rows += len(batch)
+
+    def _close_file(self):
+        # closing a ParquetWriter writes the footer; the file is readable (and gets its final name) from then on
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._path + '.part', self._path)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, '.lock'), 'a+') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _compact(self):
+        """Fold the aggregates of exited processes into aggregates.json so the file count stays bounded."""
+        with self._locked():
+            base_path = os.path.join(self.directory, 'aggregates.json')
+            dead = []
+            for path in glob.glob(os.path.join(self.directory, 'aggregates-*.json')):
+                pid = os.path.basename(path)[len('aggregates-'):-len('.json')]
+                if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+                    dead.append(path)
+            if not dead:
+                return
+            parts = [_read_json(base_path) or empty_aggregates()] + [_read_json(p) or empty_aggregates() for p in dead]
+            _write_json(base_path, merge_aggregates(parts, self.low_keep))
+            for path in dead:
+                os.remove(path)
@@ -0,0 +1,56 @@
+"""Built-in sampling profiler: periodically snapshots every thread's stack via sys._current_frames.
+
+Output is in collapsed-stack format ("frame;frame;frame count" per line), which flamegraph.pl and
+speedscope read directly. Only runs while a /debug/profile request is in progress.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float = 0.005, max_depth: int = 64):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _stack(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[f'{names.get(ident, ident)};{self._stack(frame)}'] += 1
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return '\n'.join(f'{stack} {count}' for stack, count in self.samples.most_common())
+
+
+def profile(seconds: float, interval_s: float = 0.005) -> str:
+    """Sample all threads for `seconds` (blocking) and return collapsed stacks."""
+    profiler = SamplingProfiler(interval_s)
+    profiler.start()
+    time.sleep(seconds)
+    profiler.stop()
+    return profiler.collapsed()
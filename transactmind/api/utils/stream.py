@@ -0,0 +1,98 @@
+"""Pipelined request/response over one persistent connection (the /ws/predict WebSocket).
+
+Each incoming frame holds one message or a list of them; every message is handled in its own task, and
+results go out tagged with the message's correlation id in completion order, several per frame when
+they finish together. At most `max_inflight` messages per connection are accepted but not yet sent:
+past that the reader stops pulling frames, the socket's receive buffer fills and TCP pushes back on
+the producer, so a fast client cannot grow server memory (a slow reader is bounded the same way).
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+from api.utils.logger import logger
+
+
+class PipelinedConnection:
+    def __init__(self, receive: Callable[[], Awaitable[Optional[Any]]], send: Callable[[List[dict]], Awaitable[None]],
+                 handle: Callable[[dict], Awaitable[dict]], max_inflight: int = 256, flush_max: int = 64,
+                 on_accept=None, on_done=None):
+        self.receive = receive
+        self.send = send
+        self.handle = handle
+        self.flush_max = max(1, flush_max)
+        # called once when a message is accepted and once when its result is sent (or dropped at close)
+        self.on_accept = on_accept
+        self.on_done = on_done
+        self._inflight = asyncio.Semaphore(max(1, max_inflight))
+        # (result, holds an inflight slot)
+        self._outbox: asyncio.Queue = asyncio.Queue()
+        self._tasks = set()
+        self._seq = 0
+
+    async def run(self):
+        """Serve until the client closes or the connection fails; pending work is cancelled on exit."""
+        reader = asyncio.create_task(self._read())
+        writer = asyncio.create_task(self._write())
+        try:
+            # a failed send ends the reader too, instead of leaving it waiting for slots that never free
+            done, _ = await asyncio.wait({reader, writer}, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    logger.debug('stream connection closed: %r', task.exception())
+        finally:
+            for task in [reader, writer, *self._tasks]:
+                task.cancel()
+            while not self._outbox.empty():
+                if self._outbox.get_nowait()[1]:
+                    self._done()
+
+    async def _read(self):
+        while True:
+            try:
+                messages = await self.receive()
+            except ValueError as e:
+                await self._outbox.put(({'id': None, 'error': f'malformed frame: {e}'}, False))
+                continue
+            if messages is None:
+                return
+            for message in messages if isinstance(messages, list) else [messages]:
+                await self._inflight.acquire()
+                task = asyncio.create_task(self._handle(message, self._next_id(message)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    def _next_id(self, message):
+        # messages without an id are tagged with their position in the stream
+        seq, self._seq = self._seq, self._seq + 1
+        return message.get('id', seq) if isinstance(message, dict) else seq
+
+    def _done(self):
+        self._inflight.release()
+        if self.on_done is not None:
+            self.on_done()
+
+    async def _handle(self, message, corr):
+        if self.on_accept is not None:
+            self.on_accept()
+        try:
+            result = await self.handle(message)
+        except asyncio.CancelledError:
+            self._done()
+            raise
+        except Exception:
+            logger.exception('stream message failed')
+            result = {'error': 'internal error'}
+        await self._outbox.put(({'id': corr, **result}, True))
+
+    async def _write(self):
+        while True:
+            batch = [await self._outbox.get()]
+            while len(batch) < self.flush_max and not self._outbox.empty():
+                batch.append(self._outbox.get_nowait())
+            try:
+                await self.send([result for result, _ in batch])
+            finally:
+                # slots free only once results are handed to the socket, so a slow reader is bounded too
+                for _, counted in batch:
+                    if counted:
+                        self._done()
@@ -0,0 +1,102 @@
+"""Per-call overhead of the classifier graph and wrapper, on a synthetic LogisticRegression.
+
+    zipmap_graph     default skl2onnx export: label + ZipMap outputs, dicts converted back to an array
+    softmax_tolist   lean graph, but the old wrapper's extra work: NumPy softmax and .tolist() per row
+    lean_run         lean graph, probabilities only, session.run allocates the output
+    lean_iobinding   lean graph through ONNXClassifier's reused IOBinding buffer
+
+    python benchmarks/classifier_overhead.py --features 384 --classes 12
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+
+def _time_us(fn, repeats):
+    for _ in range(20):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def run(features=384, classes=12, batch_sizes=(1, 8, 32), repeats=2000):
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    from sklearn.linear_model import LogisticRegression
+    from api.inference.classifier import ONNXClassifier
+    from api.inference.sessions import create_session
+    from api.utils.config import settings
+    from training.export_to_onnx import export_classifier
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(classes * 40, features)).astype(np.float32)
+    clf = LogisticRegression(max_iter=300).fit(X, np.arange(len(X)) % classes)
+
+    tmp = tempfile.mkdtemp()
+    zipmap_path = os.path.join(tmp, 'zipmap.onnx')
+    with open(zipmap_path, 'wb') as f:
+        f.write(convert_sklearn(clf, initial_types=[('float_input', FloatTensorType([None, features]))])
+                .SerializeToString())
+    lean_path = os.path.join(tmp, 'lean.onnx')
+    export_classifier(clf, features, lean_path)
+
+    zipmap = create_session(zipmap_path, intra=1)
+    lean = create_session(lean_path, intra=1)
+    settings.ORT_IO_BINDING = False
+    plain = ONNXClassifier(lean_path, prefer_quantized=False)
+    settings.ORT_IO_BINDING = True
+    bound = ONNXClassifier(lean_path, prefer_quantized=False)
+
+    def zipmap_graph(x):
+        out = zipmap.run(None, {'float_input': x})[1]
+        probs = np.array([[row[k] for k in sorted(row)] for row in out], dtype=np.float32)
+        return [(int(i), float(p[i]), p) for i, p in zip(probs.argmax(1), probs)]
+
+    def softmax_tolist(x):
+        probs = _softmax(lean.run(['probabilities'], {'float_input': x})[0])
+        return [(int(i), float(p[i]), p.tolist()) for i, p in zip(np.argmax(probs, axis=1), probs)]
+
+    rows = []
+    for bs in batch_sizes:
+        x = np.ascontiguousarray(X[:bs])
+        for name, fn in (('zipmap_graph', lambda: zipmap_graph(x)), ('softmax_tolist', lambda: softmax_tolist(x)),
+                         ('lean_run', lambda: plain.predict_batch(x)),
+                         ('lean_iobinding', lambda: bound.predict_batch(x))):
+            rows.append({'variant': name, 'batch_size': bs, 'us_per_call': _time_us(fn, repeats)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--features', type=int, default=384)
+    parser.add_argument('--classes', type=int, default=12)
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--repeats', type=int, default=2000)
+    args = parser.parse_args()
+    rows = run(args.features, args.classes, [int(b) for b in args.batch_sizes.split(',')], args.repeats)
+    base = {r['batch_size']: r['us_per_call'] for r in rows if r['variant'] == 'zipmap_graph'}
+    for r in rows:
+        saved = base[r['batch_size']] - r['us_per_call']
+        print(f"bs={r['batch_size']:<4} {r['variant']:<16} {r['us_per_call']:9.1f} us/call  "
+              f"(saves {saved:7.1f} us vs zipmap_graph)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Parity, latency and RSS comparison of the SentenceTransformer and ONNX (fp32 / int8) embedders.
+
+Each backend is loaded in its own spawned process so RSS numbers are not polluted by the others
+(importing torch alone costs hundreds of MB).
+
+    python benchmarks/embedder_parity.py --csv data/synthetic_transactions.csv
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1e6
+    except Exception:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _run_backend(backend, onnx_path, texts, batch_sizes, repeats, queue):
+    import numpy as np
+    from api.inference.embedder import Embedder
+
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    emb = Embedder(backend=backend, onnx_path=onnx_path, prefer_quantized=onnx_path.endswith('.quant.onnx'))
+    load_s = time.perf_counter() - t0
+    if emb.is_stub:
+        queue.put({'error': f'{backend} backend unavailable'})
+        return
+    vectors = np.asarray(emb.embed(texts), dtype=np.float32)
+    latency = {}
+    for bs in batch_sizes:
+        batch = (texts * (bs // max(1, len(texts)) + 1))[:bs]
+        emb.embed(batch)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            emb.embed(batch)
+        latency[bs] = (time.perf_counter() - t0) / repeats * 1000
+    queue.put({
+        'backend': emb.backend,
+        'load_s': load_s,
+        'rss_mb': _rss_mb(),
+        'rss_delta_mb': _rss_mb() - rss_before,
+        'torch_imported': 'torch' in sys.modules,
+        'latency_ms': latency,
+        'vectors': vectors.tolist(),
+    })
+
+
+def _measure(backend, onnx_path, texts, batch_sizes, repeats):
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_backend, args=(backend, onnx_path, texts, batch_sizes, repeats, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _load_texts(csv_path, taxonomy_path):
+    texts = []
+    if csv_path and os.path.exists(csv_path):
+        import csv
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                texts.append(row.get('text') or row.get('transaction') or '')
+    with open(taxonomy_path, 'r', encoding='utf-8') as f:
+        texts.extend(ex['text'] for ex in json.load(f).get('examples', []))
+    return [t for t in texts if t]
+
+
+def main():
+    import numpy as np
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='data/synthetic_transactions.csv')
+    parser.add_argument('--taxonomy', default='api/models/taxonomy.json')
+    parser.add_argument('--onnx', default='api/models/embedder.onnx')
+    parser.add_argument('--batch-sizes', default='1,8,32,128')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--min-cosine', type=float, default=0.99)
+    args = parser.parse_args()
+
+    texts = _load_texts(args.csv, args.taxonomy)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+    variants = [('sentence-transformers', args.onnx), ('onnx', args.onnx),
+                ('onnx', args.onnx.replace('.onnx', '.quant.onnx'))]
+    results = [_measure(b, p, texts, batch_sizes, args.repeats) for b, p in variants]
+
+    reference = next((r for r in results if r.get('backend') == 'sentence-transformers'), None)
+    ok = True
+    for res in results:
+        if 'error' in res:
+            print(res['error'])
+            continue
+        line = (f"{res['backend']:<22} load {res['load_s']:.2f}s  rss {res['rss_mb']:.0f}MB "
+                f"(+{res['rss_delta_mb']:.0f}MB)  torch={res['torch_imported']}  ")
+        line += '  '.join(f'bs{bs}={ms:.1f}ms' for bs, ms in res['latency_ms'].items())
+        if reference is not None and res is not reference:
+            a = np.asarray(reference['vectors'])
+            b = np.asarray(res['vectors'])
+            cos = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+            line += f'  cosine min {cos.min():.4f} mean {cos.mean():.4f}'
+            ok = ok and bool(cos.min() >= args.min_cosine)
+        print(line)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""Headless load test: Zipf-distributed replay of real transaction strings, mixed endpoints, stepped concurrency.
+
+Texts come from one or more CSVs (`text` or `transaction` column), grouped by normalized merchant. Each
+request picks a merchant with probability proportional to 1 / rank ** zipf, then one of its raw strings;
+`--variant-rate` of them get a fresh store/card suffix (new cache keys, same merchant) and `--long-rate`
+get a long memo appended. The endpoint mix (`/predict`, `/predict/batch`, `/explain`) is weighted by `--mix`.
+
+Concurrency is stepped (closed loop: every client thread sends its next request when the last returns).
+Per step the report has throughput, p50/p95/p99 per endpoint and error/429/503 counts; the saturation
+point is the last step that kept p99 within `--slo-p99-ms` and errors within `--max-error-rate` while still
+adding at least `--min-gain` throughput. `--compare` prints the deltas against an earlier report, e.g.
+the previous release.
+
+    python benchmarks/load_test.py --spawn --steps 1,2,4,8,16          # stub backends on a laptop
+    python benchmarks/load_test.py --url http://staging:8000 --csv data/kaggle_raw.csv \\
+        --label v1.4.0 --out load_v1.4.0.json --compare load_v1.3.0.json
+"""
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FALLBACK_TEXTS = ['Walmart Supercenter 1234', 'Netflix subscription', 'Delta Airlines ticket', 'Shell Fuel Station 567',
+                  'POS 4411 Starbucks Store 0921', 'Acme Corp payroll', 'Amazon Mktp US*2K4', 'Con Edison utility bill']
+MEMO = ('recurring payment ref {n} for invoice period ending month end including applicable taxes fees and '
+        'adjustments as per agreement terms processed via card network settlement batch {n}')
+
+
+def _percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class TrafficModel:
+    """Zipf-weighted merchants with realistic string variation; shared by this harness and locustfile.py."""
+
+    def __init__(self, csv_paths=(), zipf=1.1, variant_rate=0.3, long_rate=0.05, seed=0):
+        from api.inference.merchant_index import normalize_merchant
+        groups = {}
+        for path in csv_paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                for row in csv.DictReader(f):
+                    text = row.get('text') or row.get('transaction') or row.get('transaction_text')
+                    if text:
+                        groups.setdefault(normalize_merchant(text) or text, []).append(text)
+        if not groups:
+            groups = {t: [t] for t in FALLBACK_TEXTS}
+        self.rng = random.Random(seed)
+        self.merchants = list(groups.values())
+        # the rank order is a seeded shuffle, so which merchant is "hot" does not depend on file order
+        self.rng.shuffle(self.merchants)
+        weights = [1.0 / (rank + 1) ** zipf for rank in range(len(self.merchants))]
+        total = sum(weights)
+        self.cum_weights, acc = [], 0.0
+        for w in weights:
+            acc += w / total
+            self.cum_weights.append(acc)
+        self.variant_rate = variant_rate
+        self.long_rate = long_rate
+        self._lock = threading.Lock()
+
+    def text(self):
+        with self._lock:
+            rng = self.rng
+            strings = rng.choices(self.merchants, cum_weights=self.cum_weights)[0]
+            text = rng.choice(strings)
+            if rng.random() < self.variant_rate:
+                text = f'{text} #{rng.randint(1000, 99999)}'
+            if rng.random() < self.long_rate:
+                text = f'{text} {MEMO.format(n=rng.randint(1, 10 ** 6))}'
+            return text
+
+
+class Workload:
+    def __init__(self, traffic, mix, batch_sizes=(10, 100), explain_method='linear', seed=0):
+        self.traffic = traffic
+        self.kinds = list(mix)
+        self.cum = []
+        acc, total = 0.0, sum(mix.values())
+        for kind in self.kinds:
+            acc += mix[kind] / total
+            self.cum.append(acc)
+        self.batch_sizes = batch_sizes
+        self.explain_method = explain_method
+        self.rng = random.Random(seed + 1)
+        self._lock = threading.Lock()
+
+    def next(self):
+        """(kind, path, body, items) for the next request."""
+        with self._lock:
+            kind = self.rng.choices(self.kinds, cum_weights=self.cum)[0]
+            size = self.rng.randint(*self.batch_sizes)
+        if kind == 'batch':
+            items = [{'transaction_text': self.traffic.text()} for _ in range(size)]
+            return kind, '/predict/batch', items, size
+        if kind == 'explain':
+            return kind, '/explain', {'transaction_text': self.traffic.text(), 'method': self.explain_method}, 1
+        return kind, '/predict', {'transaction_text': self.traffic.text()}, 1
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        kind, weight = part.split('=')
+        if kind not in ('predict', 'batch', 'explain'):
+            raise ValueError(f'unknown request kind {kind!r}')
+        mix[kind] = float(weight)
+    return mix
+
+
+def _run_step(host, port, workload, concurrency, seconds):
+    stats = {}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        local = {}
+        while time.perf_counter() < stop:
+            kind, path, body, items = workload.next()
+            entry = local.setdefault(kind, {'latencies': [], 'items': 0, 'errors': 0, '429': 0, '503': 0})
+            t0 = time.perf_counter()
+            try:
+                conn.request('POST', path, body=json.dumps(body), headers={'Content-Type': 'application/json'})
+                resp = conn.getresponse()
+                resp.read()
+                status = resp.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=60)
+                status = None
+            elapsed = time.perf_counter() - t0
+            if status == 200:
+                entry['latencies'].append(elapsed * 1000)
+                entry['items'] += items
+            elif status in (429, 503):
+                entry[str(status)] += 1
+                # honour back-pressure briefly instead of hammering a shedding server
+                time.sleep(0.05)
+            else:
+                entry['errors'] += 1
+        conn.close()
+        with lock:
+            for kind, entry in local.items():
+                agg = stats.setdefault(kind, {'latencies': [], 'items': 0, 'errors': 0, '429': 0, '503': 0})
+                for key in ('items', 'errors', '429', '503'):
+                    agg[key] += entry[key]
+                agg['latencies'].extend(entry['latencies'])
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    step = {'concurrency': concurrency, 'seconds': wall, 'endpoints': {}}
+    ok = failed = 0
+    for kind, s in stats.items():
+        n = len(s['latencies'])
+        ok += n
+        failed += s['errors'] + s['429'] + s['503']
+        step['endpoints'][kind] = {
+            'requests': n, 'rps': n / wall, 'items_per_s': s['items'] / wall, 'errors': s['errors'],
+            'rejected_429': s['429'], 'unavailable_503': s['503'],
+            'p50_ms': _percentile(s['latencies'], 0.50), 'p95_ms': _percentile(s['latencies'], 0.95),
+            'p99_ms': _percentile(s['latencies'], 0.99),
+        }
+    all_latencies = [x for s in stats.values() for x in s['latencies']]
+    step.update({'rps': ok / wall, 'error_rate': failed / max(1, ok + failed),
+                 'p50_ms': _percentile(all_latencies, 0.50), 'p95_ms': _percentile(all_latencies, 0.95),
+                 'p99_ms': _percentile(all_latencies, 0.99)})
+    return step
+
+
+def saturation(steps, slo_p99_ms, max_error_rate, min_gain):
+    """Last step within the SLO that still added at least `min_gain` (fractional) throughput, or None."""
+    best = None
+    for step in steps:
+        if step['p99_ms'] is None or step['p99_ms'] > slo_p99_ms or step['error_rate'] > max_error_rate:
+            break
+        if best is not None and step['rps'] < best['rps'] * (1 + min_gain):
+            break
+        best = step
+    return None if best is None else {'concurrency': best['concurrency'], 'rps': best['rps'],
+                                      'p99_ms': best['p99_ms']}
+
+
+def _server_info(host, port):
+    try:
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        conn.request('GET', '/readyz')
+        snapshot = json.loads(conn.getresponse().read())
+        conn.close()
+        return {name: {k: c.get(k) for k in ('state', 'implementation')}
+                for name, c in snapshot.get('components', {}).items()}
+    except Exception:
+        return None
+
+
+def _spawn(port, env_overrides, timeout):
+    env = dict(os.environ, **env_overrides)
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'api.main:app', '--host', '127.0.0.1',
+                             '--port', str(port), '--log-level', 'warning'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline and proc.poll() is None:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/readyz')
+            if conn.getresponse().status == 200:
+                return proc
+        except (OSError, http.client.HTTPException):
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError('spawned server did not become ready')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def format_report(report, baseline=None):
+    lines = [f"{'conc':>4}  {'req/s':>8}  {'p50':>8}  {'p95':>8}  {'p99':>8}  {'err%':>5}  per endpoint (req/s, p99)"]
+    base_steps = {s['concurrency']: s for s in (baseline or {}).get('steps', [])}
+    for s in report['steps']:
+        per = '  '.join(f"{k} {e['rps']:.1f}/{e['p99_ms'] or 0:.0f}ms" for k, e in sorted(s['endpoints'].items()))
+        line = (f"{s['concurrency']:>4}  {s['rps']:>8.1f}  {s['p50_ms'] or 0:>6.1f}ms  {s['p95_ms'] or 0:>6.1f}ms  "
+                f"{s['p99_ms'] or 0:>6.1f}ms  {100 * s['error_rate']:>5.1f}  {per}")
+        base = base_steps.get(s['concurrency'])
+        if base and base['rps'] and base['p99_ms'] and s['p99_ms']:
+            line += (f"  [vs baseline: req/s {s['rps'] / base['rps'] - 1:+.0%}, "
+                     f"p99 {s['p99_ms'] / base['p99_ms'] - 1:+.0%}]")
+        lines.append(line)
+    sat = report['saturation']
+    lines.append(f"saturation: {sat['concurrency']} concurrent, {sat['rps']:.1f} req/s, p99 {sat['p99_ms']:.1f}ms"
+                 if sat else 'saturation: SLO already missed at the first step')
+    if baseline and baseline.get('saturation') and sat:
+        lines.append(f"baseline ({baseline['meta'].get('label')}): {baseline['saturation']['concurrency']} "
+                     f"concurrent, {baseline['saturation']['rps']:.1f} req/s")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--spawn', action='store_true',
+                        help='start a local uvicorn (stub backends unless models exist)')
+    parser.add_argument('--csv', action='append', default=[])
+    parser.add_argument('--zipf', type=float, default=1.1)
+    parser.add_argument('--variant-rate', type=float, default=0.3)
+    parser.add_argument('--long-rate', type=float, default=0.05)
+    parser.add_argument('--mix', default='predict=0.85,batch=0.1,explain=0.05')
+    parser.add_argument('--batch-size', default='10,100', help='min,max items per /predict/batch call')
+    parser.add_argument('--explain-method', default='linear', choices=('linear', 'kernel'))
+    parser.add_argument('--steps', default='1,2,4,8,16,32')
+    parser.add_argument('--step-seconds', type=float, default=20.0)
+    parser.add_argument('--warmup-seconds', type=float, default=5.0)
+    parser.add_argument('--slo-p99-ms', type=float, default=250.0)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--min-gain', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default=None, help='release name stored in the report')
+    parser.add_argument('--out', default=os.path.join(ROOT, 'benchmarks', 'load_report.json'))
+    parser.add_argument('--compare', help='earlier report to diff against')
+    args = parser.parse_args()
+
+    csvs = args.csv or [os.path.join(ROOT, 'data', 'synthetic_transactions.csv')]
+    traffic = TrafficModel(csvs, args.zipf, args.variant_rate, args.long_rate, args.seed)
+    workload = Workload(traffic, parse_mix(args.mix), tuple(int(x) for x in args.batch_size.split(',')),
+                        args.explain_method, args.seed)
+
+    proc = None
+    if args.spawn:
+        port = _free_port()
+        proc = _spawn(port, {}, 300)
+        host = '127.0.0.1'
+    else:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    try:
+        if args.warmup_seconds:
+            _run_step(host, port, workload, 2, args.warmup_seconds)
+        steps = []
+        for concurrency in [int(c) for c in args.steps.split(',')]:
+            step = _run_step(host, port, workload, concurrency, args.step_seconds)
+            steps.append(step)
+            print(f"step {concurrency:>3}: {step['rps']:.1f} req/s, p99 {step['p99_ms'] or 0:.1f}ms", flush=True)
+        server = _server_info(host, port)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(30)
+
+    report = {
+        'meta': {'label': args.label, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                 'target': 'spawned' if args.spawn else args.url, 'server_components': server,
+                 'merchants': len(traffic.merchants), 'config': vars(args)},
+        'steps': steps,
+        'saturation': saturation(steps, args.slo_p99_ms, args.max_error_rate, args.min_gain),
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+    print('Report written to', args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Encode time and bytes per /predict response for each response mode, on a synthetic linear-model payload.
+
+    fastapi_default   jsonable_encoder + json.dumps, what returning the dict from the endpoint used to cost
+    orjson            api.utils.encoding JSON (orjson when installed)
+    msgpack           Accept: application/msgpack
+    msgpack_raw       msgpack with raw float32 attribution buffers (raw_floats)
+    *_p4              attributions rounded to 4 decimals (precision=4)
+    fields            fields=category,confidence
+
+Payloads: dense attributions (SHAP_TOP_K=0, n_classes x dim floats) and the default top-k sparse payload.
+
+    python benchmarks/serialization.py --dim 384 --classes 12 --top-k 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+
+def _time_us(fn, repeats):
+    for _ in range(10):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def payloads(dim=384, classes=12, top_k=10, seed=0):
+    rng = np.random.default_rng(seed)
+    base = {'category': 'groceries', 'confidence': 0.9731, 'rag_explanation': "Example: 'Walmart Supercenter 1234' "
+            "(category: groceries) Example: 'Kroger #512' (category: groceries)",
+            'agent_summary': "Predicted 'groceries' with confidence 0.97.", 'summary_id': '0' * 32,
+            'summary_status': 'template', 'path': 'model', 'model_version': 'v0003', 'degraded': {}}
+    contrib = rng.normal(scale=0.01, size=(classes, dim))
+    dense = dict(base, shap={'method': 'linear', 'base_values': rng.normal(size=classes).tolist(),
+                             'shap_values': contrib.tolist()})
+    idx = np.argsort(-np.abs(contrib[0]))[:top_k]
+    sparse = dict(base, shap={'method': 'linear', 'class': 'groceries', 'base_value': 0.12,
+                              'indices': idx.tolist(), 'values': contrib[0][idx].tolist()})
+    return {'dense': dense, f'top{top_k}': sparse}
+
+
+def run(dim=384, classes=12, top_k=10, repeats=500):
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from api.utils import encoding
+
+    modes = {
+        'fastapi_default': lambda p: json.dumps(jsonable_encoder(p), ensure_ascii=False, allow_nan=False,
+                                                separators=(',', ':')).encode('utf-8'),
+        'orjson': lambda p: encoding.encode(encoding.shape(p)),
+        'orjson_p4': lambda p: encoding.encode(encoding.shape(p, precision=4)),
+        'fields': lambda p: encoding.encode(encoding.shape(p, frozenset(('category', 'confidence')))),
+    }
+    if encoding.msgpack is not None:
+        modes.update({
+            'msgpack': lambda p: encoding.encode(encoding.shape(p), 'msgpack'),
+            'msgpack_p4': lambda p: encoding.encode(encoding.shape(p, precision=4), 'msgpack'),
+            'msgpack_raw': lambda p: encoding.encode(encoding.shape(p), 'msgpack', raw_floats=True),
+        })
+    rows = []
+    for name, payload in payloads(dim, classes, top_k).items():
+        for mode, fn in modes.items():
+            rows.append({'payload': name, 'mode': mode, 'bytes': len(fn(payload)),
+                         'us_per_response': _time_us(lambda: fn(payload), repeats)})
+    return rows, {'orjson': encoding.orjson is not None, 'msgpack': encoding.msgpack is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--classes', type=int, default=12)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--repeats', type=int, default=500)
+    args = parser.parse_args()
+    rows, available = run(args.dim, args.classes, args.top_k, args.repeats)
+    print('available:', ', '.join(f'{k}={v}' for k, v in available.items()))
+    base = {r['payload']: r for r in rows if r['mode'] == 'fastapi_default'}
+    for r in rows:
+        b = base[r['payload']]
+        print(f"{r['payload']:<6} {r['mode']:<16} {r['us_per_response']:9.1f} us  {r['bytes']:8d} bytes  "
+              f"({b['us_per_response'] / r['us_per_response']:5.1f}x faster, {r['bytes'] / b['bytes']:6.1%} of bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+"""Per-stage and end-to-end latency of the inference pipeline, with a stored baseline and regression gate.
+
+Every stage is timed on its own at several batch sizes, for the stub components and for the real ones
+(whatever `pipeline.COMPONENT_BUILDERS` loads; stages that fell back to a stub are marked `fallback`).
+Results are written as JSON and compared with `benchmarks/baseline.json`: a stage regresses when its p50
+is more than `--tolerance` slower than the baseline and by more than `--min-delta-ms`.
+
+    python benchmarks/stage_bench.py                      # run, compare, exit 1 on regression
+    python benchmarks/stage_bench.py --update-baseline    # store this run as the baseline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+STAGES = ('preprocess', 'embed', 'classify_fp32', 'classify_int8', 'shap', 'rag', 'agent', 'end_to_end')
+TEXTS = ['Walmart Supercenter 1234', 'Netflix subscription', 'Delta Airlines ticket', 'Shell Fuel Station 567',
+         'POS 4411 Starbucks Store 0921', 'Acme Corp payroll', 'Amazon Mktp US*2K4', 'Con Edison utility bill']
+
+
+def _stub_components():
+    from api.inference.classifier import StubClassifier
+    from api.inference.embedder import StubEmbedder
+    from api.inference.pipeline import MinimalAgent
+    from api.rag.rag_engine import StubRAG
+    return {'embedder': StubEmbedder(), 'classifier_fp32': StubClassifier(), 'classifier_int8': StubClassifier(),
+            'rag': StubRAG(), 'agent': MinimalAgent()}
+
+
+# components each stage times besides the embedder and fp32 classifier, which every run needs for its inputs
+STAGE_COMPONENTS = {'classify_int8': ('classifier_int8',), 'rag': ('rag',), 'end_to_end': ('rag',),
+                    'agent': ('agent',)}
+
+
+def _real_components(stages=STAGES, shared=None):
+    """The real components `stages` need; those in `shared` (a running server's
+    `pipeline.get_components()`) are reused instead of loaded a second time."""
+    from api.inference import pipeline
+    from api.inference.classifier import ONNXClassifier
+    from api.utils.config import settings
+    shared = shared or {}
+    names = {'embedder', 'classifier_fp32'}
+    for stage in stages:
+        names.update(STAGE_COMPONENTS.get(stage, ()))
+    comps = {}
+    for name in names:
+        if name.startswith('classifier'):
+            quantized = name == 'classifier_int8'
+            served = shared.get('classifier')
+            if served is not None and getattr(served, 'quantized', False) == quantized:
+                comps[name] = served
+            else:
+                comps[name] = ONNXClassifier(settings.MODEL_PATH, prefer_quantized=quantized)
+        else:
+            comps[name] = shared.get(name) or pipeline.COMPONENT_BUILDERS[name]()
+    return comps
+
+
+def _fallback(name, component):
+    from api.inference.pipeline import is_fallback
+    if name.startswith('classifier'):
+        if name == 'classifier_int8' and not getattr(component, 'quantized', False):
+            return True
+        return is_fallback('classifier', component)
+    return is_fallback(name, component)
+
+
+def _time(fn, repeats):
+    fn()  # warm
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {'p50_ms': statistics.median(samples), 'p95_ms': samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+            'mean_ms': statistics.fmean(samples)}
+
+
+def _stage_fns(comps, batch):
+    from api.inference.preprocess import preprocess_text
+    from api.utils.config import settings
+    embedder, clf, rag, agent = comps['embedder'], comps['classifier_fp32'], comps.get('rag'), comps.get('agent')
+    embs = embedder.embed(batch)
+    preds = clf.predict_batch(embs)
+    categories = [p[0] for p in preds]
+
+    def end_to_end():
+        # the /predict path; the agent is excluded because summaries are generated off the request path
+        texts = [preprocess_text(t) for t in batch]
+        e = embedder.embed(texts)
+        p = clf.predict_batch(e)
+        for emb in e:
+            clf.shap_explain(emb, top_k=settings.SHAP_TOP_K)
+        rag.explain_batch(texts, [x[0] for x in p], e)
+
+    return {
+        'preprocess': (None, lambda: [preprocess_text(t) for t in batch]),
+        'embed': ('embedder', lambda: embedder.embed(batch)),
+        'classify_fp32': ('classifier_fp32', lambda: clf.predict_batch(embs)),
+        'classify_int8': ('classifier_int8', lambda: comps['classifier_int8'].predict_batch(embs)),
+        'shap': ('classifier_fp32', lambda: [clf.shap_explain(e, top_k=settings.SHAP_TOP_K) for e in embs]),
+        'rag': ('rag', lambda: [rag.explain(t, c, embedding=e) for t, c, e in zip(batch, categories, embs)]),
+        'agent': ('agent', lambda: [agent.summarize(t, c, 0.9, 'benchmark') for t, c in zip(batch, categories)]),
+        'end_to_end': ('embedder', end_to_end),
+    }
+
+
+def run_suite(backends=('stub', 'real'), batch_sizes=(1, 8, 32), repeats=20, stages=STAGES,
+              agent_batch_sizes=(1,), agent_repeats=3, shared=None):
+    """Time every stage; returns {'meta': ..., 'results': {'<backend>/<stage>/bs<n>': {...}}}.
+
+    `shared` are already loaded real components to reuse (see `_real_components`).
+    """
+    results = {}
+    for backend in backends:
+        comps = _stub_components() if backend == 'stub' else _real_components(stages, shared)
+        for bs in batch_sizes:
+            batch = (TEXTS * (bs // len(TEXTS) + 1))[:bs]
+            fns = _stage_fns(comps, batch)
+            for stage in stages:
+                # an LLM call per text is seconds, not milliseconds: time it sparingly
+                if stage == 'agent' and bs not in agent_batch_sizes:
+                    continue
+                component, fn = fns[stage]
+                entry = {'backend': backend, 'stage': stage, 'batch_size': bs}
+                if component is not None:
+                    entry['implementation'] = type(comps[component]).__name__
+                    entry['fallback'] = backend == 'real' and _fallback(component, comps[component])
+                try:
+                    entry.update(_time(fn, agent_repeats if stage == 'agent' else repeats))
+                    entry['per_item_ms'] = entry['p50_ms'] / bs
+                except Exception as e:
+                    entry['error'] = f'{type(e).__name__}: {e}'
+                results[f'{backend}/{stage}/bs{bs}'] = entry
+    meta = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'repeats': repeats}
+    return {'meta': meta, 'results': results}
+
+
+def compare(current, baseline, tolerance=0.25, min_delta_ms=0.5):
+    """Regressions of `current` against `baseline`, as a list of dicts.
+
+    Entries whose implementation or fallback state changed are skipped: a stub timing says nothing
+    about the real model.
+    """
+    regressions = []
+    for key, cur in current['results'].items():
+        base = baseline.get('results', {}).get(key)
+        if not base or 'p50_ms' not in cur or 'p50_ms' not in base:
+            continue
+        if cur.get('implementation') != base.get('implementation') or cur.get('fallback') != base.get('fallback'):
+            continue
+        delta = cur['p50_ms'] - base['p50_ms']
+        if cur['p50_ms'] > base['p50_ms'] * (1 + tolerance) and delta > min_delta_ms:
+            regressions.append({'key': key, 'baseline_p50_ms': base['p50_ms'], 'p50_ms': cur['p50_ms'],
+                                'ratio': cur['p50_ms'] / base['p50_ms'] if base['p50_ms'] else float('inf')})
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def format_report(report, regressions=None):
+    lines = []
+    for key, r in report['results'].items():
+        if 'error' in r:
+            lines.append(f'{key:<34} error: {r["error"]}')
+            continue
+        flag = ' (stub fallback)' if r.get('fallback') else ''
+        lines.append(f"{key:<34} p50 {r['p50_ms']:8.2f}ms  p95 {r['p95_ms']:8.2f}ms  "
+                     f"per item {r['per_item_ms']:7.3f}ms{flag}")
+    for reg in regressions or []:
+        lines.append(f"REGRESSION {reg['key']}: {reg['baseline_p50_ms']:.2f}ms -> {reg['p50_ms']:.2f}ms "
+                     f"({reg['ratio']:.2f}x)")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', default='stub,real')
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--out', default=os.path.join(ROOT, 'benchmarks', 'results.json'))
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=0.5)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    report = run_suite(backends=args.backends.split(','), batch_sizes=[int(b) for b in args.batch_sizes.split(',')],
+                       repeats=args.repeats, stages=args.stages.split(','))
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline or baseline is None:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(format_report(report))
+        print('Baseline written to', args.baseline)
+        return
+    regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+    print(format_report(report, regressions))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
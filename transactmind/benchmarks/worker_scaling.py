@@ -0,0 +1,151 @@
+"""Throughput and memory of gunicorn_conf.py serving from 1 to N workers.
+
+For each worker count a fresh gunicorn is started, /predict is driven by 4 client threads per worker for
+`--seconds`, then RSS / PSS / USS are read for the master and every worker. PSS splits shared pages
+(mmapped ONNX weights, exemplar matrix, LLM) between the processes mapping them, so total PSS is the
+real footprint; total RSS counts the shared pages once per worker.
+
+    python benchmarks/worker_scaling.py --max-workers 4 --seconds 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _texts(csv_path):
+    import csv
+    texts = []
+    if os.path.exists(csv_path):
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            texts = [r.get('text') or r.get('transaction') for r in csv.DictReader(f)]
+    base = [t for t in texts if t] or ['Walmart Supercenter', 'Netflix subscription', 'Delta Airlines ticket']
+    # unique suffixes keep the embedding cache from turning this into a cache benchmark
+    return [f'{base[i % len(base)]} {i}' for i in range(5000)]
+
+
+def _post(url, text):
+    req = urllib.request.Request(url, data=json.dumps({'transaction_text': text}).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        resp.read()
+        return resp.status
+
+
+def _wait_ready(proc, base_url, workers, timeout):
+    # each request lands on an arbitrary worker: require a run of successes before trusting readiness
+    deadline, streak = time.time() + timeout, 0
+    while time.time() < deadline and streak < 3 * workers and proc.poll() is None:
+        try:
+            with urllib.request.urlopen(base_url + '/readyz', timeout=5) as resp:
+                streak = streak + 1 if resp.status == 200 else 0
+        except Exception:
+            streak = 0
+            time.sleep(0.5)
+    return streak >= 3 * workers
+
+
+def _drive(url, texts, threads, seconds):
+    counts, errors = [0] * threads, [0] * threads
+    stop = time.time() + seconds
+
+    def worker(n):
+        i = n
+        while time.time() < stop:
+            try:
+                _post(url, texts[i % len(texts)])
+                counts[n] += 1
+            except Exception:
+                errors[n] += 1
+            i += threads
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return sum(counts) / seconds, sum(errors)
+
+
+def _memory(pid):
+    import psutil
+    master = psutil.Process(pid)
+    procs = {'master': [master], 'workers': master.children(recursive=True)}
+    out = {}
+    for role, group in procs.items():
+        rows = []
+        for p in group:
+            try:
+                full = p.memory_full_info()
+                rows.append({'rss_mb': full.rss / 1e6, 'pss_mb': getattr(full, 'pss', full.rss) / 1e6,
+                             'uss_mb': full.uss / 1e6})
+            except Exception:
+                pass
+        out[role] = rows
+    return out
+
+
+def run(workers, port, texts, seconds, startup_timeout, model_path_only):
+    env = dict(os.environ, SERVE_WORKERS=str(workers), BIND=f'127.0.0.1:{port}')
+    if model_path_only:
+        # measure the transformer path, not the merchant index / first-stage shortcuts
+        env.update(MERCHANT_INDEX_ENABLED='false', CASCADE_ENABLED='false')
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_conf.py', 'api.main:app'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        if not _wait_ready(proc, base_url, workers, startup_timeout):
+            return {'workers': workers, 'error': 'not ready'}
+        rps, errors = _drive(base_url + '/predict', texts, 4 * workers, seconds)
+        mem = _memory(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(30)
+    w = mem['workers']
+    return {
+        'workers': workers, 'rps': rps, 'errors': errors,
+        'worker_rss_mb': sum(r['rss_mb'] for r in w) / max(1, len(w)),
+        'worker_uss_mb': sum(r['uss_mb'] for r in w) / max(1, len(w)),
+        'total_rss_mb': sum(r['rss_mb'] for r in w + mem['master']),
+        'total_pss_mb': sum(r['pss_mb'] for r in w + mem['master']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--csv', default='data/synthetic_transactions.csv')
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--all-paths', action='store_true', help='keep merchant index and cascade enabled')
+    parser.add_argument('--json', help='also write the results to this path')
+    args = parser.parse_args()
+
+    texts = _texts(os.path.join(ROOT, args.csv))
+    results = []
+    print(f"{'workers':>7}  {'req/s':>8}  {'scaling':>7}  {'worker RSS':>10}  {'worker USS':>10}  "
+          f"{'total RSS':>9}  {'total PSS':>9}")
+    for n in range(1, args.max_workers + 1):
+        res = run(n, args.port, texts, args.seconds, args.startup_timeout, not args.all_paths)
+        results.append(res)
+        if 'error' in res:
+            print(f"{n:>7}  {res['error']}")
+            continue
+        scaling = res['rps'] / results[0]['rps'] if results[0].get('rps') else float('nan')
+        print(f"{n:>7}  {res['rps']:>8.1f}  {scaling:>6.2f}x  {res['worker_rss_mb']:>8.0f}MB  "
+              f"{res['worker_uss_mb']:>8.0f}MB  {res['total_rss_mb']:>7.0f}MB  {res['total_pss_mb']:>7.0f}MB")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
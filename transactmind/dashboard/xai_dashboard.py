@@ -2,15 +2,53 @@ import streamlit as st
 import pandas as pd
 import json
 import os
+import sys
+
+# the aggregates are maintained by the API's prediction log (api/utils/prediction_log.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.utils.config import settings  # noqa: E402
+from api.utils.prediction_log import CONFIDENCE_BINS, load_aggregates  # noqa: E402
+
+LOG_DIR = os.path.join(os.getcwd(), settings.PREDICTION_LOG_DIR)
+
+
+@st.cache_data(ttl=5)
+def aggregates():
+    # a handful of small JSON files, whatever the number of logged predictions
+    return load_aggregates(LOG_DIR, low_keep=settings.LOW_CONFIDENCE_KEEP)
+
 
 st.title('TransactMind XAI Dashboard')
+agg = aggregates()
+
+if not agg['total']:
+    st.info(f'No predictions logged yet in {settings.PREDICTION_LOG_DIR}')
+else:
+    col1, col2, col3 = st.columns(3)
+    col1.metric('Predictions', f"{agg['total']:,}")
+    col2.metric('Low confidence', f"{agg['low_confidence_total']:,}")
+    col3.metric('Categories', len(agg['categories']))
+
+    st.header('Category Distribution')
+    st.bar_chart(pd.Series(agg['categories']).sort_values(ascending=False))
+
+    st.header('Answered By')
+    st.bar_chart(pd.Series(agg['paths']))
+
+    st.header('Confidence')
+    category = st.selectbox('Category', ['all'] + sorted(agg['category_confidence']))
+    bins = agg['confidence_bins'] if category == 'all' else agg['category_confidence'][category]
+    edges = [f'{i / CONFIDENCE_BINS:.2f}' for i in range(CONFIDENCE_BINS)]
+    st.bar_chart(pd.Series(bins, index=edges))
+
+    st.header('Volume per Hour (UTC)')
+    st.line_chart(pd.Series(agg['hourly']).sort_index())
 
-st.header('Category Distribution')
-try:
-    df = pd.read_csv(os.path.join(os.getcwd(), 'data', 'synthetic_transactions.csv'))
-    st.bar_chart(df['category'].value_counts())
-except Exception:
-    st.info('No transaction dataset found at data/synthetic_transactions.csv')
+    st.header(f'Recent Low-Confidence Predictions (< {settings.LOW_CONFIDENCE_THRESHOLD})')
+    low = pd.DataFrame(agg['low_confidence'][::-1])
+    if not low.empty:
+        low['ts'] = pd.to_datetime(low['ts'], unit='s')
+    st.dataframe(low, use_container_width=True)
 
 st.header('SHAP Explanation')
 shap_json = st.file_uploader('Upload SHAP json', type=['json'])
@@ -0,0 +1,22 @@
+"""Multi-worker serving: `gunicorn -c gunicorn_conf.py api.main:app`.
+
+The app is imported and the shareable artifacts are preloaded in the master (see
+`pipeline.preload_shared`), then SERVE_WORKERS uvicorn workers are forked. Each worker builds its own ORT
+sessions on top of the shared, memory-mapped weights with cpu_count // SERVE_WORKERS intra-op threads.
+"""
+import os
+
+from api.utils.config import settings
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = settings.SERVE_WORKERS
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = settings.SERVE_PRELOAD
+# model loading and warmup happen after fork, in the background; readiness is reported by /readyz
+timeout = 120
+
+
+def on_starting(server):
+    if settings.SERVE_PRELOAD:
+        from api.inference import pipeline
+        pipeline.preload_shared()
@@ -1,16 +1,29 @@
+"""Locust front-end for the same traffic model as benchmarks/load_test.py (Zipf merchants, mixed endpoints).
+
+    LOAD_CSV=data/kaggle_raw.csv LOAD_ZIPF=1.1 locust -f locustfile.py --host http://127.0.0.1:8000
+"""
+import os
+
 from locust import HttpUser, task, between
-import random
+
+from benchmarks.load_test import TrafficModel
+
+_csvs = [p for p in os.environ.get('LOAD_CSV', 'data/synthetic_transactions.csv').split(',') if p]
+traffic = TrafficModel(_csvs, zipf=float(os.environ.get('LOAD_ZIPF', '1.1')))
+BATCH_SIZE = int(os.environ.get('LOAD_BATCH_SIZE', '32'))
+
 
 class APITestUser(HttpUser):
     wait_time = between(0.001, 0.005)
 
-    @task
+    @task(17)
     def predict(self):
-        samples = [
-            "Walmart Supercenter 1234",
-            "Netflix subscription",
-            "Unknown POS 9999",
-            "Delta Airlines ticket"
-        ]
-        text = random.choice(samples)
-        self.client.post('/predict', json={'transaction_text': text})
+        self.client.post('/predict', json={'transaction_text': traffic.text()})
+
+    @task(2)
+    def predict_batch(self):
+        self.client.post('/predict/batch', json=[{'transaction_text': traffic.text()} for _ in range(BATCH_SIZE)])
+
+    @task(1)
+    def explain(self):
+        self.client.post('/explain', json={'transaction_text': traffic.text(), 'method': 'linear'})
@@ -0,0 +1,220 @@
+import json
+import threading
+import time
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from api.agents.summary_service import SummaryService
+from api.inference import pipeline
+from api.main import app
+from api.utils.config import settings
+from api.utils.executor import StageExecutor
+
+
+class _Agent:
+    has_llm = True
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def summarize(self, text, category, confidence, rag_exp):
+        self.release.wait(10)
+        self.calls.append(text)
+        return f'LLM: {text} is {category}'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # whatever models are on disk, stubs for the missing ones; loaded before the first request
+    monkeypatch.setattr(settings, 'STARTUP_IN_BACKGROUND', False)
+    monkeypatch.setattr(settings, 'PREDICTION_LOG_ENABLED', False)
+    monkeypatch.setattr(settings, 'MODEL_RELOAD_INTERVAL_S', 0)
+    with TestClient(app) as c:
+        assert c.get('/readyz').status_code == 200
+        yield c
+
+
+def test_batch_keeps_order_reports_row_errors_and_queues_summaries(client, monkeypatch):
+    monkeypatch.setattr(settings, 'BULK_CHUNK_SIZE', 2)
+    agent = _Agent()
+    app.state.summaries.shutdown()
+    # no cache: the stub models give every row the same (category, rationale) key
+    app.state.summaries = SummaryService(agent, workers=2, cache_size=0)
+    items = [{'transaction_text': f'xq payment {i}', 'id': str(i)} for i in range(5)]
+    items[2]['transaction_text'] = '   '
+    resp = client.post('/predict/batch?include_summary=true', json=items)
+    assert resp.status_code == 200
+    results = resp.json()['results']
+    assert [r['row'] for r in results] == list(range(5)) and [r['id'] for r in results] == ['0', '1', '2', '3', '4']
+    assert results[2] == {'row': 2, 'id': '2', 'error': 'missing transaction text'}
+    # the response carries templates; the LLM runs afterwards, off the request
+    assert all(r['agent_summary'].startswith('Predicted') and r['summary_status'] == 'pending'
+               for r in results[:2] + results[3:])
+    agent.release.set()
+    for r in results[:2] + results[3:]:
+        done = client.get(f"/summary/{r['summary_id']}?wait=true").json()
+        assert done['status'] == 'ready' and done['agent_summary'].startswith('LLM: xq payment')
+    assert sorted(agent.calls) == ['xq payment 0', 'xq payment 1', 'xq payment 3', 'xq payment 4']
+
+
+def test_stream_is_one_json_object_per_line(client, monkeypatch):
+    monkeypatch.setattr(settings, 'BULK_CHUNK_SIZE', 2)
+    body = '{"transaction_text": "xq payment 0", "amount": 3}\nnot json\n\n"xq payment 2"\n[1]\n'
+    resp = client.post('/predict/stream', content=body.encode('utf-8'),
+                       headers={'content-type': 'application/x-ndjson'})
+    assert resp.status_code == 200 and resp.headers['content-type'].startswith('application/x-ndjson')
+    assert resp.text.endswith('\n')
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert [r['row'] for r in lines] == [0, 1, 2, 3]
+    assert lines[0]['amount'] == 3 and 'category' in lines[0] and 'category' in lines[2]
+    assert lines[1]['error'] == 'invalid JSON line' and lines[3]['error'] == 'expected a JSON object'
+
+
+def test_saturated_stage_sheds_with_429_and_retry_after(client, monkeypatch):
+    # one bulk call may run and none may wait
+    app.state.executor.shutdown()
+    app.state.executor = StageExecutor(concurrency={'bulk': 1}, max_queue=0, retry_after=2.5)
+    running, release = threading.Event(), threading.Event()
+    classify_chunk = pipeline.classify_chunk
+
+    def blocking_chunk(*args):
+        running.set()
+        release.wait(10)
+        return classify_chunk(*args)
+
+    monkeypatch.setattr(pipeline, 'classify_chunk', blocking_chunk)
+    first = []
+    worker = threading.Thread(target=lambda: first.append(
+        client.post('/predict/batch', json=[{'transaction_text': 'xq payment'}])))
+    worker.start()
+    try:
+        assert running.wait(10)
+        shed = client.post('/predict/batch', json=[{'transaction_text': 'xq payment'}])
+        assert shed.status_code == 429 and shed.headers['Retry-After'] == '3'
+        assert shed.json()['detail'] == "stage 'bulk' is overloaded"
+    finally:
+        release.set()
+        worker.join(10)
+    assert first[0].status_code == 200
+    assert client.post('/predict/batch', json=[{'transaction_text': 'xq payment'}]).status_code == 200
+
+
+def _until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_readyz_waits_for_parallel_loads_and_warmup_while_healthz_answers(monkeypatch):
+    monkeypatch.setattr(settings, 'STARTUP_IN_BACKGROUND', True)
+    monkeypatch.setattr(settings, 'STARTUP_PARALLEL', True)
+    monkeypatch.setattr(settings, 'STARTUP_WAIT_TIMEOUT_S', 0.05)
+    monkeypatch.setattr(settings, 'PREDICTION_LOG_ENABLED', False)
+    monkeypatch.setattr(settings, 'MODEL_RELOAD_INTERVAL_S', 0)
+    loads, warm, warming = threading.Event(), threading.Event(), threading.Event()
+    started = []
+
+    def gated(build):
+        def load():
+            started.append(build)
+            loads.wait(10)
+            return build()
+        return load
+
+    for name, build in list(pipeline.COMPONENT_BUILDERS.items()):
+        monkeypatch.setitem(pipeline.COMPONENT_BUILDERS, name, gated(build))
+    warmup = pipeline.warmup
+
+    def gated_warmup(*args):
+        warming.set()
+        warm.wait(10)
+        return warmup(*args)
+
+    monkeypatch.setattr(pipeline, 'warmup', gated_warmup)
+    try:
+        with TestClient(app) as c:
+            # every loader is running at once, and none has finished
+            _until(lambda: len(started) == len(pipeline.COMPONENT_BUILDERS))
+            health = c.get('/healthz')
+            assert health.status_code == 200 and health.json()['ready'] is False
+            assert {v['state'] for v in health.json()['components'].values()} == {'loading'}
+            assert c.get('/readyz').status_code == 503
+            early = c.post('/predict', json={'transaction_text': 'xq payment'})
+            assert early.status_code == 503 and 'Retry-After' in early.headers
+
+            loads.set()
+            warming.wait(10)
+            # loaded but not warmed up: still not ready
+            readyz = c.get('/readyz')
+            assert readyz.status_code == 503 and 'load' in readyz.json()['startup_phases']
+            assert c.get('/healthz').status_code == 200
+
+            warm.set()
+            _until(lambda: c.get('/readyz').status_code == 200)
+            assert 'warmup' in c.get('/readyz').json()['startup_phases']
+            assert c.post('/predict', json={'transaction_text': 'xq payment'}).status_code == 200
+    finally:
+        loads.set()
+        warm.set()
+
+
+def test_summary_skipped_by_the_budget_is_the_template_without_an_llm_job(client):
+    agent = _Agent()
+    agent.release.set()
+    app.state.summaries.shutdown()
+    app.state.summaries = SummaryService(agent, cache_size=0)
+    skipped = client.post('/predict', json={'transaction_text': 'xq payment', 'detail': 'standard'}).json()
+    assert skipped['agent_summary'].startswith('Predicted') and 'summary_id' not in skipped
+    assert skipped['degraded']['agent_summary'] == 'detail'
+    full = client.post('/predict', json={'transaction_text': 'xq payment', 'detail': 'full'}).json()
+    assert client.get(f"/summary/{full['summary_id']}?wait=true").json()['status'] == 'ready'
+    assert agent.calls == ['xq payment']
+
+
+def test_ws_malformed_options_are_reported_per_message(client):
+    with client.websocket_connect('/ws/predict') as ws:
+        ws.send_text(json.dumps([{'id': 'a', 'transaction_text': 'Shell fuel', 'deadline_ms': 'soon'},
+                                 {'id': 'b', 'transaction_text': 'Shell fuel', 'deadline_ms': [5]},
+                                 {'id': 'c', 'transaction_text': 'Shell fuel', 'deadline_ms': -1},
+                                 {'id': 'd', 'transaction_text': 'Shell fuel', 'detail': ['full']}]))
+        results = {}
+        while len(results) < 4:
+            results.update((r['id'], r) for r in json.loads(ws.receive_text()))
+        assert results['a']['error'] == results['b']['error'] == 'deadline_ms must be a number'
+        assert results['c']['error'] == 'deadline_ms must be positive'
+        assert results['d']['error'].startswith('detail must be one of')
+        # the connection stays usable
+        ws.send_text(json.dumps({'id': 'e', 'transaction_text': 'Shell fuel', 'deadline_ms': '5000'}))
+        assert 'category' in json.loads(ws.receive_text())[0]
+
+
+def test_explain_rejects_an_unknown_method(client):
+    resp = client.post('/explain', json={'transaction_text': 'xq payment', 'method': 'tree'})
+    assert resp.status_code == 422 and resp.json()['detail'] == "method must be 'kernel' or 'linear'"
+    assert client.post('/explain', json={'transaction_text': 'xq payment', 'method': 'linear'}).status_code == 200
+
+
+class _ConfidentStage1:
+    version = 'ngram@test'
+
+    def predict_batch(self, texts):
+        return [('entertainment', 0.99, [0.99]) for _ in texts]
+
+
+def test_cascade_answer_marks_rag_and_shap_degraded(client, monkeypatch):
+    monkeypatch.setitem(pipeline._components, 'stage1', _ConfidentStage1())
+    full = client.post('/predict', json={'transaction_text': 'xq streaming'}).json()
+    assert full['path'] == 'stage1' and full['shap'] is None
+    assert full['degraded'] == {'rag_explanation': 'cascade', 'shap': 'cascade'}
+    # fields the detail level leaves out keep that reason
+    standard = client.post('/predict', json={'transaction_text': 'xq streaming', 'detail': 'standard'}).json()
+    assert standard['degraded'] == {'rag_explanation': 'cascade', 'agent_summary': 'detail', 'shap': 'detail'}
+
+
+def test_timing_breakdown_is_off_by_default(client):
+    resp = client.post('/predict', json={'transaction_text': 'xq payment'}, headers={'X-Debug-Timing': '1'})
+    assert resp.status_code == 200 and 'server-timing' not in resp.headers
@@ -0,0 +1,56 @@
+import asyncio
+from functools import partial
+
+from api.inference.batcher import MicroBatcher
+from api.inference.classifier import StubClassifier
+from api.inference.embedder import StubEmbedder
+from api.inference.pipeline import embed_and_classify
+
+
+class CountingEmbedder(StubEmbedder):
+    def __init__(self):
+        super().__init__(dim=8)
+        self.calls = []
+
+    def embed(self, texts):
+        self.calls.append(len(texts))
+        return super().embed(texts)
+
+
+def test_concurrent_requests_share_one_batch():
+    embedder = CountingEmbedder()
+    classifier = StubClassifier()
+    texts = [f'Netflix subscription {i}' for i in range(10)]
+
+    async def run():
+        batcher = MicroBatcher(partial(embed_and_classify, embedder, classifier), max_batch_size=16, max_wait_ms=50)
+        await batcher.start()
+        try:
+            return await asyncio.gather(*[batcher.submit(t) for t in texts])
+        finally:
+            await batcher.stop()
+
+    results = asyncio.run(run())
+    assert embedder.calls == [10]
+    # every caller gets the answer it would have got from an unbatched call
+    for text, (emb, category, confidence, probs) in zip(texts, results):
+        single = StubEmbedder(dim=8).embed([text])[0]
+        assert list(emb) == single
+        assert (category, confidence, probs) == classifier.predict(single)
+
+
+def test_batches_are_capped_at_max_size():
+    embedder = CountingEmbedder()
+
+    async def run():
+        batcher = MicroBatcher(partial(embed_and_classify, embedder, StubClassifier()),
+                               max_batch_size=4, max_wait_ms=50)
+        await batcher.start()
+        try:
+            await asyncio.gather(*[batcher.submit(str(i)) for i in range(10)])
+        finally:
+            await batcher.stop()
+
+    asyncio.run(run())
+    assert max(embedder.calls) <= 4
+    assert sum(embedder.calls) == 10
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from api.utils.budget import RequestBudget
+from api.utils.executor import StageExecutor
+
+
+def _slow(seconds):
+    time.sleep(seconds)
+    return 'done'
+
+
+def test_detail_level_and_core_overload_skip_optional_stages():
+    minimal = RequestBudget(detail='minimal')
+    assert not minimal.allows('rag') and not minimal.allows('shap')
+    standard = RequestBudget(detail='standard')
+    assert standard.allows('rag') and not standard.allows('agent')
+    assert standard.degraded == {'agent_summary': 'detail'}
+    busy = RequestBudget(core_depth=10, core_limit=10)
+    assert not busy.allows('rag') and busy.degraded == {'rag_explanation': 'overload'}
+
+
+def test_deadline_cuts_short_and_skips_stages_expected_to_overrun():
+    async def run():
+        executor = StageExecutor(concurrency={'rag': 1, 'shap': 1})
+        try:
+            budget = RequestBudget(deadline_ms=50)
+            cut = await budget.run(executor, 'rag', _slow, 0.3, fallback='fallback')
+            assert cut == 'fallback' and budget.degraded == {'rag_explanation': 'timeout'}
+            # the cut-short call still completes and teaches the executor what the stage costs
+            await asyncio.sleep(0.35)
+            assert executor.estimate('rag') >= 0.25
+            skipped = RequestBudget(deadline_ms=100)
+            assert await skipped.run(executor, 'rag', _slow, 0.3) is None
+            assert skipped.degraded == {'rag_explanation': 'deadline'}
+            roomy = RequestBudget(deadline_ms=1000)
+            assert await roomy.run(executor, 'shap', _slow, 0.01) == 'done' and roomy.degraded == {}
+        finally:
+            executor.shutdown()
+
+    asyncio.run(run())
@@ -0,0 +1,46 @@
+import numpy as np
+
+from api.inference.cascade import cascade_classify
+from api.inference.classifier import StubClassifier
+from api.inference.embedder import StubEmbedder
+from api.inference.ngram_features import hashed_ngrams
+
+
+class _FirstStage:
+    version = 'ngram@test'
+
+    def predict_batch(self, texts):
+        return [('entertainment', 0.97, [0.97]) if 'netflix' in t.lower() else ('travel', 0.4, [0.4])
+                for t in texts]
+
+
+class _CountingEmbedder(StubEmbedder):
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def embed(self, texts):
+        self.seen.extend(texts)
+        return super().embed(texts)
+
+
+def test_ngram_features_are_deterministic_and_normalized():
+    a = hashed_ngrams(['Walmart Supercenter 1234', ''], n_features=256)
+    b = hashed_ngrams(['walmart   SUPERCENTER 1234'], n_features=256)
+    assert np.allclose(a[0], b[0])
+    assert abs(np.linalg.norm(a[0]) - 1.0) < 1e-5
+    assert not a[1].any()
+
+
+def test_only_low_confidence_texts_are_embedded():
+    embedder = _CountingEmbedder()
+    out = cascade_classify(_FirstStage(), embedder, StubClassifier(), ['Netflix', 'Delta 123', 'NETFLIX.COM'], 0.9)
+    assert [r[4] for r in out] == ['stage1', 'model', 'stage1']
+    assert embedder.seen == ['Delta 123']
+    assert out[0][0] is None and out[0][1] == 'entertainment' and out[0][5] == 'ngram@test'
+    assert out[1][0] is not None
+
+
+def test_without_first_stage_everything_escalates():
+    out = cascade_classify(None, StubEmbedder(), StubClassifier(), ['a', 'b'], 0.9)
+    assert [r[4] for r in out] == ['model', 'model']
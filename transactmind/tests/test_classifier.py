@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('skl2onnx')
+pytest.importorskip('onnxruntime')
+
+from sklearn.linear_model import LogisticRegression  # noqa: E402
+from sklearn.neural_network import MLPClassifier  # noqa: E402
+
+from api.inference.classifier import ONNXClassifier  # noqa: E402
+from api.utils.config import settings  # noqa: E402
+from training.export_to_onnx import export_classifier  # noqa: E402
+
+
+@pytest.fixture
+def lean_model(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 8)).astype(np.float32)
+    # taxonomy indices 1..3 only: probability columns must map through the `classes` metadata
+    y = np.arange(120) % 3 + 1
+    clf = LogisticRegression(max_iter=300).fit(X, y)
+    path = str(tmp_path / 'model.onnx')
+    export_classifier(clf, 8, path)
+    return clf, path, X
+
+
+def test_lean_export_matches_sklearn(lean_model):
+    clf, path, X = lean_model
+    classifier = ONNXClassifier(path, prefer_quantized=False)
+    assert classifier.output_kind == 'probabilities' and classifier.n_classes == 3
+    assert [o.name for o in classifier.session.get_outputs()] == ['probabilities']
+    preds = classifier.predict_batch(X[:10])
+    expected = clf.predict_proba(X[:10])
+    labels = classifier.taxonomy['labels']
+    assert [p[0] for p in preds] == [labels[int(c)] for c in clf.predict(X[:10])]
+    assert np.allclose([p[2] for p in preds], expected, atol=1e-5)
+    assert np.allclose([p[1] for p in preds], expected.max(axis=1), atol=1e-5)
+
+
+def test_iobinding_buffer_reuse_across_batch_sizes(lean_model, monkeypatch):
+    _, path, X = lean_model
+    bound = ONNXClassifier(path, prefer_quantized=False)
+    monkeypatch.setattr(settings, 'ORT_IO_BINDING', False)
+    plain = [p[2] for p in bound.predict_batch(X[:32])]
+    monkeypatch.setattr(settings, 'ORT_IO_BINDING', True)
+    first = bound.predict_batch(X[:32])
+    for bs in (1, 5, 32, 3):
+        out = bound.predict_batch(X[:bs])
+        assert np.allclose([p[2] for p in out], plain[:bs], atol=1e-6)
+    # results handed out earlier are not overwritten by later calls
+    assert np.allclose([p[2] for p in first], plain, atol=1e-6)
+
+
+def _dense(classifier, X):
+    payloads = classifier.linear_explain_batch(X)
+    return np.array([p['shap_values'] for p in payloads]), np.array(payloads[0]['base_values'])
+
+
+def test_linear_attributions_add_up_to_the_decision_function(lean_model, tmp_path):
+    clf, path, X = lean_model
+    contrib, base = _dense(ONNXClassifier(path, prefer_quantized=False), X[:10])
+    assert contrib.shape == (10, 3, 8)
+    assert np.allclose(contrib.sum(axis=2) + base, clf.decision_function(X[:10]), atol=1e-4)
+
+    # binary: the graph holds a row per class, and the positive class's row is sklearn's single score
+    binary = LogisticRegression(max_iter=300).fit(X, (X[:, 0] > 0).astype(int) + 1)
+    binary_path = str(tmp_path / 'binary' / 'model.onnx')
+    (tmp_path / 'binary').mkdir()
+    export_classifier(binary, 8, binary_path)
+    contrib, base = _dense(ONNXClassifier(binary_path, prefer_quantized=False), X[:10])
+    assert np.allclose(contrib[:, 1].sum(axis=1) + base[1], binary.decision_function(X[:10]), atol=1e-4)
+    assert np.allclose(contrib[:, 0], -contrib[:, 1], atol=1e-6)
+
+
+def test_top_k_keeps_the_largest_contributions_to_the_predicted_class(lean_model):
+    clf, path, X = lean_model
+    classifier = ONNXClassifier(path, prefer_quantized=False)
+    labels = classifier.taxonomy['labels']
+    contrib, _ = _dense(classifier, X[:10])
+    for row, dense, predicted in zip(X[:10], contrib, clf.predict(X[:10])):
+        payload = classifier.shap_explain(row, top_k=3)
+        values = dense[list(clf.classes_).index(predicted)]
+        assert payload['class'] == labels[int(predicted)]
+        assert payload['indices'] == np.argsort(-np.abs(values))[:3].tolist()
+        assert np.allclose(payload['values'], values[payload['indices']], atol=1e-6)
+
+
+def test_non_linear_model_points_to_kernel_explain(lean_model, tmp_path):
+    _, _, X = lean_model
+    mlp = MLPClassifier(hidden_layer_sizes=(4,), max_iter=50, random_state=0).fit(X, np.arange(120) % 3 + 1)
+    path = str(tmp_path / 'mlp.onnx')
+    export_classifier(mlp, 8, path)
+    classifier = ONNXClassifier(path, prefer_quantized=False)
+    assert classifier.coef is None
+    assert 'method=kernel' in classifier.shap_explain(X[0])['error']
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pytest
+
+from api.inference import embedder as embedder_module
+from api.inference.embedder import Embedder
+from api.utils.config import settings
+
+TEXTS = ['Walmart Supercenter 1234', 'Netflix subscription', 'Delta Airlines ticket', 'Shell Fuel Station 567',
+         'POS 4411 Starbucks Store 0921', 'Acme Corp payroll', 'Amazon Mktp US*2K4', 'Con Edison utility bill']
+
+
+class _FakeSentenceTransformer:
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+def _broken(*args, **kwargs):
+    raise RuntimeError('cannot load')
+
+
+def test_auto_falls_back_from_onnx_to_sentence_transformers_then_stub(tmp_path, monkeypatch):
+    onnx_path = tmp_path / 'embedder.onnx'
+    onnx_path.write_bytes(b'not a model')
+    paths = {'onnx_path': str(onnx_path), 'tokenizer_dir': str(tmp_path)}
+    monkeypatch.setattr(embedder_module, '_HAS_ORT', True)
+    monkeypatch.setattr(embedder_module, 'ONNXSentenceEncoder', _broken)
+    monkeypatch.setattr(embedder_module, '_load_sentence_transformer', lambda name: _FakeSentenceTransformer())
+    auto = Embedder(backend='auto', **paths)
+    assert auto.backend == 'sentence-transformers' and not auto.is_stub
+    assert auto.embed(['Netflix']).shape == (1, 4)
+    # an explicit backend never falls back to the other one
+    assert Embedder(backend='onnx', **paths).backend == 'stub'
+    monkeypatch.setattr(embedder_module, '_load_sentence_transformer', _broken)
+    assert Embedder(backend='auto', **paths).is_stub
+
+
+@pytest.mark.skipif(not (os.path.exists(settings.EMBEDDER_ONNX_PATH)
+                         and os.path.isdir(settings.EMBEDDER_TOKENIZER_DIR)),
+                    reason='exported embedder missing (training/export_to_onnx.export_embedder)')
+@pytest.mark.parametrize('quantized', [False, True])
+def test_onnx_encoder_matches_sentence_transformers(quantized):
+    # the automated form of benchmarks/embedder_parity.py's cosine check
+    pytest.importorskip('sentence_transformers')
+    pytest.importorskip('tokenizers')
+    pytest.importorskip('onnxruntime')
+    if quantized and not os.path.exists(settings.EMBEDDER_ONNX_PATH.replace('.onnx', '.quant.onnx')):
+        pytest.skip('no int8 embedder')
+    reference = Embedder(settings.EMBEDDER_MODEL_NAME, backend='sentence-transformers')
+    onnx = Embedder(settings.EMBEDDER_MODEL_NAME, backend='onnx', onnx_path=settings.EMBEDDER_ONNX_PATH,
+                    tokenizer_dir=settings.EMBEDDER_TOKENIZER_DIR, prefer_quantized=quantized)
+    if reference.is_stub:
+        pytest.skip('sentence-transformers model unavailable')
+    assert onnx.backend == ('onnx-int8' if quantized else 'onnx')
+    a = np.asarray(reference.embed(TEXTS), dtype=np.float32)
+    b = np.asarray(onnx.embed(TEXTS), dtype=np.float32)
+    cosine = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    assert cosine.min() >= (0.98 if quantized else 0.999)
@@ -0,0 +1,70 @@
+import numpy as np
+
+from api.inference.embedder import Embedder
+from api.inference.embedding_cache import CachedEmbedder
+
+
+class HashEmbedder:
+    model_name = 'test-model'
+
+    def __init__(self):
+        self.seen = []
+
+    def embed(self, texts):
+        self.seen.extend(texts)
+        return np.stack([np.full(4, len(t), dtype=np.float32) for t in texts])
+
+
+def test_lru_hits_skip_the_model_and_key_on_preprocessed_text():
+    inner = HashEmbedder()
+    cache = CachedEmbedder(inner, max_entries=10)
+    first = cache.embed(['Netflix subscription', 'Walmart'])
+    again = cache.embed(['  Netflix   subscription ', 'Walmart'])
+    assert inner.seen == ['Netflix subscription', 'Walmart']
+    np.testing.assert_array_equal(first, again)
+
+
+def test_duplicates_in_one_batch_are_embedded_once():
+    inner = HashEmbedder()
+    out = CachedEmbedder(inner).embed(['a', 'bb', 'a'])
+    assert inner.seen == ['a', 'bb']
+    np.testing.assert_array_equal(out[0], out[2])
+
+
+def test_lru_is_bounded():
+    cache = CachedEmbedder(HashEmbedder(), max_entries=2)
+    cache.embed(['a', 'b', 'c'])
+    assert len(cache._lru) == 2
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    CachedEmbedder(HashEmbedder(), disk_dir=str(tmp_path), disk_capacity=64).embed(['Delta Airlines ticket'])
+    inner = HashEmbedder()
+    restarted = CachedEmbedder(inner, disk_dir=str(tmp_path), disk_capacity=64)
+    out = restarted.embed(['Delta Airlines ticket'])
+    assert inner.seen == []
+    np.testing.assert_array_equal(out[0], np.full(4, len('Delta Airlines ticket'), dtype=np.float32))
+
+
+class _FailsOnce:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('encoder unavailable')
+        return np.stack([np.full(4, len(t), dtype=np.float32) for t in texts])
+
+
+def test_stub_fallback_vectors_are_not_cached(tmp_path):
+    embedder = Embedder(backend='none')
+    embedder.model = _FailsOnce()
+    cache = CachedEmbedder(embedder, disk_dir=str(tmp_path), disk_capacity=64)
+    fallback = cache.embed(['Delta Airlines ticket'])
+    # the stub's vector is served, but neither tier keeps it nor is the disk table sized from it
+    assert fallback.shape == (1, 384)
+    assert len(cache._lru) == 0 and cache.disk is None
+    out = cache.embed(['Delta Airlines ticket'])
+    np.testing.assert_array_equal(out[0], np.full(4, len('Delta Airlines ticket'), dtype=np.float32))
+    assert embedder.model.calls == 2 and cache.disk.dim == 4
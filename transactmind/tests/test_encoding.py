@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+import pytest
+
+from api.utils.encoding import encode, negotiate, parse_fields, shape
+
+
+def _result():
+    shap = {'method': 'linear', 'base_values': [0.25, -0.5], 'shap_values': [[0.123456, -0.5], [1e-7, 2.0]]}
+    return {'category': 'food', 'confidence': 0.9, 'shap': shap, 'path': 'model'}
+
+
+def test_fields_and_precision():
+    assert parse_fields('category, confidence') == {'category', 'confidence'}
+    assert parse_fields(None) is None
+    with pytest.raises(ValueError):
+        parse_fields(['category', 'nope'])
+    assert shape(_result(), parse_fields(['category'])) == {'category': 'food'}
+    rounded = shape(_result(), precision=2)['shap']
+    assert rounded['shap_values'] == [[0.12, -0.5], [0.0, 2.0]]
+    assert _result()['shap']['shap_values'][0][0] == 0.123456
+
+
+def test_encodings_round_trip():
+    msgpack = pytest.importorskip('msgpack')
+    result = _result()
+    assert json.loads(encode(result)) == result
+    assert negotiate('application/msgpack, */*') == 'msgpack' and negotiate('application/json') == 'json'
+    assert msgpack.unpackb(encode(result, 'msgpack')) == result
+    raw = msgpack.unpackb(encode(result, 'msgpack', raw_floats=True))['shap']['shap_values']
+    values = np.frombuffer(raw['data'], raw['dtype']).reshape(raw['shape'])
+    assert np.allclose(values, result['shap']['shap_values'])
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from training.embedding_pipeline import extract_features, iter_labelled_chunks
+from training.feature_cache import FeatureCache
+
+
+def test_feature_cache_lookup_and_gather(tmp_path):
+    cache = FeatureCache(str(tmp_path), 'm@onnx', 2)
+    keys = cache.keys_for(['a', 'b', 'c'])
+    assert cache.lookup(keys).tolist() == [-1, -1, -1]
+    rows = cache.append(keys, np.arange(6, dtype=np.float32).reshape(3, 2))
+    assert rows.tolist() == [0, 1, 2]
+
+    reopened = FeatureCache(str(tmp_path), 'm@onnx', 2)
+    found = reopened.lookup(cache.keys_for(['c', 'zz', 'a']))
+    assert found.tolist() == [2, -1, 0]
+    assert reopened.gather([2, 0]).tolist() == [[4, 5], [0, 1]]
+
+
+def test_appends_merge_keys_and_pick_up_other_writers(tmp_path, monkeypatch):
+    ours, theirs = FeatureCache(str(tmp_path), 'm', 1), FeatureCache(str(tmp_path), 'm', 1)
+    ours.append(ours.keys_for(['b', 'a']), [[0], [1]])
+    theirs.append(theirs.keys_for(['c']), [[2]])
+    reads = []
+    real_fromfile = np.fromfile
+    monkeypatch.setattr(np, 'fromfile', lambda *a, **k: reads.append(k.get('count')) or real_fromfile(*a, **k))
+    # only the row the other writer added is read back, not the whole key file
+    assert ours.append(ours.keys_for(['d', 'a']), [[3], [4]]).tolist() == [3, 4]
+    assert reads == [1]
+    # the earlier row wins for a duplicated key, as in a fresh load
+    assert ours.lookup(ours.keys_for(['a', 'b', 'c', 'd', 'x'])).tolist() == [1, 0, 2, 3, -1]
+    fresh = FeatureCache(str(tmp_path), 'm', 1)
+    assert fresh.lookup(fresh.keys_for(['a', 'c', 'd'])).tolist() == [1, 2, 3] and len(fresh) == 5
+
+
+class _Model:
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += len(texts)
+        return np.array([[float('fuel' in t), float('film' in t), 1.0] for t in texts])
+
+
+class _Embedder:
+    model_name, backend, is_stub = 'fake', 'test', False
+
+    def __init__(self):
+        self.model = _Model()
+
+
+def test_extract_features_only_encodes_new_rows(tmp_path):
+    csv_path = tmp_path / 'train.csv'
+    csv_path.write_text('text,category\n' + ''.join(f'fuel {i},fuel\nfilm {i},entertainment\n' for i in range(20))
+                        + 'no label,\n')
+    labels = ['fuel', 'entertainment']
+    embedder = _Embedder()
+
+    cache, rows, ys, keys, stats = extract_features(
+        iter_labelled_chunks([str(csv_path)], labels, chunk_rows=7), embedder, cache_dir=str(tmp_path / 'c'),
+        workers=1, batch_size=4)
+    assert stats['rows'] == 40 and stats['encoded'] == 40 and len(keys) == 40
+    assert ys.tolist()[:2] == [0, 1]
+    assert np.allclose(cache.gather(rows[:2]), [[1, 0, 1], [0, 1, 1]])
+
+    extra = (['fuel 0', 'film 99'], [0, 1])
+    _, rows2, _, _, stats2 = extract_features(
+        iter_labelled_chunks([str(csv_path), extra], labels, chunk_rows=16), embedder,
+        cache_dir=str(tmp_path / 'c'), workers=1)
+    assert stats2['encoded'] == 1 and stats2['cache_hits'] == 41
+    assert rows2[:40].tolist() == rows.tolist()
+
+
+@pytest.mark.parametrize('solver', ['lbfgs', 'sgd'])
+def test_fit_classifier_solvers(tmp_path, solver):
+    pytest.importorskip('skl2onnx')
+    from training.export_to_onnx import fit_classifier
+    cache = FeatureCache(str(tmp_path), 'm', 3)
+    texts = [f'{w} {i}' for i in range(30) for w in ('fuel', 'film')]
+    rows = cache.append(cache.keys_for(texts), _Model().encode(texts))
+    ys = np.array([0, 1] * 30)
+    clf, used = fit_classifier(cache, rows, ys, solver=solver, chunk_rows=8, epochs=3)
+    assert used == solver
+    assert (clf.predict(cache.gather(rows)) == ys).mean() == 1.0
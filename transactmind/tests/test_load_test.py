@@ -0,0 +1,33 @@
+from collections import Counter
+
+from benchmarks.load_test import TrafficModel, Workload, parse_mix, saturation
+
+
+def test_zipf_traffic_concentrates_on_head_merchants(tmp_path):
+    path = tmp_path / 'tx.csv'
+    path.write_text('transaction\n' + ''.join(f'Merchant{i} Store\n' for i in range(50)))
+    traffic = TrafficModel([str(path)], zipf=1.2, variant_rate=0.0, long_rate=0.0)
+    counts = Counter(traffic.text() for _ in range(5000))
+    assert len(traffic.merchants) == 50
+    head = traffic.merchants[0][0]
+    assert counts.most_common(1)[0][0] == head and counts[head] > 5000 * 0.15
+
+
+def test_workload_mix_and_batch_sizes():
+    workload = Workload(TrafficModel(), parse_mix('predict=0.5,batch=0.5'), batch_sizes=(3, 5))
+    kinds = Counter()
+    for _ in range(400):
+        kind, path, body, items = workload.next()
+        kinds[kind] += 1
+        if kind == 'batch':
+            assert path == '/predict/batch' and 3 <= len(body) == items <= 5
+    assert set(kinds) == {'predict', 'batch'} and min(kinds.values()) > 100
+
+
+def test_saturation_stops_at_slo_or_flat_throughput():
+    def step(c, rps, p99, err=0.0):
+        return {'concurrency': c, 'rps': rps, 'p99_ms': p99, 'error_rate': err}
+    steps = [step(1, 100, 20), step(2, 190, 25), step(4, 195, 40), step(8, 205, 300)]
+    assert saturation(steps, slo_p99_ms=250, max_error_rate=0.01, min_gain=0.05)['concurrency'] == 2
+    assert saturation(steps, slo_p99_ms=250, max_error_rate=0.01, min_gain=0.0)['concurrency'] == 4
+    assert saturation([step(1, 100, 500)], 250, 0.01, 0.05) is None
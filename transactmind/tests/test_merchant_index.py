@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+from api.inference.merchant_index import MerchantIndexHandle, build_merchant_index, normalize_merchant
+
+
+def _sources(tmp_path):
+    taxonomy = tmp_path / 'taxonomy.json'
+    taxonomy.write_text(json.dumps({
+        'labels': ['groceries', 'entertainment', 'shopping', 'subscriptions', 'travel'],
+        'examples': [
+            {'text': 'Walmart Supercenter 1234', 'category': 'groceries'},
+            {'text': 'Netflix subscription', 'category': 'entertainment'},
+            {'text': 'Amazon', 'category': 'shopping'},
+            {'text': 'Amazon #55', 'category': 'groceries'},
+        ]}))
+    feedback = tmp_path / 'feedback.csv'
+    feedback.write_text('timestamp,text,predicted,correct,notes\n'
+                        '1,Netflix subscription,entertainment,subscriptions,\n')
+    return str(taxonomy), str(feedback)
+
+
+def test_normalize_strips_store_numbers_and_pos_noise():
+    assert normalize_merchant('POS PURCHASE Walmart Supercenter #1234 03/14') == 'walmart supercenter'
+    assert normalize_merchant('SQ *Blue Bottle Coffee 0042') == 'blue bottle coffee'
+    # POS noise after the merchant goes too
+    assert normalize_merchant('Shell Fuel Station 567 card xxxx9876') == 'shell fuel station'
+    assert normalize_merchant('Con Edison utility bill debit card') == 'con edison utility bill'
+
+
+def test_exact_and_prefix_lookup(tmp_path):
+    index = build_merchant_index(*_sources(tmp_path))
+    assert index.lookup('DEBIT walmart supercenter store 77')['category'] == 'groceries'
+    hit = index.lookup('Walmart Supercenter grocery run')
+    assert hit['merchant'] == 'walmart supercenter'
+    assert index.lookup('Target') is None
+
+
+def test_feedback_overrides_and_conflicts_are_dropped(tmp_path):
+    index = build_merchant_index(*_sources(tmp_path))
+    hit = index.lookup('Netflix subscription')
+    assert hit['category'] == 'subscriptions' and hit['source'] == 'feedback'
+    # 'amazon' maps to two categories in the taxonomy: ambiguous, left to the models
+    assert index.lookup('Amazon') is None
+
+
+def test_rows_outside_the_taxonomy_are_dropped(tmp_path, caplog):
+    taxonomy, feedback = _sources(tmp_path)
+    with open(feedback, 'a') as f:
+        f.write('2,Walmart Supercenter,groceries,grocery,\n')
+    merchants = tmp_path / 'merchants.csv'
+    merchants.write_text('merchant,category\nDelta Airlines,travel\nUber Eats,food delivery\n')
+    with caplog.at_level('WARNING', logger='transactmind'):
+        index = build_merchant_index(taxonomy, feedback, [str(merchants)])
+    assert index.lookup('Delta Airlines')['category'] == 'travel'
+    assert index.lookup('Uber Eats') is None
+    # the misspelled correction does not override the taxonomy's answer
+    assert index.lookup('Walmart Supercenter')['category'] == 'groceries'
+    assert 'dropped 1 merchants rows' in caplog.text and 'dropped 1 feedback rows' in caplog.text
+
+
+def test_handle_reloads_when_sources_change(tmp_path):
+    taxonomy, feedback = _sources(tmp_path)
+    handle = MerchantIndexHandle(taxonomy, feedback, index_path=str(tmp_path / 'index.json'))
+    assert handle.lookup('Delta Airlines') is None
+    before = handle.index.version
+    with open(feedback, 'a') as f:
+        f.write('2,Delta Airlines 0091,other,travel,\n')
+    later = time.time() + 5
+    os.utime(feedback, (later, later))
+    assert handle.reload() == len(handle)
+    hit = handle.lookup('Delta Airlines')
+    assert hit['category'] == 'travel'
+    # answers name the index build that produced them
+    assert hit['version'].startswith('merchant_index@') and hit['version'] != before
+    assert os.path.exists(tmp_path / 'index.json')
@@ -0,0 +1,111 @@
+import csv
+import json
+
+import numpy as np
+import pytest
+
+from training.feature_store import FeatureStore
+
+
+def test_feature_store_latest_label_wins(tmp_path):
+    store = FeatureStore(str(tmp_path / 'fs'))
+    store.append(np.eye(3, dtype=np.float32), [0, 1, 2], ['a', 'b', 'c'], source='train')
+    store.append(np.full((1, 3), 5, dtype=np.float32), [2], ['a'], source='feedback', feedback_offset=1)
+
+    reopened = FeatureStore(str(tmp_path / 'fs'))
+    X, rows, y, sources = reopened.load()
+    assert reopened.meta['feedback_offset'] == 1
+    assert rows.tolist() == [1, 2, 3] and y.tolist() == [1, 2, 2] and sources == ['train', 'train', 'feedback']
+    # the store itself is mapped, not copied; live rows are gathered on demand
+    assert isinstance(X, np.memmap) and X.shape == (4, 3)
+    assert np.allclose(reopened.gather(rows[-1:]), 5)
+    with pytest.raises(ValueError):
+        reopened.append(np.zeros((1, 4)), [0], ['d'], source='feedback')
+
+
+class _Embedder:
+    is_stub = False
+
+    def embed(self, texts):
+        # one axis per leading keyword, so the classes are linearly separable
+        return np.array([[float(t.startswith('fuel')), float(t.startswith('film')), 1.0] for t in texts],
+                        dtype=np.float32)
+
+
+def test_update_publishes_version_and_pipeline_swaps(tmp_path, monkeypatch):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('skl2onnx')
+    pytest.importorskip('onnxruntime')
+    from api.inference import pipeline
+    from api.utils.config import settings
+    from training import online_update
+
+    taxonomy = tmp_path / 'taxonomy.json'
+    taxonomy.write_text(json.dumps({'labels': ['fuel', 'entertainment']}))
+    feedback = tmp_path / 'feedback.csv'
+    with open(feedback, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['text', 'correct'])
+        writer.writeheader()
+        writer.writerows([{'text': f'fuel stop {i}', 'correct': 'fuel'} for i in range(5)]
+                         + [{'text': f'film night {i}', 'correct': 'entertainment'} for i in range(5)]
+                         + [{'text': 'unknown label', 'correct': 'nope'}])
+    pointer = str(tmp_path / 'current.json')
+    kwargs = dict(feedback_path=str(feedback), store_dir=str(tmp_path / 'fs'), versions_dir=str(tmp_path / 'v'),
+                  pointer_path=pointer, taxonomy_path=str(taxonomy), embedder=_Embedder())
+
+    result = online_update.update(**kwargs)
+    assert result['status'] == 'updated' and result['version'] == 'v0001'
+    assert result['new_rows'] == 10 and result['skipped'] == 1
+    # no deployed model to continue from: fit from scratch over the store
+    assert result['mode'] == 'full' and result['trained_rows'] == 10
+    assert online_update.read_pointer(pointer)['version'] == 'v0001'
+    # nothing new in the feedback file: no new version
+    assert online_update.update(**kwargs)['status'] == 'no new feedback'
+
+    # later feedback continues v0001 on the new rows plus a replay sample, not the whole store
+    monkeypatch.setattr(settings, 'ONLINE_REPLAY_ROWS', 4)
+    with open(feedback, 'a', newline='') as f:
+        csv.writer(f).writerows([[f'fuel again {i}', 'fuel'] for i in range(3)])
+    result = online_update.update(**kwargs)
+    assert result['version'] == 'v0002' and result['parent'] == 'v0001'
+    assert result['mode'] == 'incremental' and result['new_rows'] == 3 and result['trained_rows'] == 7
+    assert result['rows'] == 13
+    assert online_update.update(force=True, **kwargs)['version'] == 'v0003'
+
+    monkeypatch.setattr(settings, 'MODEL_POINTER_PATH', pointer)
+    monkeypatch.setattr(pipeline, '_components', {'classifier': object()})
+    assert pipeline.maybe_reload_classifier(force=True) == 'v0003'
+    assert pipeline.current_model_version() == 'v0003'
+    # unchanged pointer: the loaded classifier is kept
+    assert pipeline.maybe_reload_classifier(force=False) is None
+
+
+def test_logistic_regression_parent_keeps_its_probabilities(tmp_path):
+    pytest.importorskip('skl2onnx')
+    pytest.importorskip('onnxruntime')
+    import joblib
+    from sklearn.linear_model import LogisticRegression
+
+    from training import online_update
+    from training.export_to_onnx import export_classifier
+
+    taxonomy = tmp_path / 'taxonomy.json'
+    taxonomy.write_text(json.dumps({'labels': ['fuel', 'entertainment', 'travel']}))
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(90, 3)).astype(np.float32) + np.repeat(np.eye(3, dtype=np.float32) * 2, 30, axis=0)
+    y = np.repeat([0, 1, 2], 30)
+    store = FeatureStore(str(tmp_path / 'fs'))
+    store.append(X, y.tolist(), [f'row {i}' for i in range(90)], source='train')
+    # the deployed base model: multinomial lbfgs over the same rows
+    base = LogisticRegression(max_iter=300).fit(X, y)
+    export_classifier(base, 3, str(tmp_path / 'model.onnx'))
+    pointer = str(tmp_path / 'current.json')
+    online_update.write_pointer('base', str(tmp_path / 'model.onnx'), pointer)
+
+    result = online_update.update(feedback_path=str(tmp_path / 'feedback.csv'), store_dir=str(tmp_path / 'fs'),
+                                  versions_dir=str(tmp_path / 'v'), pointer_path=pointer,
+                                  taxonomy_path=str(taxonomy), embedder=_Embedder(), force=True)
+    assert result['mode'] == 'incremental' and result['learner'] == 'LogisticRegression'
+    updated = joblib.load(online_update.read_pointer(pointer)['model_path'] + '.pkl')
+    # no feedback: the continuation stays where the deployed model was
+    assert np.abs(updated.predict_proba(X) - base.predict_proba(X)).max() < 0.01
@@ -0,0 +1,76 @@
+import glob
+import json
+import os
+import time
+
+import pytest
+
+from api.utils import prediction_log
+from api.utils.prediction_log import PredictionLogger, load_aggregates
+
+
+def _record(i, category='fuel', confidence=0.9):
+    return {'ts': 1700000000.0 + i, 'text': f'txn {i}', 'category': category, 'confidence': confidence,
+            'path': 'model', 'model_version': 'base', 'latency_ms': 1.5}
+
+
+def test_logger_writes_rotated_files_and_aggregates(tmp_path):
+    log = PredictionLogger(str(tmp_path), rotate_rows=3, low_threshold=0.5, low_keep=2)
+    for i in range(4):
+        log.log(_record(i))
+    log.flush()
+    for i in range(4, 7):
+        log.log(_record(i, 'travel', 0.3))
+    log.flush()
+    log.stop()
+
+    # the first batch fills a file past rotate_rows, so the second starts a new one
+    assert len(glob.glob(str(tmp_path / 'predictions-*'))) == 2
+    agg = load_aggregates(str(tmp_path))
+    assert agg['total'] == 7 and agg['categories'] == {'fuel': 4, 'travel': 3}
+    assert agg['low_confidence_total'] == 3 and [r['text'] for r in agg['low_confidence']] == ['txn 5', 'txn 6']
+    assert sum(agg['confidence_bins']) == 7 and agg['category_confidence']['travel'][6] == 3
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    log = PredictionLogger(str(tmp_path), max_queue=2)
+    for i in range(5):
+        log.log(_record(i))
+    assert log.flush() == 2
+
+
+def test_exited_process_aggregates_are_compacted(tmp_path, monkeypatch):
+    other = prediction_log.update_aggregates(prediction_log.empty_aggregates(), [_record(0, 'rent')], 0.5, 10)
+    with open(tmp_path / 'aggregates-999999.json', 'w') as f:
+        json.dump(other, f)
+    monkeypatch.setattr(prediction_log, '_pid_alive', lambda pid: False)
+
+    log = PredictionLogger(str(tmp_path))
+    log.start()
+    log.log(_record(1))
+    log.stop()
+    assert not os.path.exists(tmp_path / 'aggregates-999999.json')
+    assert load_aggregates(str(tmp_path))['categories'] == {'rent': 1, 'fuel': 1}
+
+
+def test_closed_files_are_readable_while_the_writer_runs(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    log = PredictionLogger(str(tmp_path), flush_interval_s=0.02, rotate_interval_s=0.05)
+    log.start()
+    try:
+        for i in range(3):
+            log.log(_record(i))
+        deadline = time.time() + 5
+        while not glob.glob(str(tmp_path / 'predictions-*.parquet')) and time.time() < deadline:
+            time.sleep(0.02)
+        # rotated on time with no further traffic: complete, footer written, readable by any process
+        done = glob.glob(str(tmp_path / 'predictions-*.parquet'))
+        assert len(done) == 1 and pq.read_table(done[0]).num_rows == 3
+        log.log(_record(3))
+        while len(glob.glob(str(tmp_path / 'predictions-*'))) < 2 and time.time() < deadline:
+            time.sleep(0.02)
+        assert log._thread.is_alive()
+    finally:
+        log.stop()
+    assert sorted(pq.read_table(p).num_rows for p in glob.glob(str(tmp_path / 'predictions-*.parquet'))) == [1, 3]
+    assert not glob.glob(str(tmp_path / '*.part'))
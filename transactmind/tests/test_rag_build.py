@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+
+from api.rag.build_rag_db import build_index
+from api.rag.rag_engine import RAGEngine
+from api.rag.vector_index import VectorIndex
+
+
+class HashEmbedder:
+    """Deterministic per-text vectors that count what was embedded."""
+
+    model_name, backend, is_stub = 'hash', 'test', True
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return [np.random.default_rng(sum(map(ord, t))).normal(size=8).astype(np.float32) for t in texts]
+
+
+def _taxonomy(path, examples):
+    path.write_text(json.dumps({'labels': ['food', 'travel'],
+                                'examples': [{'text': t, 'category': c} for t, c in examples]}))
+
+
+def test_incremental_generations_reembed_only_new_texts(tmp_path):
+    taxonomy, index_dir = tmp_path / 'taxonomy.json', str(tmp_path / 'index')
+    _taxonomy(taxonomy, [('Pizza Hut', 'food'), ('Delta Air', 'travel'), ('Subway', 'food')])
+    embedder = HashEmbedder()
+    _, _, first = build_index(str(taxonomy), index_dir, embedder=embedder)
+    assert first['generation'] == 1 and first['added'] == 3
+    engine = RAGEngine(persist_dir=str(tmp_path / 'chroma'), index_dir=index_dir, reload_interval_s=0)
+    assert engine.index.generation == 1
+
+    # unchanged rerun: no new generation, nothing embedded
+    embedder.embedded.clear()
+    _, _, same = build_index(str(taxonomy), index_dir, embedder=embedder)
+    assert same['generation'] == 1 and same['unchanged'] == 3 and embedder.embedded == []
+
+    feedback = tmp_path / 'feedback.csv'
+    feedback.write_text('text,predicted,correct\nSubway,food,travel\nUnited Airlines,food,travel\n')
+    _taxonomy(taxonomy, [('Pizza Hut', 'food'), ('Delta Air', 'travel'), ('Subway', 'food')])
+    _, _, second = build_index(str(taxonomy), index_dir, embedder=embedder, feedback_path=str(feedback))
+    assert (second['generation'], second['added'], second['updated']) == (2, 1, 1)
+    assert embedder.embedded[-1] == 'United Airlines'
+
+    index = VectorIndex.load(index_dir)
+    assert index.generation == 2 and dict(zip(index.texts, index.categories))['Subway'] == 'travel'
+    # carried-over vectors are identical to freshly embedded ones
+    fresh = HashEmbedder().embed(['Pizza Hut'])[0]
+    row = index.texts.index('Pizza Hut')
+    assert np.allclose(index.vectors[row], fresh / np.linalg.norm(fresh), atol=1e-6)
+    assert engine.reload() == 2 and len(engine.index) == 4
+
+
+def test_index_only_engine_without_usable_embedding_gives_the_stub_rationale(tmp_path):
+    taxonomy, index_dir = tmp_path / 'taxonomy.json', str(tmp_path / 'index')
+    _taxonomy(taxonomy, [('Pizza Hut', 'food'), ('Delta Air', 'travel')])
+    embedder = HashEmbedder()
+    build_index(str(taxonomy), index_dir, embedder=embedder)
+    engine = RAGEngine(persist_dir=None, index_dir=index_dir, reload_interval_s=0)
+    assert engine.collection is None
+    assert engine.explain('Pizza Hut', 'food', embedding=embedder.embed(['Pizza Hut'])[0]).startswith('Example:')
+    for embedding in (None, np.ones(3, dtype=np.float32)):
+        assert engine.explain('Pizza Hut', 'food', embedding=embedding).startswith('(stub)')
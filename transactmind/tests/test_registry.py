@@ -0,0 +1,110 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from api.inference.registry import ModelLoadError, ModelRegistry, UnknownModelError
+from api.utils.config import settings
+
+
+class _Embedder:
+    is_stub = False
+
+    def __init__(self, dim=3):
+        self.dim = dim
+        self.calls = 0
+
+    def embed(self, texts):
+        self.calls += 1
+        return np.array([[float(t.startswith('fuel')), float(t.startswith('film'))] + [1.0] * (self.dim - 2)
+                         for t in texts], dtype=np.float32)
+
+
+def _export(directory, labels, n_features=3, meta=None):
+    from sklearn.linear_model import LogisticRegression
+    from training.export_to_onnx import export_classifier
+    os.makedirs(directory, exist_ok=True)
+    X = np.array([[1, 0, 1], [0, 1, 1]] * 4, dtype=np.float32)[:, :n_features]
+    clf = LogisticRegression().fit(X, [0, 1] * 4)
+    export_classifier(clf, n_features, os.path.join(directory, 'model.onnx'))
+    with open(os.path.join(directory, 'taxonomy.json'), 'w', encoding='utf-8') as f:
+        json.dump({'labels': labels}, f)
+    if meta is not None:
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+
+def test_lazy_load_lru_eviction_and_shared_embedder(tmp_path, monkeypatch):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('skl2onnx')
+    pytest.importorskip('onnxruntime')
+    monkeypatch.setattr(settings, 'MODEL_VERSIONS_DIR', str(tmp_path / 'none'))
+    root = tmp_path / 'registry'
+    _export(str(root / 'retail'), ['fuel', 'entertainment'])
+    _export(str(root / 'business'), ['travel', 'software'])
+    _export(str(root / 'business' / 'versions' / 'v0002'), ['travel', 'software'])
+    _export(str(root / 'wide'), ['a', 'b'], n_features=2, meta={'embedder': 'narrow-encoder'})
+    shared = {'embedder': _Embedder(), 'rag': 'default-rag'}
+    built = []
+
+    def build_embedder(name):
+        built.append(name)
+        return _Embedder(dim=2)
+
+    size = sum(os.path.getsize(os.path.join(root, 'retail', f)) for f in os.listdir(root / 'retail'))
+    registry = ModelRegistry(str(root), budget_bytes=int(size * 2.5), shared=lambda: shared,
+                             embedder_bytes=1, build_embedder=build_embedder)
+    assert registry.available() == {'default': [], 'business': ['v0002'], 'retail': [], 'wide': []}
+    assert registry.get() is shared and registry.describe()['loaded'] == []
+
+    retail = registry.get('retail')
+    assert retail['embedder'] is shared['embedder'] and retail['classifier'].version == 'base'
+    assert retail['classifier'].predict_batch(retail['embedder'].embed(['film club']))[0][0] == 'entertainment'
+    # no exemplar index of its own: stub rationales, not the default taxonomy's examples
+    assert type(retail['rag']).__name__ == 'StubRAG'
+    assert registry.get('retail')['classifier'] is retail['classifier']
+
+    business = registry.get('business', 'v0002')
+    assert business['classifier'].predict_batch(business['embedder'].embed(['fuel card']))[0][0] == 'travel'
+    registry.get('retail')
+    # a third model goes over budget: the least recently used one (business v0002) is dropped
+    registry.get('business')
+    loaded = [(e['model'], e['version']) for e in registry.describe()['loaded']]
+    assert loaded == [('retail', None), ('business', None)]
+    assert registry.bytes <= registry.budget_bytes
+
+    # a model trained on another encoder gets its own, cached like a model
+    wide = registry.get('wide')
+    assert built == ['narrow-encoder'] and wide['embedder'] is not shared['embedder']
+    registry.get('wide')
+    assert built == ['narrow-encoder']
+
+    with pytest.raises(UnknownModelError):
+        registry.get('missing')
+    with pytest.raises(UnknownModelError):
+        registry.get('retail', '../business')
+
+
+def test_feature_size_mismatch_is_a_load_error(tmp_path, monkeypatch):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('skl2onnx')
+    pytest.importorskip('onnxruntime')
+    _export(str(tmp_path / 'narrow'), ['a', 'b'], n_features=2)
+    registry = ModelRegistry(str(tmp_path), budget_bytes=1 << 30, shared=lambda: {'embedder': _Embedder()})
+    for _ in range(2):
+        with pytest.raises(ModelLoadError):
+            registry.get('narrow')
+    assert registry.describe()['loaded'] == [] and registry._loading == {}
+
+
+def test_stub_serving_embedder_is_a_load_error(tmp_path):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('skl2onnx')
+    _export(str(tmp_path / 'retail'), ['fuel', 'entertainment'])
+    stub = _Embedder()
+    stub.is_stub = True
+    registry = ModelRegistry(str(tmp_path), budget_bytes=1 << 30, shared=lambda: {'embedder': stub})
+    with pytest.raises(ModelLoadError):
+        registry.get('retail')
+    assert stub.calls == 0 and registry.describe()['loaded'] == []
@@ -0,0 +1,63 @@
+import json
+import os
+
+from api.inference import pipeline
+from api.inference.sessions import fingerprint
+from api.utils.config import settings
+from training.select_variants import select
+
+
+def _result(emb, clf, acc, agree, ms):
+    return {'embedder': emb, 'classifier': clf, 'accuracy': acc, 'agreement': agree, 'latency_ms': {'8': ms}}
+
+
+def test_select_fastest_within_tolerance():
+    results = [_result('fp32', 'fp32', 0.90, 1.0, 10.0), _result('fp32', 'int8', 0.899, 0.99, 8.0),
+               _result('int8', 'fp32', 0.80, 0.85, 3.0), _result('int8', 'int8', 0.897, 0.99, 6.0)]
+    assert select(results, tolerance=0.005, min_agreement=0.98, batch_size=8)['embedder'] == 'int8'
+    # tighter tolerance leaves only the fp32 embedder
+    chosen = select(results, tolerance=0.002, min_agreement=0.98, batch_size=8)
+    assert (chosen['embedder'], chosen['classifier']) == ('fp32', 'int8')
+
+
+def test_manifest_drives_prefer_quantized_until_artifacts_change(tmp_path, monkeypatch):
+    model = tmp_path / 'model.onnx'
+    model.write_bytes(b'fp32')
+    manifest = tmp_path / 'variants.json'
+    manifest.write_text(json.dumps({
+        'selected': {'classifier': 'fp32', 'embedder': 'int8'},
+        'artifacts': {'classifier': {'path': str(model), 'fp32': fingerprint(str(model))},
+                      'embedder': {'path': str(tmp_path / 'missing.onnx')}}}))
+    monkeypatch.setattr(settings, 'VARIANT_MANIFEST_PATH', str(manifest))
+    monkeypatch.setattr(pipeline, '_manifest', None)
+    assert pipeline.prefer_quantized('classifier', str(model)) is False
+    assert pipeline.prefer_quantized('embedder') is True
+
+    # a re-exported classifier was never measured: fp32
+    model.write_bytes(b're-exported fp32')
+    monkeypatch.setattr(pipeline, '_manifest', None)
+    assert pipeline.prefer_quantized('classifier', str(model)) is False
+
+
+def test_classifier_choice_is_per_model_file_and_reread(tmp_path, monkeypatch):
+    base, version = tmp_path / 'model.onnx', tmp_path / 'v0001' / 'model.onnx'
+    version.parent.mkdir()
+    for path in (base, version, tmp_path / 'model.quant.onnx', tmp_path / 'v0001' / 'model.quant.onnx'):
+        path.write_bytes(b'onnx')
+    manifest = tmp_path / 'variants.json'
+
+    def write(entries):
+        manifest.write_text(json.dumps({'classifiers': {
+            str(p): {'selected': 'int8', 'fp32': fingerprint(str(p)),
+                     'int8': fingerprint(str(p).replace('.onnx', '.quant.onnx'))} for p in entries}}))
+
+    write([base])
+    monkeypatch.setattr(settings, 'VARIANT_MANIFEST_PATH', str(manifest))
+    monkeypatch.setattr(pipeline, '_manifest', None)
+    assert pipeline.prefer_quantized('classifier', str(base)) is True
+    # a hot-swapped version nobody evaluated is served fp32
+    assert pipeline.prefer_quantized('classifier', str(version)) is False
+    # evaluating it updates the manifest, which the running process picks up without a restart
+    write([base, version])
+    os.utime(manifest, ns=(os.stat(manifest).st_mtime_ns + 10 ** 9,) * 2)
+    assert pipeline.prefer_quantized('classifier', str(version)) is True
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+
+from onnx import TensorProto, helper, numpy_helper  # noqa: E402
+
+from api.inference import sessions  # noqa: E402
+
+
+def _matmul_model(path, weights):
+    graph = helper.make_graph(
+        [helper.make_node('MatMul', ['x', 'W'], ['y'])], 'g',
+        [helper.make_tensor_value_info('x', TensorProto.FLOAT, [None, weights.shape[0]])],
+        [helper.make_tensor_value_info('y', TensorProto.FLOAT, [None, weights.shape[1]])],
+        [numpy_helper.from_array(weights, 'W')])
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid('', 14)]), path)
+
+
+def test_externalized_weights_are_mapped_and_shared(tmp_path):
+    path = str(tmp_path / 'm.onnx')
+    weights = np.random.default_rng(0).normal(size=(64, 32)).astype(np.float32)
+    _matmul_model(path, weights)
+    sessions.externalize_weights(path)
+    sessions.externalize_weights(path)  # idempotent: the data file is rewritten, not appended to
+    assert os.path.getsize(sessions.weights_path(path)) == weights.nbytes
+
+    x = np.ones((2, 64), dtype=np.float32)
+    first = sessions.create_session(path, intra=1)
+    second = sessions.create_session(path, intra=1)
+    assert np.allclose(first.run(None, {'x': x})[0], x @ weights, atol=1e-4)
+    assert np.allclose(second.run(None, {'x': x})[0], x @ weights, atol=1e-4)
+    assert path in sessions._SHARED and set(sessions._SHARED[path][1]) == {'W'}
+
+
+def test_models_without_weights_file_load_normally(tmp_path):
+    path = str(tmp_path / 'plain.onnx')
+    weights = np.eye(4, dtype=np.float32)
+    _matmul_model(path, weights)
+    sess = sessions.create_session(path)
+    assert sess.get_session_options().inter_op_num_threads == 1
+    assert np.allclose(sess.run(None, {'x': np.ones((1, 4), np.float32)})[0], 1.0)
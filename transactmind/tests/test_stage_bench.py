@@ -0,0 +1,41 @@
+from benchmarks.stage_bench import compare, run_suite
+
+
+def _report(p50, implementation='ONNXClassifier', fallback=False):
+    return {'results': {'real/classify_fp32/bs8': {'p50_ms': p50, 'implementation': implementation,
+                                                   'fallback': fallback}}}
+
+
+def test_compare_flags_only_real_slowdowns():
+    base = _report(10.0)
+    assert compare(_report(12.0), base) == []
+    assert [r['key'] for r in compare(_report(20.0), base)] == ['real/classify_fp32/bs8']
+    # tiny absolute deltas are noise even when the ratio is large
+    assert compare(_report(0.3), _report(0.1)) == []
+    # a stub timing is never compared against the real model
+    assert compare(_report(20.0, 'StubClassifier', True), base) == []
+
+
+def test_stub_suite_times_every_stage():
+    report = run_suite(backends=('stub',), batch_sizes=(1, 4), repeats=2)
+    keys = report['results']
+    assert 'stub/agent/bs1' in keys and 'stub/agent/bs4' not in keys
+    assert all('p50_ms' in r for r in keys.values())
+    assert keys['stub/end_to_end/bs4']['per_item_ms'] >= 0
+
+
+def test_real_suite_loads_only_what_its_stages_need(monkeypatch):
+    from api.inference import pipeline
+    from api.inference.embedder import StubEmbedder
+    from api.rag.rag_engine import StubRAG
+    built = []
+    for name, build in list(pipeline.COMPONENT_BUILDERS.items()):
+        monkeypatch.setitem(pipeline.COMPONENT_BUILDERS, name,
+                            lambda name=name, build=build: built.append(name) or build())
+    report = run_suite(backends=('real',), batch_sizes=(1,), repeats=1, stages=('embed', 'classify_fp32'))
+    assert built == ['embedder'] and set(report['results']) == {'real/embed/bs1', 'real/classify_fp32/bs1'}
+    # a running server's components are reused rather than loaded again
+    built.clear()
+    run_suite(backends=('real',), batch_sizes=(1,), repeats=1, stages=('rag', 'end_to_end'),
+              shared={'embedder': StubEmbedder(), 'rag': StubRAG()})
+    assert built == []
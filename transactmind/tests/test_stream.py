@@ -0,0 +1,68 @@
+import asyncio
+
+from api.utils.stream import PipelinedConnection
+
+
+def test_pipelined_results_are_tagged_bounded_and_out_of_order():
+    async def run():
+        frames = asyncio.Queue()
+        for frame in ([{'id': 'slow', 'delay': 0.05}, {'id': 'fast', 'delay': 0.0}],
+                      *[{'id': i, 'delay': 0.01} for i in range(20)], {'delay': 0.0}):
+            frames.put_nowait(frame)
+        sent, active, peak = [], [0], [0]
+
+        async def receive():
+            if frames.empty() and len(sent) >= 23:
+                return None
+            if frames.empty():
+                await asyncio.sleep(0.01)
+                return []
+            return frames.get_nowait()
+
+        async def handle(message):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(message['delay'])
+            active[0] -= 1
+            return {'ok': True}
+
+        async def send(results):
+            sent.extend(results)
+
+        await PipelinedConnection(receive, send, handle, max_inflight=4).run()
+        return sent, peak[0]
+
+    sent, peak = asyncio.run(run())
+    ids = [r['id'] for r in sent]
+    assert sorted(map(str, ids)) == sorted(map(str, ['slow', 'fast', *range(20), 22]))
+    assert ids.index('fast') < ids.index('slow')
+    # the message without an id is tagged with its position in the stream
+    assert 22 in ids
+    assert peak <= 4
+
+
+def test_malformed_frames_and_handler_errors_do_not_close_the_stream():
+    async def run():
+        frames = [ValueError('bad json'), {'id': 1}, None]
+        sent = []
+
+        async def receive():
+            frame = frames.pop(0)
+            if isinstance(frame, Exception):
+                raise frame
+            if frame is None:
+                await asyncio.sleep(0.05)
+            return frame
+
+        async def handle(message):
+            raise RuntimeError('boom')
+
+        async def send(results):
+            sent.extend(results)
+
+        await PipelinedConnection(receive, send, handle).run()
+        return sent
+
+    sent = asyncio.run(run())
+    assert sent[0]['id'] is None and 'malformed' in sent[0]['error']
+    assert sent[1] == {'id': 1, 'error': 'internal error'}
@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+from api.agents.summary_service import SummaryService, template_summary
+
+
+class _Agent:
+    has_llm = True
+
+    def __init__(self, seconds=0.0):
+        self.seconds = seconds
+        self.calls = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def summarize(self, text, category, confidence, rag_exp):
+        with self._lock:
+            self.calls.append(text)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.active -= 1
+        return f'LLM: {text}'
+
+
+def test_jobs_run_on_the_pool_and_finished_summaries_are_cached():
+    agent = _Agent(seconds=0.1)
+    service = SummaryService(agent, workers=2, deadline_s=5.0)
+
+    async def run():
+        jobs = [service.submit(f'shop {i}', 'shopping', 0.5 + 0.2 * i, f'rag {i}') for i in range(2)]
+        # submit returns at once with the template; the LLM answers arrive later
+        assert [j['status'] for j in jobs] == ['pending', 'pending']
+        assert jobs[0]['summary'] == template_summary('shopping', 0.5, 'rag 0')
+        done = [await service.wait(j['id']) for j in jobs]
+        assert [d['status'] for d in done] == ['ready', 'ready'] and done[1]['summary'] == 'LLM: shop 1'
+        # same category, confidence bucket and rationale: answered from the cache without the agent
+        again = service.submit('shop 0 again', 'shopping', 0.52, 'rag 0')
+        assert again['status'] == 'ready' and again['summary'] == 'LLM: shop 0'
+
+    try:
+        asyncio.run(run())
+    finally:
+        service.shutdown()
+    assert agent.peak == 2 and sorted(agent.calls) == ['shop 0', 'shop 1']
+
+
+def test_past_the_deadline_the_template_stays():
+    agent = _Agent(seconds=0.3)
+    service = SummaryService(agent, workers=1, deadline_s=0.1)
+
+    async def run():
+        slow = service.submit('first', 'travel', 0.9, 'rag')
+        queued = service.submit('second', 'travel', 0.3, 'rag')
+        timed_out = await service.wait(slow['id'])
+        assert timed_out['status'] == 'timeout' and timed_out['summary'] == template_summary('travel', 0.9, 'rag')
+        await asyncio.sleep(0.4)
+        # the queued job reached a worker after its deadline and was dropped without an LLM call
+        assert service.get(queued['id'])['status'] == 'expired'
+        assert service.get(queued['id'])['summary'] == template_summary('travel', 0.3, 'rag')
+
+    try:
+        asyncio.run(run())
+    finally:
+        service.shutdown()
+    assert agent.calls == ['first']
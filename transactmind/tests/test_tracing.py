@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from api.utils import tracing
+from api.utils.executor import StageExecutor
+
+
+def _slow(stage):
+    with tracing.timed(stage):
+        time.sleep(0.002)
+    return stage
+
+
+async def _app(scope, receive, send):
+    with tracing.timed('handler'):
+        time.sleep(0.001)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+def _call(middleware, headers):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware({'type': 'http', 'headers': headers}, None, send))
+    return dict(sent[0]['headers'])
+
+
+def test_breakdown_only_for_requests_with_debug_header():
+    middleware = tracing.TimingMiddleware(_app, header='X-Debug-Timing')
+    assert b'server-timing' not in _call(middleware, [])
+    value = _call(middleware, [(b'x-debug-timing', b'1')])[b'server-timing'].decode()
+    assert value.startswith('handler;dur=') and 'total;dur=' in value
+
+
+def test_executor_threads_report_into_the_callers_breakdown():
+    async def run():
+        executor = StageExecutor(concurrency={'embed': 1})
+        timings = {}
+        token = tracing._timings.set(timings)
+        try:
+            await executor.run('embed', _slow, 'embed')
+        finally:
+            tracing._timings.reset(token)
+            executor.shutdown()
+        return timings
+
+    timings = asyncio.run(run())
+    assert timings['embed'] >= 0.002 and 'queue_embed' in timings
+
+
+def test_timed_overhead_is_microseconds():
+    n = 20000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with tracing.timed('overhead'):
+            pass
+    assert (time.perf_counter() - t0) / n < 50e-6
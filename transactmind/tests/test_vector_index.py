@@ -0,0 +1,46 @@
+import numpy as np
+
+from api.rag.vector_index import VectorIndex
+
+
+def _catalog(n=200, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    categories = [['groceries', 'travel', 'utilities'][i % 3] for i in range(n)]
+    texts = [f'merchant {i}' for i in range(n)]
+    return vectors, texts, categories
+
+
+def _brute_force(index, query, k, category=None):
+    q = query / np.linalg.norm(query)
+    scores = index.vectors @ q
+    rows = [i for i in range(len(index)) if category is None or index.categories[i] == category]
+    return sorted(rows, key=lambda i: -scores[i])[:k]
+
+
+def test_exact_search_matches_brute_force_for_batched_queries():
+    vectors, texts, categories = _catalog()
+    index = VectorIndex(vectors, texts, categories)
+    queries = np.random.default_rng(1).normal(size=(5, 16)).astype(np.float32)
+    for q, hits in zip(queries, index.search(queries, k=4)):
+        assert [r for r, _ in hits] == _brute_force(index, q, 4)
+
+
+def test_category_filter_only_returns_that_category():
+    vectors, texts, categories = _catalog()
+    index = VectorIndex(vectors, texts, categories)
+    queries = np.random.default_rng(2).normal(size=(3, 16)).astype(np.float32)
+    cats = ['travel', 'groceries', 'unknown']
+    hits = index.search(queries, k=5, categories=cats)
+    assert [r for r, _ in hits[0]] == _brute_force(index, queries[0], 5, 'travel')
+    assert all(index.categories[r] == 'groceries' for r, _ in hits[1])
+    assert hits[2] == []
+
+
+def test_ivf_with_all_lists_probed_is_exact(tmp_path):
+    vectors, texts, categories = _catalog()
+    VectorIndex(vectors, texts, categories).save(str(tmp_path))
+    index = VectorIndex.load(str(tmp_path), mode='ivf', nlist=8, nprobe=8)
+    query = np.random.default_rng(3).normal(size=16).astype(np.float32)
+    hits = index.search(query, k=3)[0]
+    assert [r for r, _ in hits] == _brute_force(index, query, 3)
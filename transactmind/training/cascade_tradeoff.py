@@ -0,0 +1,89 @@
+"""Accuracy / latency trade-off of the cascade threshold on a labelled CSV (text,category).
+
+Both stages are run on every row once, timed per row, and each threshold is then simulated: rows at or
+above it are answered by the first stage, the rest pay for stage 1 plus MiniLM + ONNXClassifier.
+
+    python training/cascade_tradeoff.py --csv data/synthetic_transactions.csv --thresholds 0.5,0.7,0.8,0.9,0.95
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.inference import pipeline  # noqa: E402
+
+
+def _load_rows(csv_path):
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        return [(r.get('text') or r.get('transaction'), r['category']) for r in csv.DictReader(f)
+                if (r.get('text') or r.get('transaction')) and r.get('category')]
+
+
+def _timed_per_row(fn, texts):
+    out, seconds = [], []
+    for text in texts:
+        t0 = time.perf_counter()
+        out.append(fn([text])[0])
+        seconds.append(time.perf_counter() - t0)
+    return out, seconds
+
+
+def tradeoff(rows, stage1, embedder, classifier, thresholds):
+    texts = [t for t, _ in rows]
+    truth = [c for _, c in rows]
+    first, t1 = _timed_per_row(stage1.predict_batch, texts)
+    full, t2 = _timed_per_row(lambda batch: classifier.predict_batch(embedder.embed(batch)), texts)
+    n = len(rows)
+    report = {'rows': n,
+              'stage1_only': {'accuracy': sum(p[0] == y for p, y in zip(first, truth)) / n,
+                              'mean_ms': 1000 * sum(t1) / n},
+              'model_only': {'accuracy': sum(p[0] == y for p, y in zip(full, truth)) / n,
+                             'mean_ms': 1000 * sum(t2) / n},
+              'thresholds': []}
+    for threshold in thresholds:
+        correct = seconds = answered = 0
+        for i in range(n):
+            seconds += t1[i]
+            if first[i][1] >= threshold:
+                answered += 1
+                correct += first[i][0] == truth[i]
+            else:
+                seconds += t2[i]
+                correct += full[i][0] == truth[i]
+        report['thresholds'].append({'threshold': threshold, 'stage1_share': answered / n,
+                                     'accuracy': correct / n, 'mean_ms': 1000 * seconds / n})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='data/synthetic_transactions.csv')
+    parser.add_argument('--thresholds', default='0.5,0.6,0.7,0.8,0.9,0.95,0.99')
+    parser.add_argument('--json', help='also write the report to this path')
+    args = parser.parse_args()
+
+    stage1 = pipeline.COMPONENT_BUILDERS['stage1']()
+    if stage1 is None:
+        sys.exit('no first-stage model: run training/export_to_onnx.py first')
+    embedder = pipeline.COMPONENT_BUILDERS['embedder']()
+    classifier = pipeline.COMPONENT_BUILDERS['classifier']()
+    report = tradeoff(_load_rows(args.csv), stage1, embedder, classifier,
+                      [float(t) for t in args.thresholds.split(',')])
+
+    print(f"rows {report['rows']}  stage1 only: acc {report['stage1_only']['accuracy']:.3f} "
+          f"{report['stage1_only']['mean_ms']:.2f}ms  model only: acc {report['model_only']['accuracy']:.3f} "
+          f"{report['model_only']['mean_ms']:.2f}ms")
+    print(f"{'threshold':>9}  {'stage1':>7}  {'accuracy':>8}  {'mean ms':>8}")
+    for row in report['thresholds']:
+        print(f"{row['threshold']:>9.2f}  {row['stage1_share']:>7.1%}  {row['accuracy']:>8.3f}  {row['mean_ms']:>8.2f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Streaming, parallel embedding extraction for training.
+
+Labelled CSVs are read `chunk_rows` at a time; each chunk's texts are looked up in the FeatureCache and
+only unseen ones are encoded, split into batches across a process pool (one embedder per process, with
+the cores divided between them). The result of a run is a row-number column into the cache plus the
+labels, so nothing the size of the dataset times the embedding width is ever held in memory.
+"""
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from api.inference.preprocess import preprocess_text
+from api.utils.config import settings
+
+try:
+    import resource
+except Exception:
+    # Windows: peak memory is reported as None
+    resource = None
+
+_worker_embedder = None
+
+
+def build_embedder():
+    """The serving embedder configuration, without the serving cache (the feature cache replaces it)."""
+    from api.inference.embedder import Embedder
+    return Embedder(settings.EMBEDDER_MODEL_NAME, backend=settings.EMBEDDER_BACKEND,
+                    onnx_path=settings.EMBEDDER_ONNX_PATH, tokenizer_dir=settings.EMBEDDER_TOKENIZER_DIR,
+                    prefer_quantized=settings.EMBEDDER_PREFER_QUANTIZED)
+
+
+def encode(embedder, texts):
+    # straight to the model: Embedder.embed falls back to stub vectors on error, which must never be cached
+    return np.asarray(embedder.model.encode(texts, show_progress_bar=False, convert_to_numpy=True),
+                      dtype=np.float32)
+
+
+def _init_worker(threads, backend):
+    global _worker_embedder
+    settings.ORT_INTRA_OP_THREADS = threads
+    _worker_embedder = build_embedder()
+    if _worker_embedder.backend != backend:
+        raise RuntimeError(f'worker loaded the {_worker_embedder.backend} embedder, expected {backend}')
+
+
+def _encode(texts):
+    return encode(_worker_embedder, texts)
+
+
+def peak_rss_mb():
+    """(this process, largest finished child) peak resident set size in MB."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is KB on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+
+def iter_labelled_chunks(sources, labels, chunk_rows, text_col='text', label_col='category'):
+    """(texts, label ids) chunks from in-memory (texts, ys) pairs and CSV paths, in order.
+
+    CSV rows without a text or with a category outside `labels` are skipped.
+    """
+    index = {label: i for i, label in enumerate(labels)}
+    for source in sources:
+        if not isinstance(source, str):
+            texts, ys = source
+            for start in range(0, len(texts), chunk_rows):
+                end = start + chunk_rows
+                yield list(texts[start:end]), np.asarray(ys[start:end], dtype=np.int64)
+            continue
+        texts, ys = [], []
+        with open(source, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.DictReader(f):
+                text, label = row.get(text_col), index.get((row.get(label_col) or '').strip())
+                if not text or label is None:
+                    continue
+                texts.append(text)
+                ys.append(label)
+                if len(texts) == chunk_rows:
+                    yield texts, np.asarray(ys, dtype=np.int64)
+                    texts, ys = [], []
+        if texts:
+            yield texts, np.asarray(ys, dtype=np.int64)
+
+
+def extract_features(chunks, embedder, cache_dir=None, workers=None, batch_size=None):
+    """Encode every chunk through the feature cache.
+
+    Returns (cache, rows, ys, keys, stats): `rows` are cache row numbers in dataset order and `keys` the
+    feature-store key of each row.
+    `workers` defaults to TRAIN_WORKERS (0 = one per core); 1 encodes in this process.
+    """
+    from training.feature_cache import FeatureCache
+    from training.feature_store import text_key
+
+    if getattr(embedder, 'is_stub', False):
+        raise RuntimeError('no embedding model available (stub embedder); export or download the encoder first')
+    cache_dir = cache_dir or settings.FEATURE_CACHE_DIR
+    workers = workers if workers is not None else settings.TRAIN_WORKERS
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or settings.TRAIN_ENCODE_BATCH
+    model_name = f'{embedder.model_name}@{embedder.backend}'
+    dim = int(encode(embedder, ['dimension probe']).shape[1])
+    cache = FeatureCache(cache_dir, model_name, dim)
+
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(max(1, (os.cpu_count() or 1) // workers), embedder.backend))
+    rows, ys, keys = [], [], []
+    stats = {'rows': 0, 'cache_hits': 0, 'encoded': 0, 'encode_seconds': 0.0, 'workers': workers,
+             'model': model_name, 'dim': dim}
+    t0 = time.perf_counter()
+    try:
+        for texts, labels in chunks:
+            # embed what serving embeds: the preprocessed text
+            texts = [preprocess_text(t) for t in texts]
+            chunk_keys = cache.keys_for(texts)
+            found = cache.lookup(chunk_keys)
+            stats['cache_hits'] += int(np.sum(found >= 0))
+            missing = {}
+            for i in np.flatnonzero(found < 0):
+                missing.setdefault(int(chunk_keys[i]), texts[i])
+            if missing:
+                todo = list(missing.values())
+                batches = [todo[s:s + batch_size] for s in range(0, len(todo), batch_size)]
+                t1 = time.perf_counter()
+                if pool is not None:
+                    encoded = list(pool.map(_encode, batches))
+                else:
+                    encoded = [encode(embedder, b) for b in batches]
+                stats['encode_seconds'] += time.perf_counter() - t1
+                cache.append(np.fromiter(missing.keys(), dtype=np.uint64, count=len(missing)), np.vstack(encoded))
+                found = cache.lookup(chunk_keys)
+            stats['rows'] += len(texts)
+            stats['encoded'] += len(missing)
+            rows.append(found)
+            ys.append(labels)
+            keys.extend(text_key(t) for t in texts)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    stats['wall_seconds'] = time.perf_counter() - t0
+    stats['encode_rows_per_s'] = stats['encoded'] / stats['encode_seconds'] if stats['encode_seconds'] else None
+    stats['peak_rss_mb'], stats['peak_rss_worker_mb'] = peak_rss_mb()
+    empty = np.zeros(0, dtype=np.int64)
+    return cache, np.concatenate(rows) if rows else empty, np.concatenate(ys) if ys else empty, keys, stats
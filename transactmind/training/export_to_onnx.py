@@ -1,13 +1,21 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from sklearn.linear_model import LogisticRegression
 import joblib
 from skl2onnx import convert_sklearn
 from skl2onnx.common.data_types import FloatTensorType
+from onnx import helper as onnx_helper
+import argparse
 import json
 import os
+import sys
+import time
 from onnxruntime.quantization import quantize_dynamic, QuantType
 
+# the first-stage features live in the API package so training and serving hash identically
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.inference.ngram_features import N_FEATURES, NGRAM_RANGE, hashed_ngrams  # noqa: E402
+from api.inference.sessions import externalize_weights  # noqa: E402
+
 
 def generate_dummy_data(taxonomy_path='api/models/taxonomy.json', n_per_label=50):
     with open(taxonomy_path, 'r', encoding='utf-8') as f:
@@ -22,14 +30,19 @@ def generate_dummy_data(taxonomy_path='api/models/taxonomy.json', n_per_label=50
     return texts, np.array(ys)
 
 
-def train_and_export(model_out='api/models/model.onnx', taxonomy_path='api/models/taxonomy.json'):
-    texts, ys = generate_dummy_data(taxonomy_path)
-    embedder = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
-    X = embedder.encode(texts, convert_to_numpy=True, show_progress_bar=True)
-    clf = LogisticRegression(max_iter=200)
-    clf.fit(X, ys)
-    initial_type = [('float_input', FloatTensorType([None, X.shape[1]]))]
-    onx = convert_sklearn(clf, initial_types=initial_type)
+def export_classifier(clf, n_features, model_out, fuse_argmax=False):
+    """Write the ONNX graph, the sklearn pickle and a dynamically quantized copy for `clf`.
+
+    The graph is lean: no ZipMap, and only a float `probabilities` tensor (plus the class `label` computed
+    in-graph when `fuse_argmax`). The class of each probability column is stored in the `classes` metadata.
+    """
+    from skl2onnx.helpers.onnx_helper import select_model_inputs_outputs
+    initial_type = [('float_input', FloatTensorType([None, n_features]))]
+    onx = convert_sklearn(clf, initial_types=initial_type, options={id(clf): {'zipmap': False}})
+    if not fuse_argmax:
+        # drop the label branch (ArgMax + ArrayFeatureExtractor + casts) the API never reads
+        onx = select_model_inputs_outputs(onx, outputs=['probabilities'])
+    onnx_helper.set_model_props(onx, {'classes': json.dumps([int(c) for c in clf.classes_])})
     with open(model_out, 'wb') as f:
         f.write(onx.SerializeToString())
     joblib.dump(clf, model_out + '.pkl')
@@ -41,6 +54,161 @@ def train_and_export(model_out='api/models/model.onnx', taxonomy_path='api/model
     except Exception as e:
         print('Quantization failed:', e)
 
+
+def fit_classifier(cache, rows, ys, solver='auto', chunk_rows=None, epochs=None):
+    """Fit on the cached features of `rows`.
+
+    'lbfgs' gathers the matrix and fits LogisticRegression in memory; 'sgd' streams shuffled chunks from the
+    memmap into SGDClassifier(log_loss).partial_fit, so memory stays at one chunk. 'auto' picks lbfgs while
+    the features fit in TRAIN_MEMORY_BUDGET_MB.
+    """
+    from sklearn.linear_model import SGDClassifier
+    from api.utils.config import settings
+    chunk_rows = chunk_rows or settings.TRAIN_CHUNK_ROWS
+    epochs = epochs or settings.TRAIN_SGD_EPOCHS
+    if solver == 'auto':
+        solver = 'lbfgs' if len(rows) * cache.dim * 4 <= settings.TRAIN_MEMORY_BUDGET_MB * 2 ** 20 else 'sgd'
+    if solver == 'lbfgs':
+        clf = LogisticRegression(max_iter=200)
+        clf.fit(cache.gather(rows), ys)
+        return clf, solver
+    classes = np.unique(ys)
+    clf = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=0)
+    rng = np.random.default_rng(0)
+    for _ in range(epochs):
+        perm = rng.permutation(len(rows))
+        for start in range(0, len(perm), chunk_rows):
+            idx = perm[start:start + chunk_rows]
+            clf.partial_fit(cache.gather(rows[idx]), ys[idx], classes=classes)
+    return clf, solver
+
+
+def train_and_export(model_out='api/models/model.onnx', taxonomy_path='api/models/taxonomy.json',
+                     feature_store_dir='data/feature_store', csv_paths=(), cache_dir=None, workers=None,
+                     chunk_rows=None, solver='auto'):
+    """Stream the dummy set plus labelled `csv_paths` (text,category) through the feature cache, fit, export.
+
+    Returns the run report: rows, cache hits, encode throughput, peak memory and fit time.
+    """
+    from api.utils.config import settings
+    from training.embedding_pipeline import build_embedder, extract_features, iter_labelled_chunks, peak_rss_mb
+    from training.feature_store import FeatureStore
+
+    chunk_rows = chunk_rows or settings.TRAIN_CHUNK_ROWS
+    with open(taxonomy_path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)['labels']
+    chunks = iter_labelled_chunks([generate_dummy_data(taxonomy_path), *csv_paths], labels, chunk_rows)
+    cache, rows, ys, keys, report = extract_features(chunks, build_embedder(), cache_dir=cache_dir,
+                                                     workers=workers)
+    t0 = time.perf_counter()
+    clf, report['solver'] = fit_classifier(cache, rows, ys, solver=solver, chunk_rows=chunk_rows)
+    report['fit_seconds'] = time.perf_counter() - t0
+    export_classifier(clf, cache.dim, model_out)
+    if feature_store_dir:
+        # seed the store online_update.py warm-starts from, so feedback updates don't forget the base set
+        store = FeatureStore(feature_store_dir, dim=cache.dim)
+        if not len(store):
+            for start in range(0, len(rows), chunk_rows):
+                end = start + chunk_rows
+                store.append(cache.gather(rows[start:end]), ys[start:end], keys[start:end], source='train')
+    report['peak_rss_mb'], report['peak_rss_worker_mb'] = peak_rss_mb()
+    print('Training run:', json.dumps(report, indent=2))
+    return report
+
+
+def load_labelled_texts(taxonomy_path='api/models/taxonomy.json', csv_path='data/synthetic_transactions.csv'):
+    """Dummy texts plus the taxonomy examples and, when present, a labelled text,category CSV."""
+    import csv
+    texts, ys = generate_dummy_data(taxonomy_path)
+    texts, ys = list(texts), list(ys)
+    with open(taxonomy_path, 'r', encoding='utf-8') as f:
+        tax = json.load(f)
+    labels = tax['labels']
+    rows = [(ex['text'], ex['category']) for ex in tax.get('examples', [])]
+    if csv_path and os.path.exists(csv_path):
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+            rows.extend((r['text'], r['category']) for r in csv.DictReader(f) if r.get('text'))
+    for text, category in rows:
+        if category in labels:
+            texts.append(text)
+            ys.append(labels.index(category))
+    return texts, np.array(ys), labels
+
+
+def train_stage1(model_out='api/models/stage1.onnx', taxonomy_path='api/models/taxonomy.json',
+                 csv_path='data/synthetic_transactions.csv'):
+    """First-stage cascade model: LogisticRegression on hashed character n-grams, exported without ZipMap."""
+    texts, ys, labels = load_labelled_texts(taxonomy_path, csv_path)
+    X = hashed_ngrams(texts)
+    clf = LogisticRegression(max_iter=500, C=10.0)
+    clf.fit(X, ys)
+    initial_type = [('ngram_input', FloatTensorType([None, N_FEATURES]))]
+    onx = convert_sklearn(clf, initial_types=initial_type, options={id(clf): {'zipmap': False}})
+    with open(model_out, 'wb') as f:
+        f.write(onx.SerializeToString())
+    # classes_ may be a subset of the taxonomy when a label has no training rows
+    with open(model_out.replace('.onnx', '.json'), 'w', encoding='utf-8') as f:
+        json.dump({'labels': [labels[int(c)] for c in clf.classes_], 'n_features': N_FEATURES,
+                   'ngram_range': list(NGRAM_RANGE)}, f, indent=2)
+    print('Exported first-stage ONNX to', model_out)
+
+
+def export_embedder(model_out='api/models/embedder.onnx', tokenizer_dir='api/models/embedder_tokenizer',
+                    model_name='sentence-transformers/all-MiniLM-L6-v2'):
+    """Export MiniLM with mean pooling + L2 normalization to ONNX, plus a dynamic int8 copy.
+
+    The serving Embedder runs these with onnxruntime and a fast tokenizer, so torch stays out of the API.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    encoder = AutoModel.from_pretrained(model_name).eval()
+
+    class MeanPooledEncoder(torch.nn.Module):
+        def __init__(self, encoder):
+            super().__init__()
+            self.encoder = encoder
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            tokens = self.encoder(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids)[0]
+            mask = attention_mask.unsqueeze(-1).to(tokens.dtype)
+            pooled = (tokens * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            return torch.nn.functional.normalize(pooled, p=2, dim=1)
+
+    dummy = tokenizer(['Walmart Supercenter 1234', 'Netflix subscription'], padding=True, return_tensors='pt')
+    inputs = (dummy['input_ids'], dummy['attention_mask'], dummy['token_type_ids'])
+    dynamic = {'batch': 0, 'seq': 1}
+    torch.onnx.export(MeanPooledEncoder(encoder), inputs, model_out, opset_version=14,
+                      input_names=['input_ids', 'attention_mask', 'token_type_ids'],
+                      output_names=['sentence_embedding'],
+                      dynamic_axes={'input_ids': dynamic, 'attention_mask': dynamic, 'token_type_ids': dynamic,
+                                    'sentence_embedding': {0: 'batch'}})
+    # writes tokenizer.json, which the serving side loads with the `tokenizers` library
+    tokenizer.save_pretrained(tokenizer_dir)
+    print('Exported embedder ONNX to', model_out)
+    quant_out = model_out.replace('.onnx', '.quant.onnx')
+    try:
+        quantize_dynamic(model_out, quant_out, weight_type=QuantType.QInt8)
+        print('Quantized embedder written to', quant_out)
+    except Exception as e:
+        print('Embedder quantization failed:', e)
+    # large initializers go to <model>.weights, which serving workers memory-map and share
+    for path in (model_out, quant_out):
+        if os.path.exists(path):
+            externalize_weights(path)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', action='append', default=[], help='labelled text,category CSV (repeatable)')
+    parser.add_argument('--workers', type=int, default=None, help='encoder processes (default TRAIN_WORKERS)')
+    parser.add_argument('--chunk-rows', type=int, default=None)
+    parser.add_argument('--solver', choices=('auto', 'lbfgs', 'sgd'), default='auto')
+    args = parser.parse_args()
     os.makedirs(os.path.dirname(os.path.abspath('api/models/model.onnx')), exist_ok=True)
-    train_and_export()
+    # the classifier is trained on the serving encoder's vectors, so export that first
+    export_embedder()
+    train_and_export(csv_paths=args.csv, workers=args.workers, chunk_rows=args.chunk_rows, solver=args.solver)
+    train_stage1()
@@ -0,0 +1,121 @@
+"""Content-addressed, append-only embedding cache for training runs.
+
+    <model>.<dim>.keys   uint64 cache_key(text, model) per row, appended
+    <model>.<dim>.f32    float32 rows, same order, memory-mapped for reads
+    <model>.<dim>.json   {"model_name", "dim"}
+
+Unlike the serving DiskEmbeddingStore (a fixed-capacity table that evicts), nothing is ever dropped, so a
+re-run over the same dumps only encodes rows it has not seen. Lookups are a vectorized searchsorted over
+the sorted key column; training gathers rows straight from the memmap, one chunk at a time.
+"""
+import json
+import os
+from contextlib import contextmanager
+
+import numpy as np
+
+from api.inference.embedding_cache import _slug, cache_key
+
+try:
+    import fcntl
+except Exception:
+    fcntl = None
+
+
+class FeatureCache:
+    def __init__(self, directory: str, model_name: str, dim: int):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, f'{_slug(model_name)}.{dim}')
+        self.model_name = model_name
+        self.dim = dim
+        self.keys_path = base + '.keys'
+        self.vectors_path = base + '.f32'
+        self.lock_path = base + '.lock'
+        if not os.path.exists(base + '.json'):
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump({'model_name': model_name, 'dim': dim}, f)
+        self._vectors = None
+        self.n = 0
+        self._order = np.zeros(0, dtype=np.int64)
+        self._sorted = np.zeros(0, dtype=np.uint64)
+        self._refresh()
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a+') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _complete_rows(self) -> int:
+        # an interrupted append can leave one file longer than the other; only complete rows count
+        keys = os.path.getsize(self.keys_path) // 8 if os.path.exists(self.keys_path) else 0
+        rows = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        return min(keys, rows)
+
+    def _merge(self, keys, start: int):
+        """Add rows start.. (with `keys`) to the sorted key column; later duplicates sort after earlier ones."""
+        order = np.argsort(keys, kind='stable')
+        pos = np.searchsorted(self._sorted, keys[order], side='right')
+        self._sorted = np.insert(self._sorted, pos, keys[order])
+        self._order = np.insert(self._order, pos, order.astype(np.int64) + start)
+        self.n = start + len(keys)
+        self._vectors = None
+
+    def _refresh(self):
+        """Pick up rows other runs appended since we last looked, reading only the new tail of the key file."""
+        n = self._complete_rows()
+        if n > self.n:
+            tail = np.fromfile(self.keys_path, dtype=np.uint64, count=n - self.n, offset=self.n * 8)
+            self._merge(tail, self.n)
+
+    def __len__(self):
+        return self.n
+
+    def keys_for(self, texts):
+        return np.array([cache_key(t, self.model_name) for t in texts], dtype=np.uint64)
+
+    def lookup(self, keys):
+        """Row of each key in the cache, -1 where it is missing."""
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not self.n:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted, keys), self.n - 1)
+        return np.where(self._sorted[pos] == keys, self._order[pos], -1).astype(np.int64)
+
+    def append(self, keys, vectors):
+        """Append rows for `keys`; returns their row numbers."""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        keys = np.ascontiguousarray(keys, dtype=np.uint64)
+        if vectors.shape != (len(keys), self.dim):
+            raise ValueError(f'expected ({len(keys)}, {self.dim}) vectors, got {vectors.shape}')
+        with self._locked():
+            # another run may have appended since we loaded: pick up its rows so row numbers stay correct
+            self._refresh()
+            start = self.n
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(start * 4 * self.dim)
+                f.write(vectors.tobytes())
+            with open(self.keys_path, 'ab') as f:
+                f.truncate(start * 8)
+                f.write(keys.tobytes())
+            self._merge(keys, start)
+        return np.arange(start, start + len(keys), dtype=np.int64)
+
+    def vectors(self):
+        if self._vectors is None:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(self.n, self.dim)) \
+                if self.n else np.zeros((0, self.dim), dtype=np.float32)
+        return self._vectors
+
+    def gather(self, rows):
+        """In-memory copy of `rows`; reading them in ascending order keeps the page-cache access sequential."""
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind='stable')
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        out[order] = self.vectors()[rows[order]]
+        return out
@@ -0,0 +1,120 @@
+"""Append-only store of (embedding, label) rows for incremental classifier updates.
+
+    features.f32   raw float32 rows, appended
+    rows.jsonl     one {"key", "label", "source"} record per row, same order
+    meta.json      {"dim": ..., "feedback_offset": rows of data/feedback.csv already ingested}
+
+The original training set is stored with source "train" by export_to_onnx.train_and_export, and
+corrected feedback rows are appended by online_update.py. When the same text is corrected several
+times, the latest label wins.
+"""
+import json
+import os
+from contextlib import contextmanager
+from typing import List, Sequence
+
+import numpy as np
+
+from api.inference.embedding_cache import cache_key
+
+try:
+    import fcntl
+except Exception:
+    fcntl = None
+
+
+def text_key(text: str) -> str:
+    """Row key of a transaction text: the same string, after preprocessing, always maps to the same row."""
+    return f"{cache_key(text, 'features'):016x}"
+
+
+class FeatureStore:
+    def __init__(self, directory: str, dim: int = None):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.features_path = os.path.join(directory, 'features.f32')
+        self.rows_path = os.path.join(directory, 'rows.jsonl')
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.meta = {'dim': dim, 'feedback_offset': 0}
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self.meta.update(json.load(f))
+        if dim is not None and self.meta['dim'] not in (None, dim):
+            raise ValueError(f"feature store holds {self.meta['dim']}-d rows, got {dim}-d")
+
+    @property
+    def dim(self):
+        return self.meta['dim']
+
+    def __len__(self):
+        if not self.dim or not os.path.exists(self.features_path):
+            return 0
+        return os.path.getsize(self.features_path) // (4 * self.dim)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.directory, '.lock'), 'a+') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _save_meta(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, self.meta_path)
+
+    def append(self, embeddings, labels: Sequence[int], keys: Sequence[str], source: str, feedback_offset: int = None):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not len(embeddings):
+            return 0
+        with self._locked():
+            if self.meta['dim'] is None:
+                self.meta['dim'] = int(embeddings.shape[1])
+            elif embeddings.shape[1] != self.meta['dim']:
+                raise ValueError(f"feature store holds {self.meta['dim']}-d rows, got {embeddings.shape[1]}-d")
+            with open(self.features_path, 'ab') as f:
+                f.write(embeddings.tobytes())
+            with open(self.rows_path, 'a', encoding='utf-8') as f:
+                for key, label in zip(keys, labels):
+                    f.write(json.dumps({'key': key, 'label': int(label), 'source': source}) + '\n')
+            if feedback_offset is not None:
+                self.meta['feedback_offset'] = feedback_offset
+            self._save_meta()
+        return len(embeddings)
+
+    def live(self):
+        """(rows, y, sources) of the latest row of each key, in row order; no features are read."""
+        n = len(self)
+        if not n:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), []
+        with open(self.rows_path, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f][:n]
+        latest = {}
+        for i, record in enumerate(records):
+            latest[record['key']] = i
+        keep: List[int] = sorted(latest.values())
+        return (np.array(keep, dtype=np.int64), np.array([records[i]['label'] for i in keep], dtype=np.int64),
+                [records[i]['source'] for i in keep])
+
+    def gather(self, rows):
+        """In-memory copy of `rows` only; reading them in ascending order keeps the page-cache access sequential."""
+        rows = np.asarray(rows, dtype=np.int64)
+        X = np.memmap(self.features_path, dtype=np.float32, mode='r', shape=(len(self), self.dim))
+        order = np.argsort(rows, kind='stable')
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        out[order] = X[rows[order]]
+        return out
+
+    def load(self):
+        """(X, rows, y, sources): X is the whole store memory-mapped, never copied; `rows` are its live rows
+        (later duplicates of a key replace earlier ones), to be read a chunk at a time with `gather`."""
+        n = len(self)
+        rows, y, sources = self.live()
+        if not n:
+            return np.zeros((0, self.dim or 0), dtype=np.float32), rows, y, sources
+        return np.memmap(self.features_path, dtype=np.float32, mode='r', shape=(n, self.dim)), rows, y, sources
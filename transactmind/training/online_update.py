@@ -0,0 +1,189 @@
+"""Incremental classifier update from corrected feedback rows, without a full retrain or API restart.
+
+1. rows of data/feedback.csv not yet ingested are embedded with the serving embedder and appended to
+   the feature store (training/feature_store.py);
+2. the deployed weights are continued over the new rows only, plus a replay sample of ONLINE_REPLAY_ROWS
+   older rows so the update does not forget the base set; corrected rows are weighted by
+   ONLINE_FEEDBACK_WEIGHT. The continuation keeps the deployed model's objective: a multinomial
+   LogisticRegression is refit warm-started from its own weights, an SGDClassifier (log loss, one-vs-rest)
+   gets `partial_fit` epochs. An update touches len(new) + replay rows, whatever the store size. Only when
+   there is nothing to continue from (no deployed .pkl, another feature size, or a label the deployed model
+   has no column for) does it fit from scratch, streaming the store in chunks;
+3. the result is exported as a new version (api/models/versions/<version>/model.onnx, .quant.onnx, .pkl)
+   and api/models/current.json is atomically repointed; running servers swap it in on their next check.
+
+    python training/online_update.py                  # or, from cron / an offline worker:
+    python training/online_update.py --if-triggered   # only when the agent's trigger_retrain tool asked
+"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from api.utils.config import settings  # noqa: E402
+from training.feature_store import FeatureStore, text_key  # noqa: E402
+
+
+def _read_feedback(path, offset):
+    """Rows after the first `offset` ones, and the new offset."""
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    return [(r.get('text') or '', (r.get('correct') or '').strip()) for r in rows[offset:]], len(rows)
+
+
+def read_pointer(pointer_path=None):
+    pointer_path = pointer_path or settings.MODEL_POINTER_PATH
+    if not os.path.exists(pointer_path):
+        return None
+    with open(pointer_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_pointer(version, model_path, pointer_path=None):
+    pointer_path = pointer_path or settings.MODEL_POINTER_PATH
+    tmp = pointer_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'model_path': model_path}, f)
+    # readers see either the old or the new pointer, never a partial file
+    os.replace(tmp, pointer_path)
+
+
+def next_version(versions_dir):
+    existing = [d for d in os.listdir(versions_dir) if d.startswith('v') and d[1:].isdigit()] \
+        if os.path.isdir(versions_dir) else []
+    return f"v{max([int(d[1:]) for d in existing], default=0) + 1:04d}"
+
+
+def _sgd(random_state=0, **kwargs):
+    from sklearn.linear_model import SGDClassifier
+    return SGDClassifier(loss='log_loss', alpha=settings.ONLINE_SGD_ALPHA, random_state=random_state, **kwargs)
+
+
+def _continue_from(parent, all_classes=True, random_state=0):
+    """A learner that starts at the deployed weights.
+
+    A LogisticRegression parent is continued by a warm-started copy of itself: SGD's one-vs-rest log loss is
+    another objective, and starting it from multinomial weights moves predict_proba before any feedback is
+    seen. The copy needs every class in its training rows; without them it falls back to SGD.
+    """
+    from sklearn.base import clone
+    from sklearn.linear_model import LogisticRegression
+    if isinstance(parent, LogisticRegression) and all_classes:
+        clf = clone(parent).set_params(warm_start=True)
+    else:
+        clf = _sgd(random_state, learning_rate='constant', eta0=settings.ONLINE_LEARNING_RATE)
+        clf.classes_ = parent.classes_.copy()
+    clf.coef_ = np.array(parent.coef_, dtype=np.float64, copy=True)
+    clf.intercept_ = np.array(parent.intercept_, dtype=np.float64, copy=True)
+    return clf
+
+
+def _partial_fit(clf, store, rows, y, weights, classes, epochs, chunk_rows, rng):
+    """`epochs` shuffled passes over `rows`, one gathered chunk of features in memory at a time."""
+    for _ in range(epochs):
+        perm = rng.permutation(len(rows))
+        for start in range(0, len(perm), chunk_rows):
+            idx = perm[start:start + chunk_rows]
+            clf.partial_fit(store.gather(rows[idx]), y[idx], classes=classes, sample_weight=weights[idx])
+
+
+def update(feedback_path=None, store_dir=None, versions_dir=None, pointer_path=None, taxonomy_path=None,
+           embedder=None, force=False, seed=0):
+    import joblib
+    from training.export_to_onnx import export_classifier
+
+    feedback_path = feedback_path or settings.FEEDBACK_PATH
+    versions_dir = versions_dir or settings.MODEL_VERSIONS_DIR
+    with open(taxonomy_path or settings.TAXONOMY_PATH, 'r', encoding='utf-8') as f:
+        labels = json.load(f)['labels']
+
+    store = FeatureStore(store_dir or settings.FEATURE_STORE_DIR)
+    rows, offset = _read_feedback(feedback_path, store.meta['feedback_offset'])
+    valid = [(t, labels.index(c)) for t, c in rows if t and c in labels]
+    skipped = len(rows) - len(valid)
+    if not valid and not force:
+        return {'status': 'no new feedback', 'skipped': skipped}
+
+    first_new = len(store)
+    if valid:
+        if embedder is None:
+            from api.inference import pipeline
+            embedder = pipeline.COMPONENT_BUILDERS['embedder']()
+        if getattr(embedder, 'is_stub', False):
+            return {'status': 'embedder unavailable; feedback left for the next run', 'skipped': skipped}
+        texts = [t for t, _ in valid]
+        store.append(embedder.embed(texts), [y for _, y in valid],
+                     [text_key(t) for t in texts], source='feedback', feedback_offset=offset)
+
+    live, y, sources = store.live()
+    if not len(live):
+        return {'status': 'feature store is empty', 'skipped': skipped}
+    weights = np.where(np.asarray(sources) == 'feedback', settings.ONLINE_FEEDBACK_WEIGHT, 1.0)
+    is_new = live >= first_new
+
+    pointer = read_pointer(pointer_path)
+    parent_path = pointer['model_path'] if pointer else settings.MODEL_PATH
+    parent = joblib.load(parent_path + '.pkl') if os.path.exists(parent_path + '.pkl') else None
+    incremental = (parent is not None and getattr(parent, 'coef_', None) is not None
+                   and parent.coef_.shape[1] == store.dim and set(y[is_new].tolist()) <= set(parent.classes_.tolist()))
+    rng = np.random.default_rng(seed)
+    t0 = time.perf_counter()
+    if incremental:
+        # the delta plus a uniform replay sample of what the deployed model was trained on
+        new = np.flatnonzero(is_new)
+        old = np.flatnonzero(~is_new)
+        replay = rng.choice(old, size=min(len(old), settings.ONLINE_REPLAY_ROWS), replace=False)
+        train = np.concatenate([new, replay])
+        classes, epochs = parent.classes_, settings.ONLINE_EPOCHS
+        clf = _continue_from(parent, set(y[train].tolist()) == set(classes.tolist()), seed)
+    else:
+        train = np.arange(len(live))
+        clf = _sgd(seed)
+        classes, epochs = np.arange(len(labels)), settings.TRAIN_SGD_EPOCHS
+    if hasattr(clf, 'partial_fit'):
+        _partial_fit(clf, store, live[train], y[train], weights[train], classes, epochs, settings.TRAIN_CHUNK_ROWS,
+                     rng)
+    else:
+        # warm-started LogisticRegression: the delta plus the replay sample fit in memory
+        clf.fit(store.gather(live[train]), y[train], sample_weight=weights[train])
+    fit_s = time.perf_counter() - t0
+
+    version = next_version(versions_dir)
+    out_dir = os.path.join(versions_dir, version)
+    os.makedirs(out_dir, exist_ok=True)
+    model_path = os.path.join(out_dir, 'model.onnx')
+    export_classifier(clf, store.dim, model_path)
+    meta = {'version': version, 'parent': pointer['version'] if pointer else 'base',
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'rows': int(len(live)),
+            'feedback_rows': int(np.sum(np.asarray(sources) == 'feedback')), 'new_rows': len(valid),
+            'mode': 'incremental' if incremental else 'full', 'learner': type(clf).__name__,
+            'trained_rows': int(len(train)),
+            'fit_seconds': round(fit_s, 3)}
+    with open(os.path.join(out_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    write_pointer(version, model_path, pointer_path)
+    return {'status': 'updated', 'skipped': skipped, **meta}
+
+
+def consume_trigger(trigger_path='training/retrain_trigger.json'):
+    """True (and the trigger removed) when the agent's trigger_retrain tool asked for an update."""
+    try:
+        os.remove(trigger_path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+if __name__ == '__main__':
+    # --if-triggered: offline worker mode, only run when the trigger_retrain tool left a request
+    if '--if-triggered' in sys.argv and not consume_trigger():
+        print(json.dumps({'status': 'not triggered'}))
+    else:
+        print(json.dumps(update(force='--force' in sys.argv), indent=2))
@@ -0,0 +1,171 @@
+"""Evaluate fp32 and int8 ONNX artifacts on a held-out labelled set and write the serving selection manifest.
+
+Every embedder x classifier combination that exists on disk is run on the same texts:
+
+  * accuracy against the labels, and agreement with the fp32/fp32 predictions;
+  * embed + classify latency (p50 ms per batch) at each batch size.
+
+Of the combinations within `--tolerance` accuracy of fp32/fp32 and at least `--min-agreement` agreement,
+the fastest at `--select-batch-size` is written to VARIANT_MANIFEST_PATH. The classifier choice is recorded
+per model file (`classifiers`), so evaluating another version (`--model api/models/versions/v0003/model.onnx`)
+adds an entry instead of replacing the others. The server (pipeline.prefer_quantized) re-reads the manifest
+when it changes and serves fp32 for classifier files it has no entry for; artifacts re-exported after the
+evaluation invalidate their entry.
+
+    python training/select_variants.py --csv data/holdout.csv
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from api.inference.preprocess import preprocess_text  # noqa: E402
+from api.inference.sessions import fingerprint, intra_op_threads, variant_path  # noqa: E402
+from api.utils.config import settings  # noqa: E402
+
+VARIANTS = ('fp32', 'int8')
+
+
+def load_holdout(csv_path, labels):
+    texts, ys = [], []
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('text') and row.get('category') in labels:
+                texts.append(preprocess_text(row['text']))
+                ys.append(row['category'])
+    return texts, ys
+
+
+def _embedders():
+    from api.inference.embedder import Embedder
+    out = {}
+    for variant in VARIANTS:
+        if not os.path.exists(variant_path(settings.EMBEDDER_ONNX_PATH, variant)):
+            continue
+        emb = Embedder(settings.EMBEDDER_MODEL_NAME, backend='onnx', onnx_path=settings.EMBEDDER_ONNX_PATH,
+                       tokenizer_dir=settings.EMBEDDER_TOKENIZER_DIR, prefer_quantized=variant == 'int8')
+        if not emb.is_stub:
+            out[variant] = emb
+    return out
+
+
+def _classifiers(model_path):
+    from api.inference.classifier import ONNXClassifier
+    out = {}
+    for variant in VARIANTS:
+        if not os.path.exists(variant_path(model_path, variant)):
+            continue
+        clf = ONNXClassifier(model_path, prefer_quantized=variant == 'int8')
+        if clf.session is not None and clf.quantized == (variant == 'int8'):
+            out[variant] = clf
+    return out
+
+
+def _latency(embedder, classifier, texts, batch_size, repeats):
+    batch = (texts * (batch_size // max(1, len(texts)) + 1))[:batch_size]
+    classifier.predict_batch(embedder.embed(batch))
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        classifier.predict_batch(embedder.embed(batch))
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def evaluate(texts, ys, embedders, classifiers, batch_sizes=(1, 8, 32), repeats=20, eval_batch=64):
+    """One result dict per embedder x classifier combination; the first is fp32/fp32 when it exists."""
+    results = []
+    reference = None
+    for emb_variant, embedder in embedders.items():
+        embs = np.vstack([np.asarray(embedder.embed(texts[s:s + eval_batch]), dtype=np.float32)
+                          for s in range(0, len(texts), eval_batch)])
+        for clf_variant, classifier in classifiers.items():
+            preds = [p[0] for p in classifier.predict_batch(embs)]
+            if reference is None:
+                reference = preds
+            results.append({
+                'embedder': emb_variant, 'classifier': clf_variant,
+                'accuracy': float(np.mean([p == y for p, y in zip(preds, ys)])),
+                'agreement': float(np.mean([p == r for p, r in zip(preds, reference)])),
+                'latency_ms': {str(bs): _latency(embedder, classifier, texts, bs, repeats) for bs in batch_sizes},
+            })
+    return results
+
+
+def select(results, tolerance, min_agreement, batch_size):
+    """Fastest combination within `tolerance` accuracy of the reference (first) result, or None."""
+    if not results:
+        return None
+    ref = results[0]['accuracy']
+    eligible = [r for r in results if r['accuracy'] >= ref - tolerance and r['agreement'] >= min_agreement]
+    return min(eligible, key=lambda r: r['latency_ms'][str(batch_size)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--csv', default='data/holdout.csv', help='held-out text,category CSV')
+    parser.add_argument('--taxonomy', default=settings.TAXONOMY_PATH)
+    parser.add_argument('--model', default=settings.MODEL_PATH)
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    parser.add_argument('--select-batch-size', type=int, default=settings.BATCH_MAX_SIZE)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--tolerance', type=float, default=settings.VARIANT_ACCURACY_TOLERANCE)
+    parser.add_argument('--min-agreement', type=float, default=settings.VARIANT_MIN_AGREEMENT)
+    parser.add_argument('--out', default=settings.VARIANT_MANIFEST_PATH)
+    args = parser.parse_args()
+
+    with open(args.taxonomy, 'r', encoding='utf-8') as f:
+        labels = json.load(f)['labels']
+    texts, ys = load_holdout(args.csv, labels)
+    if not texts:
+        sys.exit(f'no labelled rows in {args.csv}')
+    batch_sizes = sorted({int(b) for b in args.batch_sizes.split(',')} | {args.select_batch_size})
+    embedders, classifiers = _embedders(), _classifiers(args.model)
+    if not embedders or not classifiers:
+        sys.exit('need the exported ONNX embedder and classifier (run training/export_to_onnx.py)')
+
+    results = evaluate(texts, ys, embedders, classifiers, batch_sizes, args.repeats)
+    chosen = select(results, args.tolerance, args.min_agreement, args.select_batch_size)
+    for r in results:
+        mark = '*' if r is chosen else ' '
+        lat = '  '.join(f"bs{bs} {ms:7.2f}ms" for bs, ms in r['latency_ms'].items())
+        print(f"{mark} embedder={r['embedder']:<5} classifier={r['classifier']:<5} acc {r['accuracy']:.4f}  "
+              f"agree {r['agreement']:.4f}  {lat}")
+
+    try:
+        with open(args.out, 'r', encoding='utf-8') as f:
+            entries = json.load(f).get('classifiers', {})
+    except (OSError, ValueError):
+        entries = {}
+    entries[os.path.normpath(args.model)] = {
+        'selected': chosen['classifier'], **{v: fingerprint(variant_path(args.model, v)) for v in classifiers}}
+    manifest = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'holdout': args.csv, 'rows': len(texts),
+        'tolerance': args.tolerance, 'min_agreement': args.min_agreement,
+        'select_batch_size': args.select_batch_size,
+        'hardware': {'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+                     'intra_op_threads': intra_op_threads()},
+        'selected': {'embedder': chosen['embedder']},
+        'artifacts': {
+            'embedder': {'path': settings.EMBEDDER_ONNX_PATH,
+                         **{v: fingerprint(variant_path(settings.EMBEDDER_ONNX_PATH, v)) for v in embedders}},
+        },
+        # model file -> chosen classifier variant and the fingerprints it was measured on
+        'classifiers': entries,
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print('Selection manifest written to', args.out)
+
+
+if __name__ == '__main__':
+    main()